@@ -1,8 +1,9 @@
-from io import BytesIO
+import shutil
 from uuid import UUID, uuid4
 
 import pydub
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from huey.api import Result
 from loguru import logger
@@ -11,6 +12,7 @@ from pydantic.error_wrappers import ValidationError
 from config import get_config
 from core import task_system
 from core.plugins.no_mem import get_audio_plugins
+from core.processing.pcm_cache import audio_exists, ensure_mp3, store_upload
 
 from .auth import get_current_active_user
 from .models import (
@@ -59,7 +61,9 @@ async def upload_audio_file(upload_file: UploadFile) -> UploadFileResponse:
     """
     The endpoint validates file based on
     [MIME types specification](https://developer.mozilla.org/en-US/docs/Web/HTTP/Basics_of_HTTP/MIME_types/Common_types).
-    The endpoint converts audio file into `.mp3` format.
+    The endpoint decodes the audio file once, block by block, and stores the samples (16 kHz, mono) that the
+    audio models use, depending on the storage mode (`storage.audio_format` of the config) the file is also
+    converted into `.mp3` format, or it is converted only when it is downloaded.
 
     Parameters:
     - **upload_file**: The audio file to upload
@@ -95,21 +99,26 @@ async def upload_audio_file(upload_file: UploadFile) -> UploadFileResponse:
         )
 
     logger.info(f"Audio file (id: {file_id}) is valid. Reading and storing it.")
-    byte_content = await upload_file.read()
     filepath = config.storage.audio_dir / str(file_id)
 
-    # convert file to mp3
+    # decode the file and store it in the storage format
     logger.info(
-        f"Converting audio file (id: {file_id}) to .mp3 extension and saving it to ({filepath})"
+        f"Converting audio file (id: {file_id}) to {config.storage.audio_format} format and saving it to ({filepath})"
     )
+    # ffmpeg reads the uploaded file from the disk, so it is never decoded into memory whole
+    upload_path = filepath.with_name(f"{file_id}.upload")
+    # ffmpeg runs in a thread, so the event loop keeps serving the other requests
     try:
-        pydub.AudioSegment.from_file(BytesIO(byte_content)).export(
-            out_f=filepath, format="mp3"
-        )
+        # the upload is copied block by block, so it is not read into memory whole
+        with open(upload_path, "wb") as file:
+            await run_in_threadpool(shutil.copyfileobj, upload_file.file, file)
+        await run_in_threadpool(store_upload, upload_path, filepath)
     except pydub.exceptions.CouldntDecodeError as error:
         raise HTTPException(
             status_code=500, detail="Failed to convert audio file to .mp3"
         ) from error
+    finally:
+        upload_path.unlink(missing_ok=True)
 
     logger.info(f"Audio file ({file_id}) was saved successfully.")
     return UploadFileResponse(file_id=file_id)
@@ -136,7 +145,8 @@ async def upload_audio_file(upload_file: UploadFile) -> UploadFileResponse:
 async def download_audio_file(file: UUID) -> FileResponse:
     """
     The endpoint `/download` takes a file UUID as input, checks if the file exists in the
-    audio directory, and returns the file as bytes. If file does not exist, returns 404 HTTP response code
+    audio directory, and returns the file as bytes. If file does not exist, returns 404 HTTP response code.
+    If only the decoded samples of the file are stored, the file is converted into `.mp3` format first.
 
     Responses:
     - 200, file bytes
@@ -146,14 +156,16 @@ async def download_audio_file(file: UUID) -> FileResponse:
     )
     filepath = config.storage.audio_dir / str(file)
 
-    if not filepath.exists():
+    if not audio_exists(filepath):
         logger.error(f"File ({file}) does not exist. Returning 404 file error.")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
         )
 
     logger.info(f"Audio file ({file}) was found. Returning file response.")
-    return FileResponse(path=filepath.as_posix(), media_type="audio/mpeg")
+    # The file may have to be encoded by ffmpeg, which would block the event loop
+    mp3_path = await run_in_threadpool(ensure_mp3, filepath)
+    return FileResponse(path=mp3_path.as_posix(), media_type="audio/mpeg")
 
 
 @router.get(
@@ -330,7 +342,7 @@ async def extract_text_from_audio(
             detail="No such audio model available",
         )
 
-    if not audio_file_path.exists():
+    if not audio_exists(audio_file_path):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No such audio file available"
         )
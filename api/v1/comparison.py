@@ -1,24 +1,39 @@
+from typing import Annotated, Dict, List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from huey.api import Result
 from loguru import logger
-from pydantic.error_wrappers import ValidationError
 
 from config import get_config
 from core import task_system
-from core.plugins.base import AudioProcessingFunction, ImageProcessingFunction
+from core.plugins.base import (
+    AudioProcessingFunction,
+    AudioToImageComparisonResponse,
+    AudioToTextComparisonResponse,
+    ImageProcessingFunction,
+    TextDiff,
+)
 from core.plugins.no_mem import get_audio_plugins, get_image_plugins
+from core.processing.pcm_cache import audio_exists
+from core.processing.text import match_characters, phrase_errors, realign_phrases
 from core.task_system import scheduler
 
 from .auth import get_current_active_user
+from .auth_utils import User
 from .models import (
     AudioImageComparisonResultsResponse,
     AudioTextComparisonResultsResponse,
     AudioToImageComparisonRequest,
     AudioToTextComparisonRequest,
+    CharacterDiff,
+    ErrorDetails,
+    ErrorDetailsResponse,
+    RealignmentRequest,
+    RealignmentResponse,
     TaskCreateResponse,
 )
+from .task_utils import _comparison_result
 
 config = get_config()
 
@@ -51,6 +66,7 @@ router = APIRouter(
 )
 async def compare_audio_to_image(
     request: AudioToImageComparisonRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
 ) -> TaskCreateResponse:
     """
     Parameters:
@@ -112,7 +128,7 @@ async def compare_audio_to_image(
     logger.info(
         f"Image file ({request.image_file}) exists. Checking if audio file ({request.audio_file}) exists."
     )
-    if not audio_file_path.exists():
+    if not audio_exists(audio_file_path):
         logger.error("non-existent audiofile passed at line 93.")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -129,6 +145,7 @@ async def compare_audio_to_image(
         image_plugin_info.class_name,
         ImageProcessingFunction,
         image_file_path.as_posix(),
+        username=current_user.username,
     )
 
     logger.info(
@@ -142,6 +159,7 @@ async def compare_audio_to_image(
 @router.get(
     "/audio/image/result",
     response_model=AudioImageComparisonResultsResponse,
+    response_model_exclude_none=True,
     status_code=200,
     summary="""The endpoint `/audio/image/result` retrieves the results of a task with a given task ID, and returns the
     results.""",
@@ -170,10 +188,17 @@ async def compare_audio_to_image(
 )
 async def get_audio_image_comparison_result(
     task_id: UUID,
+    compact: bool = False,
+    include_audio: bool = True,
+    include_image: bool = True,
 ) -> AudioImageComparisonResultsResponse:
     """
     Parameters:
     - **task_id**: The `task_id` is the uuid of the task to fetch results of
+    - **compact**: whether the errors reference the audio segments by `segment_index`
+    (the index in `audio.segments`) instead of embedding `audio_segment`
+    - **include_audio**: whether the `audio` results are returned
+    - **include_image**: whether the `image` results are returned
 
     Responses:
     - 200, job results in the format
@@ -231,19 +256,26 @@ async def get_audio_image_comparison_result(
     ]
     }
     ```
+    with `compact` every error is `{"segment_index": 0, "at_char": 0, "found": "string", "expected": "string"}`
     - 406, Results are not ready yet or no task with such id exist
     - 422, There is no such audio processing task
     """
     data = scheduler.result(str(task_id), preserve=True)
 
     if data is not None:
-        try:
-            return AudioImageComparisonResultsResponse.parse_obj(data.dict())
-        except ValidationError as error:
+        if not isinstance(data, AudioToImageComparisonResponse):
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail="There is no such task consists of the both image and audio",
-            ) from error
+            )
+        exclude = set()
+        if not include_audio:
+            exclude.add("audio")
+        if not include_image:
+            exclude.add("image")
+        return AudioImageComparisonResultsResponse.parse_obj(
+            _comparison_result(data, compact, exclude)
+        )
     raise HTTPException(
         status_code=status.HTTP_406_NOT_ACCEPTABLE,
         detail="Results are not ready yet or no task with such id exist",
@@ -271,10 +303,17 @@ async def get_audio_image_comparison_result(
 )
 async def compare_audio_to_text(
     request: AudioToTextComparisonRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
 ) -> TaskCreateResponse:
     """
     Parameters:
     - **audio_file**: an uuid of file to process
+    - **text**: the text to compare the audio with
+    - **text_file**: or an uuid of the text uploaded to '_/text/upload_'
+    - **locate**: whether the audio is a reading of a part of the text file (e.g. of a book),
+    then the part is found first and only it is compared with the audio
+    - **stream**: whether the audio is compared with the text while it is being transcribed,
+    then the errors of its beginning are available at '_/comparison/audio/text/partial_' early
     - **audio_model**: an audio processing model name (check '_/audio/models_' for available models)
 
 
@@ -282,11 +321,51 @@ async def compare_audio_to_text(
     - 200, Task created
     - 404, No such audio file available
     - 404, No such audio model available
-    - 404, No such image file available
-    - 404, No such image model available
+    - 404, No such text file available
+    - 422, Either text or text_file has to be given
+    - 422, Only the readings of a text file can be located
+    - 422, The reading cannot be located while streaming
     """
     logger.info("Starting compare_text_audio algorithm. Acquiring data.")
 
+    if (request.text is None) == (request.text_file is None):
+        logger.error("Neither or both text and text_file are given. Raising 422 error.")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Either text or text_file has to be given",
+        )
+
+    if request.locate and request.text_file is None:
+        logger.error(
+            "The reading cannot be located without text_file. Raising 422 error."
+        )
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Only the readings of a text file can be located",
+        )
+
+    if request.locate and request.stream:
+        logger.error(
+            "The reading cannot be located while streaming. Raising 422 error."
+        )
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The reading cannot be located while streaming",
+        )
+
+    text_file_path = None
+    if request.text_file is not None:
+        text_file_path = config.storage.text_dir / str(request.text_file)
+        logger.info(f"Checking if text file ({request.text_file}) exists.")
+        if not text_file_path.exists():
+            logger.error(
+                f"No such text file ({request.text_file}) exists. Raising 404 file error."
+            )
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No such text file available",
+            )
+
     audio_plugin_info = get_audio_plugins().get(request.audio_model)
     audio_file_path = config.storage.audio_dir / str(request.audio_file)
 
@@ -303,7 +382,7 @@ async def compare_audio_to_text(
     logger.info(
         f"Audio model ({request.audio_model}) exists. Checking if audio file ({request.audio_file}) exists."
     )
-    if not audio_file_path.exists():
+    if not audio_exists(audio_file_path):
         logger.error(
             f"No such audio file ({request.audio_file} exists. Raising 404 file error."
         )
@@ -321,6 +400,10 @@ async def compare_audio_to_text(
         AudioProcessingFunction,
         audio_file_path.as_posix(),
         request.text,
+        None if text_file_path is None else text_file_path.as_posix(),
+        request.locate,
+        request.stream,
+        current_user.username,
     )
 
     logger.info(
@@ -335,6 +418,7 @@ async def compare_audio_to_text(
 @router.get(
     "/audio/text/result",
     response_model=AudioTextComparisonResultsResponse,
+    response_model_exclude_none=True,
     status_code=200,
     summary="""The endpoint `/audio/text/result` retrieves the results of a task with a given task ID, and returns the
     results.""",
@@ -363,10 +447,15 @@ async def compare_audio_to_text(
 )
 async def get_audio_text_comparison_result(
     task_id: UUID,
+    compact: bool = False,
+    include_audio: bool = True,
 ) -> AudioTextComparisonResultsResponse:
     """
     Parameters:
     - **task_id**: The `task_id` is the uuid of the task to fetch results of
+    - **compact**: whether the errors reference the audio segments by `segment_index`
+    (the index in `audio.segments`) instead of embedding `audio_segment`
+    - **include_audio**: whether the `audio` results are returned
 
     Responses:
     - 200, job results in the format
@@ -398,20 +487,237 @@ async def get_audio_text_comparison_result(
     ]
     }
     ```
+    with `compact` every error is `{"segment_index": 0, "at_char": 0, "found": "string", "expected": "string"}`
     - 406, Results are not ready yet or no task with such id exist
     - 422, There is no such audio processing task
     """
     data = scheduler.result(str(task_id), preserve=True)
 
     if data is not None:
-        try:
-            return AudioTextComparisonResultsResponse.parse_obj(data.dict())
-        except ValidationError as error:
+        if not isinstance(data, AudioToTextComparisonResponse):
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail="There is no such task consists of the both audio and text",
-            ) from error
+            )
+        return AudioTextComparisonResultsResponse.parse_obj(
+            _comparison_result(data, compact, set() if include_audio else {"audio"})
+        )
     raise HTTPException(
         status_code=status.HTTP_406_NOT_ACCEPTABLE,
         detail="Results are not ready yet or no task with such id exist",
     )
+
+
+@router.get(
+    "/audio/text/partial",
+    response_model=AudioTextComparisonResultsResponse,
+    response_model_exclude_none=True,
+    status_code=200,
+    summary="""The endpoint `/audio/text/partial` retrieves the partial results of a streaming comparison
+    with a given task ID, while the task is running.""",
+    responses={
+        406: {
+            "description": "There are no partial results (task does not stream, has not aligned anything yet or has finished).",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "No partial results of a task with such id exist",
+                    }
+                }
+            },
+        },
+    },
+)
+async def get_audio_text_comparison_partial_result(
+    task_id: UUID,
+    compact: bool = False,
+    include_audio: bool = True,
+) -> AudioTextComparisonResultsResponse:
+    """
+    Parameters:
+    - **task_id**: The `task_id` is the uuid of the task created with `stream` to fetch partial results of
+    - **compact**, **include_audio**: as in '_/comparison/audio/text/result_'
+
+    Responses:
+    - 200, the results of the audio segments transcribed and compared so far,
+    in the format of '_/comparison/audio/text/result_'
+    - 406, No partial results of a task with such id exist (when the task has finished, its results
+    are available at '_/comparison/audio/text/result_')
+    """
+    data = task_system.get_task_data(task_system.partial_result_key(str(task_id)))
+
+    if data is not None:
+        return AudioTextComparisonResultsResponse.parse_obj(
+            _comparison_result(data, compact, set() if include_audio else {"audio"})
+        )
+    raise HTTPException(
+        status_code=status.HTTP_406_NOT_ACCEPTABLE,
+        detail="No partial results of a task with such id exist",
+    )
+
+
+@router.post(
+    "/audio/realign",
+    response_model=RealignmentResponse,
+    status_code=200,
+    summary="""The endpoint `/audio/realign` updates the errors of a finished comparison after the text
+    the audio was compared with is corrected, without running the comparison again.""",
+    responses={
+        406: {
+            "description": "It is impossible to realign the task (task does not exist or it has not finished yet).",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Results are not ready yet or no task with such id exist",
+                    }
+                }
+            },
+        },
+    },
+)
+async def realign_audio_comparison(request: RealignmentRequest) -> RealignmentResponse:
+    """
+    Only the parts of the text around the corrections are compared with the audio again,
+    the rest of the previous comparison is reused, so the errors are updated in milliseconds.
+    The corrected text becomes the text of the comparison, so the text can be corrected repeatedly,
+    and the errors of its result are replaced with the updated ones.
+
+    Parameters:
+    - **task_id**: the uuid of a comparison of audio with text or with image
+    - **text**: the corrected text (e.g. the text of the image with the recognition mistakes fixed)
+    - **compact**: as in '_/comparison/audio/text/result_'
+
+    Responses:
+    - 200, the errors in the format of '_/comparison/audio/text/result_'
+    - 406, Results are not ready yet or no task with such id exist
+    """
+    logger.info(f"Starting realign_audio_comparison algorithm ({request.task_id}).")
+    key = task_system.alignment_key(str(request.task_id))
+    alignment = task_system.get_task_data(key)
+    result = scheduler.result(str(request.task_id), preserve=True)
+
+    if alignment is None or result is None:
+        logger.error(
+            f"No alignment of task ({request.task_id}) exists. Raising 406 error."
+        )
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Results are not ready yet or no task with such id exist",
+        )
+
+    alignment = realign_phrases(alignment, request.text)
+    result.errors = [
+        TextDiff(segment_index=index, at_char=at_char, found=found, expected=expected)
+        for index, diff in enumerate(phrase_errors(alignment))
+        for at_char, found, expected in diff
+    ]
+    # the realigned errors replace the errors of the result, so that the result
+    # and the error ids of '/errors/details' describe the corrected text
+    scheduler.put(str(request.task_id), result)
+    task_system.put_task_data(key, alignment)
+    task_system.delete_task_data(task_system.error_details_key(str(request.task_id)))
+
+    logger.info(f"Task ({request.task_id}) has been realigned. Returning the result.")
+    return RealignmentResponse.parse_obj(
+        _comparison_result(result, request.compact, {"audio", "image"})
+    )
+
+
+@router.get(
+    "/errors/details",
+    response_model=ErrorDetailsResponse,
+    status_code=200,
+    summary="""The endpoint `/errors/details` returns the letters misread in the given errors of a comparison.""",
+    responses={
+        406: {
+            "description": "It is impossible to get task result (task does not exist or it has not finished yet).",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Results are not ready yet or no task with such id exist",
+                    }
+                }
+            },
+        },
+        422: {
+            "description": "The task is not a comparison or it has no error with such id.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "There is no error with such id in the comparison",
+                    }
+                }
+            },
+        },
+    },
+)
+async def get_error_details(
+    task_id: UUID, error_ids: Annotated[List[int], Query()]
+) -> ErrorDetailsResponse:
+    """
+    The comparisons find the errors by words, the errors are compared by letters only when
+    their details are requested, and the details are stored next to the result of the comparison
+    until it is realigned.
+
+    Parameters:
+    - **task_id**: the uuid of a comparison of audio with text or with image
+    - **error_ids**: the indices of the errors in the `errors` of the result of the comparison
+
+    Responses:
+    - 200, the character-level errors of every requested error in the format
+    ```js
+    {
+    "data": [
+        {
+        "error_id": 0, // the index of the error in the result of the comparison
+        "errors": [ // the letters to change in the `found` of the error to obtain its `expected`
+            {
+            "at_char": 0, // char of `found`, at which the error starts
+            "found": "string", // found letters (based on audio)
+            "expected": "string" // expected letters
+            }
+        ]
+        }
+    ]
+    }
+    ```
+    - 406, Results are not ready yet or no task with such id exist
+    - 422, There is no error with such id in the comparison
+    """
+    logger.info(f"Starting get_error_details algorithm ({task_id}).")
+    result = scheduler.result(str(task_id), preserve=True)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Results are not ready yet or no task with such id exist",
+        )
+    if not isinstance(
+        result, (AudioToImageComparisonResponse, AudioToTextComparisonResponse)
+    ) or any(not 0 <= error_id < len(result.errors) for error_id in error_ids):
+        logger.error(f"No requested errors in task ({task_id}). Raising 422 error.")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="There is no error with such id in the comparison",
+        )
+
+    key = task_system.error_details_key(str(task_id))
+    cached: Dict[int, ErrorDetails] = task_system.get_task_data(key) or {}
+    missing = [error_id for error_id in error_ids if error_id not in cached]
+    for error_id in missing:
+        error = result.errors[error_id]
+        cached[error_id] = ErrorDetails(
+            error_id=error_id,
+            errors=[
+                CharacterDiff(at_char=at_char, found=found, expected=expected)
+                for at_char, found, expected in match_characters(
+                    error.found, error.expected
+                )
+            ],
+        )
+    if missing:
+        task_system.put_task_data(key, cached)
+    data = [cached[error_id] for error_id in error_ids]
+
+    logger.info(f"Details of {len(data)} errors of task ({task_id}) are returned.")
+    return ErrorDetailsResponse(data=data)
@@ -0,0 +1,105 @@
+import json
+from typing import Annotated
+
+import aioredis
+from fastapi import APIRouter, Depends
+from loguru import logger
+
+from core.processing.metrics import METRICS_KEY_PREFIX, metric_rates
+
+from .auth import get_current_active_user
+from .auth_utils import User, get_redis_connection
+from .models import (
+    MisreadWord,
+    ReadingMetricsEntry,
+    ReadingMetricsResponse,
+    ReadingMetricsTotals,
+)
+
+logger.add(
+    "./logs/metrics_api.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+router = APIRouter(
+    prefix="/metrics", tags=["metrics"], dependencies=[Depends(get_current_active_user)]
+)
+
+
+@router.get(
+    "/reading",
+    response_model=ReadingMetricsResponse,
+    status_code=200,
+    summary="""The endpoint `/reading` returns the reading metrics of the current user: the error rates and
+    the reading speed over all the comparisons, their trend and the most often misread words.""",
+)
+async def get_reading_metrics(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    conn: Annotated[aioredis.Redis, Depends(get_redis_connection)],
+    history: int = 100,
+    words: int = 20,
+) -> ReadingMetricsResponse:
+    """
+    The metrics are added up at the end of every comparison of audio with text or with image,
+    so they are returned without going through the results of the comparisons.
+
+    Parameters:
+    - **history**: the number of the last comparisons whose metrics are returned
+    - **words**: the number of the most often misread words returned
+
+    Responses:
+    - 200, the metrics in the format
+    ```js
+    {
+    "totals": { // all the comparisons of the user
+        "comparisons": 0, // the number of the comparisons
+        "reference_words": 0, // the number of the words of the texts
+        "word_errors": 0, // the number of the words read incorrectly, skipped or added
+        "reference_chars": 0, // the number of the letters and spaces of the texts
+        "char_errors": 0, // the number of the letters read incorrectly, skipped or added
+        "words_read": 0, // the number of the words read
+        "seconds": 0, // the duration of the readings
+        "word_error_rate": 0, // word_errors / reference_words
+        "character_error_rate": 0, // char_errors / reference_chars
+        "words_per_minute": 0 // words_read / minutes of the readings
+    },
+    "history": [ // the last comparisons from the oldest one
+        {
+        "task_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6", // the comparison task
+        "time": 0, // the unix time the comparison finished at
+        "word_error_rate": 0,
+        "character_error_rate": 0,
+        "words_per_minute": 0
+        }
+    ],
+    "misread_words": [ // the words of the texts by the number of their errors
+        {
+        "word": "string",
+        "errors": 0
+        }
+    ]
+    }
+    ```
+    """
+    logger.info(f"Starting get_reading_metrics algorithm ({current_user.username}).")
+    key = METRICS_KEY_PREFIX + current_user.username
+
+    counts = await conn.hgetall(key)
+    totals = ReadingMetricsTotals.parse_obj(counts)
+    totals = totals.copy(update=metric_rates(totals.dict()))
+
+    entries = await conn.zrange(key + ":history", -history, -1) if history > 0 else []
+    misread = (
+        await conn.zrevrange(key + ":words", 0, words - 1, withscores=True)
+        if words > 0
+        else []
+    )
+
+    logger.info(f"Returning the reading metrics of {current_user.username}.")
+    return ReadingMetricsResponse(
+        totals=totals,
+        history=[ReadingMetricsEntry.parse_obj(json.loads(e)) for e in entries],
+        misread_words=[
+            MisreadWord(word=word, errors=int(errors)) for word, errors in misread
+        ],
+    )
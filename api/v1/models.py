@@ -78,7 +78,10 @@ class AudioToImageComparisonRequest(BaseModel):
 
 class AudioToTextComparisonRequest(BaseModel):
     audio_file: UUID
-    text: List[str]
+    text: List[str] | None = None
+    text_file: UUID | None = None
+    locate: bool = False
+    stream: bool = False
     audio_model: str
 
 
@@ -99,15 +102,79 @@ class TextDiff(BaseModel):
     expected: str
 
 
+class CompactTextDiff(BaseModel):
+    segment_index: int
+    at_char: int
+    found: str
+    expected: str
+
+
 class AudioImageComparisonResultsResponse(BaseModel):
-    image: ImageProcessingResponse
-    audio: AudioProcessingResponse
-    errors: List[TextDiff]
+    image: ImageProcessingResponse | None = None
+    audio: AudioProcessingResponse | None = None
+    errors: List[TextDiff] | List[CompactTextDiff]
 
 
 class AudioTextComparisonResultsResponse(BaseModel):
-    audio: AudioProcessingResponse
-    errors: List[TextDiff]
+    audio: AudioProcessingResponse | None = None
+    errors: List[TextDiff] | List[CompactTextDiff]
+
+
+class RealignmentRequest(BaseModel):
+    task_id: UUID
+    text: str
+    compact: bool = False
+
+
+class RealignmentResponse(BaseModel):
+    errors: List[TextDiff] | List[CompactTextDiff]
+
+
+class CharacterDiff(BaseModel):
+    at_char: int
+    found: str
+    expected: str
+
+
+class ErrorDetails(BaseModel):
+    error_id: int
+    errors: List[CharacterDiff]
+
+
+class ErrorDetailsResponse(BaseModel):
+    data: List[ErrorDetails]
+
+
+class ReadingMetricsTotals(BaseModel):
+    comparisons: int = 0
+    reference_words: int = 0
+    word_errors: int = 0
+    reference_chars: int = 0
+    char_errors: int = 0
+    words_read: int = 0
+    seconds: float = 0.0
+    word_error_rate: float = 0.0
+    character_error_rate: float = 0.0
+    words_per_minute: float = 0.0
+
+
+class ReadingMetricsEntry(BaseModel):
+    task_id: UUID
+    time: float
+    word_error_rate: float
+    character_error_rate: float
+    words_per_minute: float
+
+
+class MisreadWord(BaseModel):
+    word: str
+    errors: int
+
+
+class ReadingMetricsResponse(BaseModel):
+    totals: ReadingMetricsTotals
+    history: List[ReadingMetricsEntry]
+    misread_words: List[MisreadWord]
 
 
 class MultipleTasksStatusResponse(BaseModel):
@@ -124,7 +191,19 @@ class AudioPhrase(BaseModel):
     audio_segment: AudioChunk | None
     found: bool
     phrase: str
+    distance: int | None = None
 
 
 class AudioExtractPhrasesResponse(BaseModel):
     data: List[AudioPhrase]
+
+
+class AlignmentCacheStatsResponse(BaseModel):
+    memory_hits: int
+    redis_hits: int
+    misses: int
+    memory_entries: int
+    memory_bytes: int
+    total_memory_hits: int
+    total_redis_hits: int
+    total_misses: int
@@ -4,7 +4,9 @@ from .audio import router as audio_router
 from .auth import router as auth_router
 from .comparison import router as comparison_router
 from .image import router as image_router
+from .metrics import router as metrics_router
 from .task import router as task_router
+from .text import router as text_router
 
 router = APIRouter(prefix="/v1")
 
@@ -12,4 +14,6 @@ router.include_router(audio_router)
 router.include_router(image_router)
 router.include_router(auth_router)
 router.include_router(comparison_router)
+router.include_router(metrics_router)
 router.include_router(task_router)
+router.include_router(text_router)
@@ -4,10 +4,15 @@ from fastapi import APIRouter, Depends
 from loguru import logger
 
 from config import get_config
+from core.plugins.base import (
+    AudioToImageComparisonResponse,
+    AudioToTextComparisonResponse,
+)
+from core.task_system import _get_alignment_cache_stats
 
 from .auth import get_current_active_user
-from .models import TaskStatusResponse
-from .task_utils import _get_job_result, _get_job_status
+from .models import AlignmentCacheStatsResponse, TaskStatusResponse
+from .task_utils import _comparison_result, _get_job_result, _get_job_status
 
 config = get_config()
 logger.add(
@@ -64,8 +69,46 @@ async def get_job_result(task_id: UUID) -> dict:
     - **task_id**: The `task_id` is the uuid of the task to fetch results of
 
     Responses:
-    - 200, job results
+    - 200, job results (the errors of the comparisons embed their `audio_segment`,
+    as in '_/comparison/audio/text/result_' without `compact`)
     - 406, Results are not ready yet or no task with such id exist
     """
-    data: dict = _get_job_result(task_id).dict()
+    result = _get_job_result(task_id)
+    if isinstance(
+        result, (AudioToImageComparisonResponse, AudioToTextComparisonResponse)
+    ):
+        return _comparison_result(result, compact=False, exclude=set())
+    data: dict = result.dict()
     return data
+
+
+@router.get(
+    "/cache",
+    response_model=AlignmentCacheStatsResponse,
+    status_code=200,
+    summary="""The endpoint `/cache` returns the hit and miss counters of the text alignment cache.""",
+)
+async def get_alignment_cache_stats() -> AlignmentCacheStatsResponse:
+    """
+    The counters without the `total_` prefix belong to the worker process, which has executed the request,
+    the `total_` ones are added up by all the workers in redis, which also shares the stored results
+    (without the redis tier they are the counters of the worker).
+
+    Responses:
+    - 200, the counters in the format
+    ```js
+    {
+        "memory_hits": 0, // results found in the memory of the worker
+        "redis_hits": 0, // results found in redis by the worker
+        "misses": 0, // results that had to be computed by the worker
+        "memory_entries": 0, // results stored in the memory of the worker
+        "memory_bytes": 0, // the pickled size of the results stored in the memory of the worker
+        "total_memory_hits": 0, // results found in the memory of any worker
+        "total_redis_hits": 0, // results found in redis by any worker
+        "total_misses": 0 // results that had to be computed by any worker
+    }
+    ```
+    """
+    logger.info("Starting get_alignment_cache_stats algorithm. Acquiring counters.")
+    stats = _get_alignment_cache_stats().get(blocking=True)
+    return AlignmentCacheStatsResponse.parse_obj(stats)
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Dict, List, Set
 from uuid import UUID
 
 from fastapi import HTTPException, status
@@ -7,8 +7,16 @@ from loguru import logger
 
 from config import get_config
 from core import task_system
-from core.plugins.base import AudioProcessingFunction, ImageProcessingFunction
+from core.plugins.base import (
+    AudioProcessingFunction,
+    AudioSegment,
+    AudioToImageComparisonResponse,
+    AudioToTextComparisonResponse,
+    ImageProcessingFunction,
+    TextDiff,
+)
 from core.plugins.no_mem import get_audio_plugins, get_image_plugins
+from core.processing.pcm_cache import audio_exists
 from core.task_system import scheduler
 
 from .models import (
@@ -56,7 +64,7 @@ def create_audio_task(request: AudioProcessingRequest) -> TaskCreateResponse:
         f"Audio model ({request.audio_model}) exists. Checking if audio file ({request.audio_file}) exists."
     )
 
-    if not audio_file_path.exists():
+    if not audio_exists(audio_file_path):
         logger.error(
             f"No such audio file ({request.audio_file}) exists. Raising 404 file error."
         )
@@ -190,3 +198,39 @@ def _get_job_result(task_id: UUID) -> Any:
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail="Results are not ready yet or no task with such id exist",
         )
+
+
+def _segment_index(error: TextDiff, segments: List[AudioSegment]) -> int:
+    """
+    Returns the index of the audio segment of an error, the results stored before the errors
+    referenced the segments by their indices embed the segment as `audio_segment` instead
+    """
+    if "segment_index" in error.__dict__:
+        return error.segment_index
+    return segments.index(error.__dict__["audio_segment"])
+
+
+def _comparison_result(
+    result: AudioToImageComparisonResponse | AudioToTextComparisonResponse,
+    compact: bool,
+    exclude: Set[str],
+) -> Dict[str, Any]:
+    """
+    Converts the result of a comparison task into the data of the response
+    :param result: the result of the task, its errors reference the audio segments by their indices
+    :param compact: whether the errors keep referencing the segments instead of embedding them
+    :param exclude: the sub-results left out of the response ("audio", "image")
+    :return: the data of the response
+    """
+    data = result.dict(exclude=exclude | {"errors"})
+    segments = result.audio.segments
+    errors = []
+    for error in result.errors:
+        index = _segment_index(error, segments)
+        error_data = error.dict(exclude={"segment_index", "audio_segment"})
+        if compact:
+            errors.append(dict(error_data, segment_index=index))
+        else:
+            errors.append(dict(error_data, audio_segment=segments[index].dict()))
+    data["errors"] = errors
+    return data
@@ -0,0 +1,126 @@
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from loguru import logger
+
+from config import get_config
+from core.processing.text_storage import save_reference_text
+
+from .auth import get_current_active_user
+from .models import UploadFileResponse
+
+logger.add(
+    "./logs/text_api.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+config = get_config()
+router = APIRouter(
+    prefix="/text", tags=["text"], dependencies=[Depends(get_current_active_user)]
+)
+
+
+@router.post(
+    "/upload",
+    response_model=UploadFileResponse,
+    status_code=200,
+    summary="""The endpoint /upload allows clients to upload reference texts and returns a unique file ID.""",
+    responses={
+        200: {"description": "The file is uploaded successfully"},
+        422: {
+            "description": "The file was not sent or the file is not a text in UTF-8",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Only text files uploads are allowed",
+                    }
+                }
+            },
+        },
+    },
+)
+async def upload_text_file(upload_file: UploadFile) -> UploadFileResponse:
+    """
+    The endpoint validates file based on
+    [MIME types specification](https://developer.mozilla.org/en-US/docs/Web/HTTP/Basics_of_HTTP/MIME_types/Common_types).
+    The text is prepared for the comparisons once at upload, then the file ID can be passed
+    as `text_file` to '_/comparison/audio/text/task_' instead of the text itself.
+
+    Parameters:
+    - **upload_file**: The text file (UTF-8) to upload
+    """
+    logger.info("Starting upload_text_file algorithm. Acquiring data.")
+    file_id = uuid4()
+
+    logger.info(f"Checking if text file (id: {file_id}) is of allowed format.")
+    if (
+        upload_file.content_type is None
+        or upload_file.content_type.split("/")[0] != "text"
+    ):
+        logger.error(
+            f"File (id: {file_id}) is of not allowed format. Raising 422 file error"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Only text files uploads are allowed",
+        )
+
+    try:
+        text = (await upload_file.read()).decode("utf-8")
+    except UnicodeDecodeError as error:
+        logger.error(f"File (id: {file_id}) is not in UTF-8. Raising 422 file error")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Only text files in UTF-8 are allowed",
+        ) from error
+
+    filepath = config.storage.text_dir / str(file_id)
+    logger.info(f"Preparing text file (id: {file_id}) and saving it to ({filepath})")
+    # the text is prepared and indexed in a thread, so the event loop keeps serving the other requests
+    await run_in_threadpool(save_reference_text, text, filepath)
+
+    logger.info(f"Text file ({file_id}) was saved successfully.")
+    return UploadFileResponse(file_id=file_id)
+
+
+@router.get(
+    "/download",
+    response_class=FileResponse,
+    status_code=200,
+    summary="""The endpoint `/download` allows to download text file by given uuid.""",
+    responses={
+        404: {
+            "description": "The specified file was not found.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "File not found",
+                    }
+                }
+            },
+        },
+    },
+)
+async def download_text_file(file: UUID) -> FileResponse:
+    """
+    The endpoint `/download` takes a file UUID as input, checks if the file exists in the
+    text directory, and returns the file as bytes. If file does not exist, returns 404 HTTP response code
+
+    Responses:
+    - 200, file bytes
+    """
+    logger.info(
+        f"Starting download_text_file algorithm. Searching for text file ({str(file)})."
+    )
+    filepath = config.storage.text_dir / str(file)
+
+    if not filepath.exists():
+        logger.error(f"File ({file}) does not exist. Returning 404 file error.")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
+        )
+
+    logger.info(f"Text file ({file}) was found. Returning file response.")
+    return FileResponse(path=filepath.as_posix(), media_type="text/plain")
@@ -0,0 +1,407 @@
+"""
+Benchmarks of the text algorithms of core.processing.text (prepare_text, match_phrases, find_phrases, locate_phrases)
+
+The phrases are readings of the corpora with reading errors injected at the given rates and split into segments
+like the ones the speech recognition gives. Every variant of every algorithm is timed on every corpus, size
+and error rate, and the wall time, the peak memory (traced by tracemalloc) and the number of cells processed
+per second are written as JSON. The results can be compared with a stored baseline, the comparison fails
+if any variant got slower than REGRESSION_THRESHOLD times the baseline.
+
+Usage (from the root of the repository):
+    python -m benchmarks.text_benchmark --output results.json
+    python -m benchmarks.text_benchmark --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from loguru import logger
+
+from core.processing import kernels
+from core.processing.text import (
+    find_phrases,
+    locate_phrases,
+    match_phrases,
+    prepare_text,
+)
+
+"""
+`CORPORA_DIR` contains the real corpora, one text per language, `SYNTHETIC_CORPUS` is the name of the corpus
+of random words generated instead of being read
+"""
+CORPORA_DIR = Path(__file__).parent / "corpora"
+SYNTHETIC_CORPUS = "synthetic"
+
+"""
+`DEFAULT_SIZES` are the numbers of words of the texts, `DEFAULT_ERROR_RATES` are the shares of the words
+of the texts that are read incorrectly (replaced, skipped or followed by an extra word)
+"""
+DEFAULT_SIZES = [100, 1_000, 5_000, 20_000]
+DEFAULT_ERROR_RATES = [0.0, 0.05, 0.2]
+
+"""
+`SEGMENT_WORDS` is the range of the numbers of words in the segments of the readings,
+`SEARCH_WORDS` is the number of words of the texts searched for by find_phrases and locate_phrases,
+`LOCATE_TEXTS` is the number of the texts searched for at once by locate_phrases
+"""
+SEGMENT_WORDS = (5, 15)
+SEARCH_WORDS = 20
+LOCATE_TEXTS = 10
+
+"""
+`MAX_CELLS` is the number of cells of the dynamic programming table above which the variants
+that compute the whole table (full and linear_memory) are skipped, they are quadratic
+"""
+MAX_CELLS = 100_000_000
+
+"""
+`VOCABULARY_SCALE` and `VOCABULARY_EXPONENT` give the number of different words of a text of n words
+by Heaps' law (VOCABULARY_SCALE * n ** VOCABULARY_EXPONENT), the texts longer than their corpus
+are continued with the words of a vocabulary of this size (see make_vocabulary)
+"""
+VOCABULARY_SCALE = 20
+VOCABULARY_EXPONENT = 0.5
+
+"""
+`REGRESSION_THRESHOLD` is the ratio of the time to the time of the baseline above which a variant regressed,
+`MIN_COMPARED_SECONDS` is the time of the baseline below which the variant is too noisy to regress
+"""
+REGRESSION_THRESHOLD = 1.5
+MIN_COMPARED_SECONDS = 0.001
+
+
+def load_corpus(name: str, seed: int) -> List[str]:
+    """
+    :param name: the name of a file of CORPORA_DIR without the extension, or SYNTHETIC_CORPUS
+    :param seed: the seed of the synthetic corpus
+    :return: the words of the corpus (with their punctuation)
+    """
+    if name != SYNTHETIC_CORPUS:
+        return (CORPORA_DIR / f"{name}.txt").read_text(encoding="utf-8").split()
+
+    generator = random.Random(seed)
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+    return [
+        "".join(generator.choices(syllables, k=generator.randint(1, 4)))
+        for _ in range(5_000)
+    ]
+
+
+def make_vocabulary(
+    corpus: List[str], size: int, generator: random.Random
+) -> List[str]:
+    """
+    Extends the words of a corpus with pseudo-words of its language: the symbols of a pseudo-word are generated
+    one by one by the frequencies of the symbols that follow the previous one in the words of the corpus
+    :param corpus: the words of a corpus
+    :param size: the number of the words of the vocabulary
+    :param generator: the random generator
+    :return: the different words of the corpus from the most frequent one, followed by the pseudo-words
+    """
+    vocabulary = [word for word, _ in Counter(corpus).most_common()]
+    known = set(vocabulary)
+    # "^" and "$" stand for the beginning and the end of a word
+    following: Dict[str, List[str]] = {}
+    for word in corpus:
+        for previous, symbol in zip("^" + word, word + "$", strict=True):
+            following.setdefault(previous, []).append(symbol)
+
+    for _ in range(100 * size):
+        if len(vocabulary) >= size:
+            break
+        symbols = [generator.choice(following["^"])]
+        while symbols[-1] != "$":
+            symbols.append(generator.choice(following[symbols[-1]]))
+        word = "".join(symbols[:-1])
+        if word not in known:
+            known.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+def make_text(corpus: List[str], words: int, generator: random.Random) -> List[str]:
+    """
+    A text longer than the corpus does not repeat it: the corpus is followed by the words sampled from
+    the vocabulary of the text size (see make_vocabulary) by Zipf's law, the word of the rank r with the weight 1 / r
+    :param corpus: the words of a corpus
+    :param words: the number of words of the text
+    :param generator: the random generator
+    :return: the words of the corpus from a random one on, or the whole corpus continued by the sampled words
+    """
+    if words <= len(corpus):
+        start = generator.randrange(len(corpus) - words + 1)
+        return corpus[start : start + words]
+
+    vocabulary = make_vocabulary(
+        corpus, int(VOCABULARY_SCALE * words**VOCABULARY_EXPONENT), generator
+    )
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    return corpus + generator.choices(vocabulary, weights, k=words - len(corpus))
+
+
+def make_reading(
+    text: List[str], corpus: List[str], error_rate: float, generator: random.Random
+) -> List[str]:
+    """
+    Injects reading errors into a text, a third of the errors each: replaced, skipped and extra words
+    :param text: the words of the text
+    :param corpus: the words the replaced and extra words are taken from
+    :param error_rate: the share of the words of the text read incorrectly
+    :param generator: the random generator
+    :return: the phrases of the reading, SEGMENT_WORDS words each
+    """
+    words: List[str] = []
+    for word in text:
+        roll = generator.random()
+        if roll >= error_rate:
+            words.append(word)
+        elif roll < error_rate / 3:
+            words.append(generator.choice(corpus))
+        elif roll >= error_rate * 2 / 3:
+            words.extend([word, generator.choice(corpus)])
+
+    phrases = []
+    position = 0
+    while position < len(words):
+        length = generator.randint(*SEGMENT_WORDS)
+        phrases.append(" ".join(words[position : position + length]))
+        position += length
+    return phrases
+
+
+def measure(function: Callable[[], Any], repeat: int) -> Tuple[float, int]:
+    """
+    :param function: the benchmarked call
+    :param repeat: the number of timed calls after an untimed one
+    :return: Tuple[the shortest wall time of the calls in seconds, the peak memory of a separate traced call in bytes]
+    """
+    # The first call compiles the kernels (if numba is installed), it is not timed
+    function()
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    # The tracing slows the call down, so it is not timed
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmarks(
+    corpora: List[str],
+    sizes: List[int],
+    error_rates: List[float],
+    repeat: int,
+    seed: int,
+) -> List[Dict[str, Any]]:
+    """
+    :param corpora: the names of the corpora (see load_corpus)
+    :param sizes: the numbers of words of the texts
+    :param error_rates: the shares of the words of the texts read incorrectly
+    :param repeat: the number of timed calls of every variant
+    :param seed: the seed of the random generators
+    :return: the list of the results, one dictionary per variant, corpus, size and error rate
+    """
+    results = []
+    for corpus_name in corpora:
+        corpus = load_corpus(corpus_name, seed)
+        for size in sizes:
+            for error_rate in error_rates:
+                generator = random.Random(f"{seed}:{corpus_name}:{size}:{error_rate}")
+                text_words = make_text(corpus, size, generator)
+                text = " ".join(text_words)
+                phrases = make_reading(text_words, corpus, error_rate, generator)
+                joined = " ".join(phrases)
+                reading_words = len(joined.split())
+                searched = [
+                    " ".join(make_text(text_words, SEARCH_WORDS, generator))
+                    for _ in range(LOCATE_TEXTS)
+                ]
+
+                # The cells are the ones of the whole table (symbols for prepare_text),
+                # so the variants that skip a part of the table process more cells per second
+                words_cells = reading_words * size
+                search_cells = len(searched[0]) * len(joined)
+                variants: List[Tuple[str, str, int, Callable[[], Any]]] = [
+                    ("prepare_text", "default", len(text), partial(prepare_text, text)),
+                    (
+                        "match_phrases",
+                        "banded",
+                        words_cells,
+                        partial(match_phrases, phrases, text, anchored=False),
+                    ),
+                    (
+                        "match_phrases",
+                        "anchored",
+                        words_cells,
+                        partial(match_phrases, phrases, text, anchored=True),
+                    ),
+                    (
+                        "match_phrases",
+                        "full",
+                        words_cells,
+                        partial(
+                            match_phrases, phrases, text, False, False, anchored=False
+                        ),
+                    ),
+                    (
+                        "match_phrases",
+                        "linear_memory",
+                        words_cells,
+                        partial(
+                            match_phrases, phrases, text, True, False, anchored=False
+                        ),
+                    ),
+                    (
+                        "find_phrases",
+                        "myers",
+                        search_cells,
+                        partial(find_phrases, phrases, searched[0], "myers"),
+                    ),
+                    (
+                        "find_phrases",
+                        "dp",
+                        search_cells,
+                        partial(find_phrases, phrases, searched[0], "dp"),
+                    ),
+                    (
+                        "locate_phrases",
+                        "default",
+                        search_cells * LOCATE_TEXTS,
+                        partial(locate_phrases, phrases, searched),
+                    ),
+                ]
+
+                for algorithm, variant, cells, function in variants:
+                    result: Dict[str, Any] = {
+                        "name": f"{algorithm}[{variant}]/{corpus_name}/{size}/{error_rate}",
+                        "algorithm": algorithm,
+                        "variant": variant,
+                        "corpus": corpus_name,
+                        "words": size,
+                        "error_rate": error_rate,
+                        "cells": cells,
+                    }
+                    if variant in ("full", "linear_memory") and cells > MAX_CELLS:
+                        result["skipped"] = f"more than {MAX_CELLS} cells"
+                    else:
+                        seconds, peak = measure(function, repeat)
+                        result["seconds"] = seconds
+                        result["peak_bytes"] = peak
+                        result["cells_per_second"] = cells / seconds if seconds else 0
+                    logger.info(f"{result['name']}: {result.get('seconds', 'skipped')}")
+                    results.append(result)
+    return results
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float
+) -> List[str]:
+    """
+    :param results: the results of run_benchmarks
+    :param baseline: the results of an earlier run
+    :param threshold: the ratio of the time to the time of the baseline above which a variant regressed
+    :return: the names of the regressed variants
+    """
+    baseline_by_name = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline_by_name.get(result["name"])
+        if before is None or "seconds" not in result or "seconds" not in before:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else 1.0
+        memory_ratio = (
+            result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+        )
+        result["baseline_ratio"] = ratio
+        result["baseline_memory_ratio"] = memory_ratio
+        print(f"{result['name']:<60} time x{ratio:.2f} memory x{memory_ratio:.2f}")
+        if ratio > threshold and before["seconds"] >= MIN_COMPARED_SECONDS:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--corpora", nargs="+", default=[SYNTHETIC_CORPUS, "eng", "rus", "ara"]
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--error-rates", nargs="+", type=float, default=DEFAULT_ERROR_RATES
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--pure",
+        action="store_true",
+        help="benchmark the pure python implementation even if numba is installed",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="the file the results are written to"
+    )
+    parser.add_argument("--baseline", type=Path, help="the results to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    arguments = parser.parse_args()
+
+    # The log files of the algorithms would be a large part of the measured time
+    logger.remove()
+    logger.add(sys.stderr, format="{message}", filter=__name__)
+    if arguments.pure:
+        kernels.AVAILABLE = False
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "compiled": kernels.AVAILABLE,
+            "repeat": arguments.repeat,
+            "seed": arguments.seed,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": run_benchmarks(
+            arguments.corpora,
+            arguments.sizes,
+            arguments.error_rates,
+            arguments.repeat,
+            arguments.seed,
+        ),
+    }
+
+    regressions: List[str] = []
+    if arguments.baseline is not None:
+        baseline = json.loads(arguments.baseline.read_text())
+        if baseline["meta"]["compiled"] != report["meta"]["compiled"]:
+            logger.warning("The baseline was measured with another implementation.")
+        regressions = compare(
+            report["results"], baseline["results"], arguments.threshold
+        )
+        report["regressions"] = regressions
+
+    if arguments.output is not None:
+        arguments.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    for name in regressions:
+        logger.error(f"{name} is slower than the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
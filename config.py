@@ -1,5 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseConfig, BaseSettings, Field
 
@@ -17,6 +18,24 @@ class Config(BaseSettings):
         files_dir: Path = Path("temp_data")
         image_dir: Path = files_dir / "image"
         audio_dir: Path = files_dir / "audio"
+        text_dir: Path = files_dir / "text"
+        audio_format: Literal["mp3", "pcm"] = "mp3"
+
+    class Cache(BaseSettings):
+        memory_entries: int = 256
+        memory_bytes: int = 256 * 2**20
+        redis_enabled: bool = False
+        redis_entries: int = 10_000
+        ttl_seconds: int = 24 * 60 * 60
+        task_data_ttl_seconds: int = 24 * 60 * 60
+
+    class Parallel(BaseSettings):
+        workers: int = 0
+        min_chunk_words: int = 2_000
+
+    class LongAudio(BaseSettings):
+        min_seconds: float = 600
+        chunk_seconds: float = 30
 
     class Token(BaseSettings):
         secket_key: str = Field(..., env="SECRET_KEY")
@@ -26,6 +45,9 @@ class Config(BaseSettings):
     redis: Redis
     storage: Storage
     token: Token
+    cache: Cache = Cache()
+    parallel: Parallel = Parallel()
+    long_audio: LongAudio = LongAudio()
 
 
 @lru_cache
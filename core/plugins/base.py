@@ -1,4 +1,4 @@
-from typing import List, Protocol, runtime_checkable
+from typing import Iterator, List, Protocol, runtime_checkable
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -54,7 +54,8 @@ class ImageTaskResult(ImageProcessingResult):
 
 
 class TextDiff(BaseModel):
-    audio_segment: AudioSegment
+    # the index of the audio segment in the `segments` of the audio result
+    segment_index: int
     at_char: int
     found: str
     expected: str
@@ -75,6 +76,7 @@ class AudioPhrase(BaseModel):
     audio_segment: AudioSegment | None
     found: bool
     phrase: str
+    distance: int | None = None
 
 
 class AudioExtractPhrasesResponse(BaseModel):
@@ -131,3 +133,23 @@ class AudioProcessingPlugin(BasePlugin, Protocol):
 statis method within `AudioProcessingPlugin` protocol to process audio
 """
 AudioProcessingFunction = AudioProcessingPlugin.process_audio.__name__
+
+
+@runtime_checkable
+class StreamingAudioProcessingPlugin(AudioProcessingPlugin, Protocol):
+    """
+    `StreamingAudioProcessingPlugin` is a protocol of the audio plugins, which also implement
+    method called `stream_audio`, which accepts filename (string) as a parameter
+    and yields the chunks of the audio as soon as they are transcribed
+    """
+
+    @staticmethod
+    def stream_audio(filename: str) -> Iterator[AudioChunk]:
+        ...
+
+
+"""
+`AudioStreamingFunction` is a constant string variable, which contains the name of
+static method within `StreamingAudioProcessingPlugin` protocol to transcribe audio chunk by chunk
+"""
+AudioStreamingFunction = StreamingAudioProcessingPlugin.stream_audio.__name__
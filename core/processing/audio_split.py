@@ -1,12 +1,21 @@
 from math import log10 as lg
-from typing import List, Tuple
+from typing import Any, Iterable, Iterator, List, Tuple
 from uuid import UUID, uuid4
 
-from librosa import get_duration
+import numpy as np
 from loguru import logger
-from pydub import AudioSegment, silence
+from pydub import AudioSegment
 
 from config import get_config
+from core.processing.pcm_cache import (
+    PCM_SAMPLE_RATE,
+    PCM_SAMPLE_WIDTH,
+    load_pcm,
+    pcm_audio_segment,
+    pcm_blocks,
+    pcm_duration,
+    store_audio,
+)
 
 config = get_config()
 
@@ -21,7 +30,7 @@ def duration(audio: str) -> float:
     logger.info("Starting 'duration' algorithm.")
     filepath = config.storage.audio_dir / audio
     logger.info(f"Returning duration of the audio ({audio})")
-    return get_duration(path=filepath)
+    return pcm_duration(filepath)
 
 
 def dbfs_to_fraction(dbfs: float) -> float:
@@ -45,77 +54,195 @@ def fraction_to_dbfs(fraction: float) -> float:
 
 
 def split_audio(  # type: ignore
-    file: str | AudioSegment, intervals: List[Tuple[float, float]]
+    file: str | AudioSegment | np.ndarray, intervals: List[Tuple[float, float]]
 ) -> List[UUID]:
     """
     Splits the audio using timestamps for beginning and end
     Supports mul
-    :param file: path to the audio file or pydub.AudioSegment
+    :param file: path to the audio file, pydub.AudioSegment or the decoded samples of the file (see load_pcm)
     :param intervals: a list of segments, given by the timestamps to the beginning and end (in seconds)
     :return: the uuids of the cut-up files (in order of appearance in intervals)
     """
 
     logger.info("Starting split_audio algorithm.")
 
-    # Creating the pydub.AudioSegment if it is not already created
+    # Only the cut-up parts of the decoded samples are copied
     if isinstance(file, str):
-        audio: AudioSegment = AudioSegment.from_file(file)  # type: ignore
+        file = load_pcm(file)
+    if isinstance(file, np.ndarray):
+        samples = file
+
+        def cut(begin: int, end: int) -> np.ndarray:
+            # The part of the interval outside the audio (e.g. the padding of split_silence) is silent
+            part = np.zeros(max(0, end - begin), dtype=np.int16)
+            inside = slice(max(0, begin), min(len(samples), end))
+            if inside.start < inside.stop:
+                part[inside.start - begin : inside.stop - begin] = samples[inside]
+            return part
+
+        parts: Iterator[AudioSegment] = (  # type: ignore
+            pcm_audio_segment(
+                cut(int(begin * PCM_SAMPLE_RATE), int(end * PCM_SAMPLE_RATE))
+            )
+            for begin, end in intervals
+        )
     elif isinstance(file, AudioSegment):
         audio = file
+        parts = (audio[int(begin * 1000) : int(end * 1000)] for begin, end in intervals)
     else:
         raise TypeError("Invalid argument")
 
     # Cutting up the file and storing it
     files: List[UUID] = []
-    for i in range(len(intervals)):
+    for part in parts:
         file_id = uuid4()
-        audio[int(intervals[i][0] * 1000) : int(intervals[i][1] * 1000)].export(
-            config.storage.audio_dir / str(file_id), format="mp3"
-        )
+        store_audio(part, config.storage.audio_dir / str(file_id))
         files.append(file_id)
 
     logger.info("Process split_audio has ended. Returning the resulted files.")
     return files
 
 
-def split_silence(
+def detect_silence(
+    blocks: Iterable[np.ndarray],
+    min_silence_len: int = 100,
+    silence_thresh: float = -16,
+    seek_step: int = 1,
+) -> List[Tuple[int, int]]:
+    """
+    Finds the silent sections of the audio, the same ones as pydub.silence.detect_silence
+    The audio is read block by block: the energy of every ms is summed up, and the rms of every window
+    of min_silence_len ms, starting at every ms, is computed at once from their cumulative sum
+    :param blocks: the blocks of the decoded samples (see pcm_blocks)
+    :param min_silence_len: the minimum length of a silent section (in ms)
+    :param silence_thresh: the upper bound for how quiet is silent (in dBFS)
+    :param seek_step: the step between the beginnings of the windows (in ms), the last window is checked as well
+    :return: the list of the silent sections, given by their beginning and end (in ms)
+    """
+    logger.info("Starting detect_silence algorithm.")
+    step = PCM_SAMPLE_RATE // 1000
+    threshold = dbfs_to_fraction(silence_thresh) * 2 ** (8 * PCM_SAMPLE_WIDTH - 1)
+
+    sections: List[Tuple[int, int]] = []
+    # the beginning of the current section and the last silent window in it
+    section_begin = last_silent = -1
+
+    # the energies and the numbers of samples of the ms the next windows begin with
+    energies = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(0, dtype=np.int64)
+    first_window = 0
+    rest = np.zeros(0, dtype=np.int16)
+    total = 0
+
+    def apart(distance: Any) -> Any:
+        # the silent windows are combined if they overlap (or touch) or follow each other by seek_step
+        return (distance > min_silence_len) & (distance != seek_step)
+
+    def add_windows(windows: int, last: int = -1) -> None:
+        nonlocal energies, counts, first_window, section_begin, last_silent
+        energy_sums = np.concatenate(([0], np.cumsum(energies)))
+        count_sums = np.concatenate(([0], np.cumsum(counts)))
+        window_energies = (
+            energy_sums[min_silence_len : min_silence_len + windows]
+            - energy_sums[:windows]
+        )
+        window_counts = (
+            count_sums[min_silence_len : min_silence_len + windows]
+            - count_sums[:windows]
+        )
+        # audioop.rms truncates the root to an integer
+        rms = np.floor(np.sqrt(window_energies / window_counts))
+        starts = first_window + np.flatnonzero(rms <= threshold)
+        starts = starts[(starts % seek_step == 0) | (starts == last)]
+        energies, counts = energies[windows:], counts[windows:]
+        first_window += windows
+        if len(starts) == 0:
+            return
+
+        # The silent windows that are close enough are combined into one section
+        if last_silent < 0:
+            section_begin = int(starts[0])
+        elif apart(starts[0] - last_silent):
+            sections.append((section_begin, last_silent + min_silence_len))
+            section_begin = int(starts[0])
+        gaps = np.flatnonzero(apart(np.diff(starts)))
+        begins = [section_begin] + starts[gaps + 1].tolist()
+        ends = (starts[gaps] + min_silence_len).tolist()
+        sections.extend(zip(begins[:-1], ends, strict=True))
+        section_begin, last_silent = begins[-1], int(starts[-1])
+
+    for block in blocks:
+        total += len(block)
+        samples = np.concatenate((rest, block))
+        whole = len(samples) // step * step
+        rest = samples[whole:]
+        energies = np.concatenate(
+            (
+                energies,
+                np.square(samples[:whole], dtype=np.int64).reshape(-1, step).sum(1),
+            )
+        )
+        counts = np.concatenate((counts, np.full(whole // step, step)))
+        # Only the windows of the whole ms read so far are computed, but the last one (see below)
+        if len(energies) > min_silence_len:
+            add_windows(len(energies) - min_silence_len)
+
+    # The length in ms is rounded the way len(pydub.AudioSegment) is
+    length = round(1000 * (total / PCM_SAMPLE_RATE))
+    if length < min_silence_len:
+        return []
+    # The windows are cut like pydub does: at whole ms and clipped by the end of the audio
+    if len(rest):
+        energies = np.append(energies, np.square(rest, dtype=np.int64).sum())
+        counts = np.append(counts, len(rest))
+    add_windows(length - min_silence_len + 1 - first_window, length - min_silence_len)
+    if last_silent >= 0:
+        sections.append((section_begin, last_silent + min_silence_len))
+    return sections
+
+
+def silence_intervals(
     file: str, max_interval: float = 30, cutoff_ratio: float = 0.05
-) -> Tuple[List[UUID], List[Tuple[int, int]]]:
+) -> Tuple[List[Tuple[int, int]], int]:
     """
-    Splits the audio file into segments of some length
-    Only cuts on silence, never cuts words
-    Leaves a 50 ms buffer around every segment
-    :param file: the path to the file to be split
-    :param max_interval: the maximum length of a segment
+    Finds the intervals to split the audio at, only on silence, never cutting words
+    Leaves a 50 ms buffer around every interval
+    The audio is padded with silence if it does not begin or end with it
+    :param file: the path to the audio file
+    :param max_interval: the maximum length of an interval
     :param cutoff_ratio: the percentage of max volume at which a segment is considered "silent"
-    :return: the list of the UUIDs of all the cut-up segments and the intervals at which they were cut
+    :return: the intervals in the padded audio (in ms) and the length of the silence added at the beginning (in ms)
     """
+    logger.info("Starting silence_intervals algorithm.")
 
-    logger.info("Starting split_silence algorithm.")
-
-    # Creating the pydub.AudioSegment and preparing some variables for audio processing
-    audio: AudioSegment = AudioSegment.from_file(file, file[file.rfind(".") + 1 :])  # type: ignore
-    max_dbfs = audio.max_dBFS
+    # Preparing some variables for audio processing, the audio is read twice block by block
+    max_amplitude = 2 ** (8 * PCM_SAMPLE_WIDTH - 1)
+    # The int16 minimum has no absolute value in int16, so the extremes are compared as integers
+    peak = max((max(int(b.max()), -int(b.min())) for b in pcm_blocks(file)), default=0)
+    max_dbfs = fraction_to_dbfs(peak / max_amplitude)
     noise_level = fraction_to_dbfs(cutoff_ratio * dbfs_to_fraction(max_dbfs))
 
     # Detecting the silence
-    silence_chunks = silence.detect_silence(
-        audio, min_silence_len=100, silence_thresh=noise_level
+    silence_chunks = detect_silence(
+        pcm_blocks(file), min_silence_len=100, silence_thresh=noise_level
     )
     audio_intervals = []
 
     # Padding the audio if it does not begin or end with silence
     max_interval *= 1000
-    if silence_chunks[0][0] != 0:
-        audio = AudioSegment.silent(100) + audio
+    lead = 0
+    if not silence_chunks or silence_chunks[0][0] != 0:
         silence_chunks = [
             (silence_chunks[i][0] + 100, silence_chunks[i][1] + 100)
             for i in range(len(silence_chunks))
         ]
         silence_chunks.insert(0, (0, 100))
-    if silence_chunks[-1][1] != len(audio):
-        silence_chunks.append((len(audio), len(audio) + 100))
-        audio = audio + AudioSegment.silent(100)
+        lead = 100
+    # The length of the padded audio is rounded the way len(pydub.AudioSegment) is
+    padded = len(load_pcm(file)) + lead * PCM_SAMPLE_RATE // 1000
+    length = round(1000 * (padded / PCM_SAMPLE_RATE))
+    if silence_chunks[-1][1] != length:
+        silence_chunks.append((length, length + 100))
     new_beg = silence_chunks[0][1] - 50
 
     # Accumulating words until we reach the threshold
@@ -126,10 +253,33 @@ def split_silence(
 
     audio_intervals.append((new_beg, silence_chunks[-1][0] + 50))
 
+    logger.info("Process silence_intervals has ended. Returning the result.")
+    return audio_intervals, lead
+
+
+def split_silence(
+    file: str, max_interval: float = 30, cutoff_ratio: float = 0.05
+) -> Tuple[List[UUID], List[Tuple[int, int]]]:
+    """
+    Splits the audio file into segments of some length
+    Only cuts on silence, never cuts words
+    Leaves a 50 ms buffer around every segment
+    :param file: the path to the file to be split
+    :param max_interval: the maximum length of a segment
+    :param cutoff_ratio: the percentage of max volume at which a segment is considered "silent"
+    :return: the list of the UUIDs of all the cut-up segments and the intervals at which they were cut
+    """
+
+    logger.info("Starting split_silence algorithm.")
+    audio_intervals, lead = silence_intervals(file, max_interval, cutoff_ratio)
+
     logger.info("Process split_silence has ended. Returning the result.")
 
-    # Split by counted intervals and return the result
+    # Split by counted intervals (the padding is cut as silence) and return the result
     return (
-        split_audio(audio, [(i[0] / 1000, i[1] / 1000) for i in audio_intervals]),
+        split_audio(
+            file,
+            [((i[0] - lead) / 1000, (i[1] - lead) / 1000) for i in audio_intervals],
+        ),
         audio_intervals,
     )
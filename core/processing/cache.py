@@ -0,0 +1,291 @@
+import pickle
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from typing import Any, Callable, Dict, List, Sequence, Tuple, cast
+
+from loguru import logger
+from redis import Redis, RedisError
+
+from core.processing.text import (
+    ALGORITHM_VERSION,
+    PhraseAlignment,
+    PreparedText,
+    align_phrases,
+    locate_phrases,
+    phrase_errors,
+    prepare_text,
+)
+
+logger.add(
+    "./logs/cache.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`REDIS_KEY_PREFIX` is the prefix of the redis keys of the cached alignments,
+the key `REDIS_KEY_PREFIX + "index"` is the sorted set of the cached keys by the time they were stored,
+the key `REDIS_KEY_PREFIX + "stats"` is the hash of the hit and miss counters of all the workers
+"""
+REDIS_KEY_PREFIX = "alignment_cache:"
+
+
+class AlignmentCache:
+    """
+    `AlignmentCache` memoizes the results of align_phrases (match_phrases) and find_phrases (locate_phrases).
+    The results are keyed by a hash of the prepared phrases and texts (so the case and the punctuation
+    do not matter), the parameters and ALGORITHM_VERSION.
+    They are kept in the in-process LRU tier, which holds at most `memory_entries` results of at most
+    `memory_bytes` bytes in total (measured by their pickled size, an alignment holds the whole prepared text
+    it was aligned with), and, if a redis connection is given, in the redis tier shared by the workers,
+    where they expire after `ttl` seconds and the oldest ones are evicted once there are more than
+    `redis_entries` of them.
+    The missing alignments are computed by `align` (text.align_phrases or parallel.ParallelAligner.align_phrases)
+    """
+
+    def __init__(
+        self,
+        memory_entries: int,
+        memory_bytes: int,
+        redis: Redis | None = None,
+        redis_entries: int = 0,
+        ttl: int = 0,
+        align: Callable[..., PhraseAlignment] = align_phrases,
+    ) -> None:
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.redis = redis
+        self.redis_entries = redis_entries
+        self.ttl = ttl
+        self.align = align
+        # the results by their keys with their pickled sizes
+        self.memory: OrderedDict[str, Tuple[Any, int]] = OrderedDict()
+        self.memory_size = 0
+        self.lock = Lock()
+        # the hit and miss counters of the process, they are added up in redis as well
+        self.counters = {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+
+    def match_phrases(
+        self, phrases: List[str], text: str | PreparedText, **parameters: Any
+    ) -> List[List[Tuple[int, str, str]]]:
+        """
+        Cached version of text.match_phrases
+        :param phrases: a list of phrases to be checked
+        :param text: the "correct" text or the text prepared by prepare_text
+        :param parameters: the keyword parameters of text.match_phrases
+        :return: the list of errors by phrases (see text.match_phrases)
+        """
+        return phrase_errors(self.align_phrases(phrases, text, **parameters))
+
+    def align_phrases(
+        self, phrases: List[str], text: str | PreparedText, **parameters: Any
+    ) -> PhraseAlignment:
+        """
+        Cached version of text.align_phrases
+        :param phrases: a list of phrases to be checked
+        :param text: the "correct" text or the text prepared by prepare_text
+        :param parameters: the keyword parameters of text.align_phrases
+        :return: the alignment of the phrases with the text (see text.align_phrases)
+        """
+        prepared_text = text if isinstance(text, PreparedText) else prepare_text(text)
+        prepared_phrases = prepare_text(" ".join(phrases))
+        key = self._key(
+            "align_phrases",
+            prepared_phrases.text,
+            prepared_text.text,
+            sorted(parameters.items()),
+        )
+
+        result: PhraseAlignment | None = self.get(key)
+        if result is None:
+            result = self.align(
+                phrases, prepared_text, prepared_phrases=prepared_phrases, **parameters
+            )
+            self.put(key, result)
+        # The cached alignment may be of the phrases with another case or punctuation,
+        # the words are the same, but the errors are given in the symbols of these phrases
+        return PhraseAlignment(phrases, prepared_phrases, result.text, result.script)
+
+    def find_phrases(self, phrases: List[str], to_find: str) -> Tuple[List[int], int]:
+        """
+        Cached version of text.find_phrases
+        :param phrases: a list of phrases
+        :param to_find: the text to be found
+        :return: Tuple[the indices of the phrases which compose to_find, the levenshtein distance]
+        """
+        return self.locate_phrases(phrases, [to_find])[0]
+
+    def locate_phrases(
+        self, phrases: List[str], to_find: Sequence[str]
+    ) -> List[Tuple[List[int], int]]:
+        """
+        Cached version of text.locate_phrases, every text to be found is cached separately,
+        and only the ones that are not cached are located
+        :param phrases: a list of phrases
+        :param to_find: the texts to be found
+        :return: the list of Tuple[the indices of the phrases which compose the text, the levenshtein distance]
+        """
+        prepared_phrases = prepare_text(" ".join(phrases))
+        # The indices of the found phrases depend on where the phrases end in the prepared text
+        ends = array("I")
+        phrase_end = -1
+        for phrase in phrases:
+            phrase_end += len(phrase) + 1
+            ends.append(bisect_left(prepared_phrases.indices, phrase_end))
+
+        answers: List[Tuple[List[int], int] | None] = []
+        keys: List[str] = []
+        missing: Dict[int, PreparedText] = {}
+        for index, text in enumerate(to_find):
+            prepared_text = prepare_text(text)
+            keys.append(
+                self._key(
+                    "find_phrases", prepared_phrases.text, prepared_text.text, ends
+                )
+            )
+            answers.append(self.get(keys[-1]))
+            if answers[-1] is None:
+                missing[index] = prepared_text
+
+        if len(missing) != 0:
+            located = locate_phrases(phrases, list(missing.values()), prepared_phrases)
+            for index, answer in zip(missing, located, strict=True):
+                answers[index] = answer
+                self.put(keys[index], answer)
+
+        return answers  # type: ignore
+
+    def get(self, key: str) -> Any:
+        """
+        Looks the result up in the in-process tier and then in the redis tier
+        :param key: the key of the result
+        :return: the cached result or None
+        """
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached is not None:
+                self.memory.move_to_end(key)
+        if cached is not None:
+            self._count("memory_hits")
+            return cached[0]
+
+        if self.redis is not None:
+            try:
+                value = self.redis.get(REDIS_KEY_PREFIX + key)
+            except RedisError as error:
+                logger.error(f"Failed to read the alignment cache: {error}")
+                value = None
+            if value is not None:
+                result = pickle.loads(value)  # type: ignore[arg-type]
+                self._remember(key, result, len(value))
+                self._count("redis_hits")
+                return result
+
+        self._count("misses")
+        return None
+
+    def put(self, key: str, result: Any) -> None:
+        """
+        Stores the result in both tiers, evicting the least recently used results from the in-process tier
+        and the oldest results from the redis tier if they are full
+        :param key: the key of the result
+        :param result: the result to be stored
+        """
+        value = pickle.dumps(result)
+        self._remember(key, result, len(value))
+        if self.redis is None:
+            return
+
+        index = REDIS_KEY_PREFIX + "index"
+        now = time.time()
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.set(REDIS_KEY_PREFIX + key, value, ex=self.ttl)
+            pipeline.zadd(index, {key: now})
+            # The expired results are not counted
+            pipeline.zremrangebyscore(index, "-inf", now - self.ttl)
+            pipeline.zcard(index)
+            size = pipeline.execute()[-1]
+            if size > self.redis_entries:
+                evicted = cast(
+                    List[Tuple[bytes, float]],
+                    self.redis.zpopmin(index, size - self.redis_entries),
+                )
+                self.redis.delete(*[REDIS_KEY_PREFIX + k.decode() for k, _ in evicted])
+        except RedisError as error:
+            logger.error(f"Failed to write the alignment cache: {error}")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: the counters of the hits and misses of the cache in this process, the number of the results
+                 in its memory and their pickled size, and the counters of all the workers (`total_` ones),
+                 which are the ones of this process if there is no redis tier
+        """
+        with self.lock:
+            stats = dict(
+                self.counters,
+                memory_entries=len(self.memory),
+                memory_bytes=self.memory_size,
+            )
+        totals = {name: stats[name] for name in self.counters}
+        if self.redis is not None:
+            try:
+                values = self.redis.hgetall(REDIS_KEY_PREFIX + "stats")
+                totals = {name: int(values.get(name.encode(), 0)) for name in totals}
+            except RedisError as error:
+                logger.error(f"Failed to read the alignment cache counters: {error}")
+        stats.update({"total_" + name: value for name, value in totals.items()})
+        return stats
+
+    def _count(self, counter: str) -> None:
+        """
+        Increments a counter of the hits and misses of the process and its total in redis
+        :param counter: the name of the counter
+        """
+        with self.lock:
+            self.counters[counter] += 1
+        if self.redis is None:
+            return
+        try:
+            self.redis.hincrby(REDIS_KEY_PREFIX + "stats", counter, 1)
+        except RedisError as error:
+            logger.error(f"Failed to count the alignment cache {counter}: {error}")
+
+    def _remember(self, key: str, result: Any, size: int) -> None:
+        """
+        Stores the result in the in-process tier, unless it is larger than the whole tier
+        :param key: the key of the result
+        :param result: the result to be stored
+        :param size: the pickled size of the result
+        """
+        with self.lock:
+            if key in self.memory:
+                self.memory_size -= self.memory.pop(key)[1]
+            if size > self.memory_bytes:
+                return
+            self.memory[key] = (result, size)
+            self.memory_size += size
+            while (
+                len(self.memory) > self.memory_entries
+                or self.memory_size > self.memory_bytes
+            ):
+                self.memory_size -= self.memory.popitem(last=False)[1][1]
+
+    @staticmethod
+    def _key(function: str, phrases: str, text: str, *parameters: Any) -> str:
+        """
+        Hashes the inputs of an alignment
+        :param function: the name of the cached function
+        :param phrases: the phrases joined with spaces and prepared by prepare_text
+        :param text: the prepared text the phrases are compared with
+        :param parameters: any other inputs that change the result
+        :return: the hex digest of the inputs
+        """
+        digest = blake2b(digest_size=16)
+        digest.update(f"{ALGORITHM_VERSION}\0{function}\0{len(phrases)}\0".encode())
+        digest.update(f"{phrases}\0{text}\0{parameters!r}".encode())
+        return digest.hexdigest()
@@ -0,0 +1,354 @@
+from array import array
+from typing import Tuple
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+    njit = None  # type: ignore[assignment]
+
+"""
+`AVAILABLE` tells whether numba is installed and the compiled kernels can be used,
+otherwise the text processing falls back to the pure python implementation
+"""
+AVAILABLE = njit is not None
+
+"""
+Codes of the transitions found by backtracking the levenshtein dynamic programming table:
+`EQUAL` - the entries of both texts are the same,
+`REPLACE` - the entry of the first text is replaced by the entry of the second one,
+`DELETE` - the entry of the first text is removed,
+`INSERT` - the entry of the second text is inserted
+"""
+EQUAL = 0
+REPLACE = 1
+DELETE = 2
+INSERT = 3
+
+"""
+`BAND_INFINITY` is the value of the cells outside the band of the banded levenshtein table
+"""
+BAND_INFINITY = 1 << 30
+
+
+def as_array(ids: array) -> "np.ndarray":
+    """
+    Wraps token ids into an int32 numpy array without copying, so they can be passed to the compiled kernels
+    :param ids: the ids of the entries of a text (see text.__tokenize)
+    :return: the numpy view of the ids
+    """
+    return np.frombuffer(ids, dtype=np.int32)
+
+
+def first_row(length: int) -> "np.ndarray":
+    """
+    Creates the first row of the levenshtein dynamic programming table for the compiled kernels
+    :param length: the length of the second text
+    :return: the array [0, 1, ..., length]
+    """
+    return np.arange(length + 1, dtype=np.int32)
+
+
+def kept_symbols(text: str) -> Tuple[str, array]:
+    """
+    Vectorized removal of the non-letter symbols of a text and collapsing of its spaces (see text.prepare_text)
+    The letters are told apart by a lookup table indexed by the code points, built from the distinct symbols only
+    :param text: the text to be prepared
+    :return: Tuple[the kept symbols (not lowercased), the indices of the kept symbols in the text, array of type 'I']
+    """
+    codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    if codes.shape[0] == 0:
+        return "", array("I")
+
+    letters = [ord(symbol) for symbol in set(text) if symbol.isalpha()]
+    lookup = np.zeros(max(int(codes.max()), ord(" ")) + 1, dtype=np.bool_)
+    lookup[letters] = True
+    lookup[ord(" ")] = True
+
+    indices = np.flatnonzero(lookup[codes])
+    kept = codes[indices]
+
+    # A space is dropped if the previous kept symbol is a space or if it is the first kept symbol
+    spaces = kept == ord(" ")
+    dropped = spaces & np.concatenate(([True], spaces[:-1]))
+    indices = indices[~dropped]
+    kept = kept[~dropped]
+
+    # Cut off the space in the end
+    if kept.shape[0] != 0 and kept[-1] == ord(" "):
+        indices = indices[:-1]
+        kept = kept[:-1]
+
+    return (
+        kept.tobytes().decode("utf-32-le", "surrogatepass"),
+        array("I", indices.astype(np.uint32).tobytes()),
+    )
+
+
+if AVAILABLE:
+
+    @njit(cache=True)
+    def levenshtein_rows(first, second, top_row, row_begin, row_end, keep_rows):  # type: ignore
+        """
+        Compiled version of computing the rows of the levenshtein dynamic programming table
+        :param first: the encoded first text
+        :param second: the encoded second text
+        :param top_row: the values of the table in the row row_begin
+        :param row_begin: the index of the row given by top_row
+        :param row_end: the index of the last row to be computed
+        :param keep_rows: whether all the rows are returned or only the last one
+        :return: 2d array of the rows from row_begin to row_end if keep_rows is set, otherwise of the row row_end
+        """
+        width = top_row.shape[0]
+        count = row_end - row_begin + 1
+        if not keep_rows:
+            count = min(count, 2)
+
+        rows = np.empty((count, width), dtype=np.int32)
+        rows[0, :] = top_row
+        for i in range(row_begin + 1, row_end + 1):
+            previous = rows[(i - 1 - row_begin) % count]
+            current = rows[(i - row_begin) % count]
+            symbol = first[i - 1]
+            current[0] = i
+            for j in range(1, width):
+                best = previous[j - 1]
+                if symbol != second[j - 1]:
+                    best += 1
+                if previous[j] + 1 < best:
+                    best = previous[j] + 1
+                if current[j - 1] + 1 < best:
+                    best = current[j - 1] + 1
+                current[j] = best
+
+        if keep_rows:
+            return rows
+        last = (row_end - row_begin) % count
+        return rows[last : last + 1]
+
+    @njit(cache=True)
+    def backtrack_rows(first, second, rows, row_begin, current_row, current_column):  # type: ignore
+        """
+        Compiled version of backtracking the levenshtein dynamic programming table inside a block of rows
+        :param first: the encoded first text
+        :param second: the encoded second text
+        :param rows: the rows of the table, rows[0] being the row row_begin
+        :param row_begin: the index of the first row of the block
+        :param current_row: the row from which the backtracking starts
+        :param current_column: the column from which the backtracking starts
+        :return: Tuple[the codes of the found transitions,
+                       the row at which the backtracking has stopped,
+                       the column at which the backtracking has stopped]
+        """
+        operations = np.empty(current_row - row_begin + current_column, dtype=np.int8)
+        count = 0
+        while current_row > row_begin and current_column != 0:
+            if first[current_row - 1] == second[current_column - 1]:
+                operations[count] = EQUAL
+                current_row -= 1
+                current_column -= 1
+            else:
+                upper = rows[current_row - 1 - row_begin]
+                lower = rows[current_row - row_begin]
+                optimal = min(
+                    upper[current_column - 1],
+                    upper[current_column],
+                    lower[current_column - 1],
+                )
+                if optimal == upper[current_column - 1]:
+                    operations[count] = REPLACE
+                    current_row -= 1
+                    current_column -= 1
+                elif optimal == upper[current_column]:
+                    operations[count] = DELETE
+                    current_row -= 1
+                else:
+                    operations[count] = INSERT
+                    current_column -= 1
+            count += 1
+
+        return operations[:count], current_row, current_column
+
+    @njit(cache=True)
+    def levenshtein_band(first, second, width, max_distance):  # type: ignore
+        """
+        Compiled version of computing the levenshtein dynamic programming table inside a band around the diagonal
+        The cell (i, j) is stored as band[i, j - i + width], the cells outside the band are BAND_INFINITY
+        :param first: the encoded first text
+        :param second: the encoded second text
+        :param width: the number of diagonals on each side of the main one that are computed
+        :param max_distance: the computation is abandoned once a whole row exceeds it
+        :return: Tuple[the band, the minimum of the row at which the computation was abandoned or -1]
+        """
+        rows = first.shape[0] + 1
+        columns = second.shape[0]
+        band = np.full((rows, 2 * width + 1), BAND_INFINITY, dtype=np.int32)
+        for j in range(min(width, columns) + 1):
+            band[0, j + width] = j
+
+        for i in range(1, rows):
+            symbol = first[i - 1]
+            row_minimum = BAND_INFINITY
+            for b in range(max(0, width - i), min(2 * width, columns - i + width) + 1):
+                j = i + b - width
+                if j == 0:
+                    best = i
+                else:
+                    best = band[i - 1, b]
+                    if symbol != second[j - 1]:
+                        best += 1
+                    if b < 2 * width and band[i - 1, b + 1] + 1 < best:
+                        best = band[i - 1, b + 1] + 1
+                    if b > 0 and band[i, b - 1] + 1 < best:
+                        best = band[i, b - 1] + 1
+                band[i, b] = best
+                if best < row_minimum:
+                    row_minimum = best
+            if row_minimum > max_distance:
+                return band, row_minimum
+
+        return band, -1
+
+    @njit(cache=True)
+    def backtrack_band(first, second, band, width, current_row, current_column):  # type: ignore
+        """
+        Compiled version of backtracking the banded levenshtein dynamic programming table
+        :param first: the encoded first text
+        :param second: the encoded second text
+        :param band: the band computed by levenshtein_band
+        :param width: the number of diagonals on each side of the main one in the band
+        :param current_row: the row from which the backtracking starts
+        :param current_column: the column from which the backtracking starts
+        :return: Tuple[the codes of the found transitions,
+                       the row at which the backtracking has stopped,
+                       the column at which the backtracking has stopped]
+        """
+        operations = np.empty(current_row + current_column, dtype=np.int8)
+        count = 0
+        while current_row > 0 and current_column != 0:
+            if first[current_row - 1] == second[current_column - 1]:
+                operations[count] = EQUAL
+                current_row -= 1
+                current_column -= 1
+            else:
+                b = current_column - current_row + width
+                diagonal = band[current_row - 1, b]
+                upper = BAND_INFINITY
+                if b < 2 * width:
+                    upper = band[current_row - 1, b + 1]
+                left = BAND_INFINITY
+                if b > 0:
+                    left = band[current_row, b - 1]
+                optimal = min(diagonal, upper, left)
+                if optimal == diagonal:
+                    operations[count] = REPLACE
+                    current_row -= 1
+                    current_column -= 1
+                elif optimal == upper:
+                    operations[count] = DELETE
+                    current_row -= 1
+                else:
+                    operations[count] = INSERT
+                    current_column -= 1
+            count += 1
+
+        return operations[:count], current_row, current_column
+
+    @njit(cache=True)
+    def semi_global_alignment(pattern, text):  # type: ignore
+        """
+        Compiled version of finding the substring of the text with the minimal levenshtein distance to the pattern
+        :param pattern: the encoded pattern
+        :param text: the encoded text
+        :return: Tuple[the distance, the beginning of the substring, the end of the substring (exclusive)]
+        """
+        rows = pattern.shape[0]
+        column = np.arange(rows + 1).astype(np.int32)
+        starts = np.zeros(rows + 1, dtype=np.int32)
+        best, best_start, best_end = rows, 0, 0
+
+        for j in range(1, text.shape[0] + 1):
+            symbol = text[j - 1]
+            diagonal, diagonal_start = column[0], starts[0]
+            column[0], starts[0] = 0, j
+            for i in range(1, rows + 1):
+                value, start = diagonal, diagonal_start
+                if pattern[i - 1] != symbol:
+                    value += 1
+                if column[i - 1] + 1 < value:
+                    value, start = column[i - 1] + 1, starts[i - 1]
+                if column[i] + 1 < value:
+                    value, start = column[i] + 1, starts[i]
+                diagonal, diagonal_start = column[i], starts[i]
+                column[i], starts[i] = value, start
+
+            if column[rows] < best:
+                best, best_start, best_end = column[rows], starts[rows], j
+
+        return best, best_start, best_end
+
+    @njit(cache=True)
+    def myers_search(pattern, text, alphabet_size, anchored):  # type: ignore
+        """
+        Compiled version of the bit-parallel approximate search (Myers, blocked as per Hyyrö):
+        the columns of the levenshtein table are stored as bit-vectors of vertical differences,
+        so 64 cells are computed by every integer operation, the pattern is split into blocks of 64 symbols
+        :param pattern: the pattern encoded as symbols in range(alphabet_size)
+        :param text: the text encoded the same way (alphabet_size for the symbols not in the pattern)
+        :param alphabet_size: the number of different symbols in the pattern
+        :param anchored: whether the match has to start at the beginning of the text
+        :return: Tuple[the minimal distance of the pattern to a substring ending at some position,
+                       the earliest such end position (exclusive)]
+        """
+        length = pattern.shape[0]
+        blocks = (length + 63) // 64
+        one = np.uint64(1)
+        high_bit = one << np.uint64(63)
+        last_bit = one << np.uint64((length - 1) % 64)
+
+        peq = np.zeros((alphabet_size + 1, blocks), dtype=np.uint64)
+        for i in range(length):
+            peq[pattern[i], i // 64] |= one << np.uint64(i % 64)
+
+        positive = np.full(blocks, ~np.uint64(0), dtype=np.uint64)
+        negative = np.zeros(blocks, dtype=np.uint64)
+        score, best, best_end = length, length, 0
+        for j in range(text.shape[0]):
+            symbol = text[j]
+            carry = 1 if anchored else 0
+            for b in range(blocks):
+                eq = peq[symbol, b]
+                pv = positive[b]
+                mv = negative[b]
+                xv = eq | mv
+                if carry < 0:
+                    eq |= one
+                xh = (((eq & pv) + pv) ^ pv) | eq
+                ph = mv | ~(xh | pv)
+                mh = pv & xh
+                if b == blocks - 1:
+                    if (ph & last_bit) != 0:
+                        score += 1
+                    elif (mh & last_bit) != 0:
+                        score -= 1
+
+                next_carry = 0
+                if (ph & high_bit) != 0:
+                    next_carry = 1
+                elif (mh & high_bit) != 0:
+                    next_carry = -1
+                ph <<= one
+                mh <<= one
+                if carry < 0:
+                    mh |= one
+                elif carry > 0:
+                    ph |= one
+                positive[b] = mh | ~(xv | ph)
+                negative[b] = ph & xv
+                carry = next_carry
+
+            if score < best:
+                best, best_end = score, j + 1
+
+        return best, best_end
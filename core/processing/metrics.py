@@ -0,0 +1,126 @@
+import json
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Mapping
+
+from loguru import logger
+from redis import Redis, RedisError
+
+from core.processing import kernels
+from core.processing.text import PhraseAlignment, match
+
+logger.add(
+    "./logs/metrics.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`METRICS_KEY_PREFIX` is the prefix of the redis keys of the reading metrics of a user:
+`METRICS_KEY_PREFIX + username` is the hash of the totals of all the comparisons of the user,
+`METRICS_KEY_PREFIX + username + ":words"` is the sorted set of the words of the texts by the number of their errors,
+`METRICS_KEY_PREFIX + username + ":history"` is the sorted set of the metrics of every comparison by its time
+"""
+METRICS_KEY_PREFIX = "metrics:"
+
+"""
+`METRICS_HISTORY_ENTRIES` is the number of the last comparisons of a user whose metrics are kept in the history
+"""
+METRICS_HISTORY_ENTRIES = 1_000
+
+
+@dataclass
+class ReadingMetrics:
+    """
+    `ReadingMetrics` are the counts of a comparison of a reading with a text that the error rates are computed of,
+    they are added up into the totals of the user (see record_metrics)
+    """
+
+    reference_words: int = 0
+    word_errors: int = 0
+    reference_chars: int = 0
+    char_errors: int = 0
+    words_read: int = 0
+    seconds: float = 0.0
+    # the number of errors by the words of the text
+    misread_words: Dict[str, int] = field(default_factory=dict)
+
+
+def reading_metrics(alignment: PhraseAlignment, seconds: float) -> ReadingMetrics:
+    """
+    Counts the errors of an alignment by words and by characters
+    :param alignment: the alignment of the reading with the text (see text.align_phrases)
+    :param seconds: the duration of the reading
+    :return: the metrics of the reading
+    """
+    read = alignment.prepared_phrases.text.split()
+    words = alignment.text.words or []
+    metrics = ReadingMetrics(
+        reference_words=len(words),
+        reference_chars=len(alignment.text.text),
+        words_read=len(read),
+        seconds=seconds,
+    )
+
+    misread: Counter[str] = Counter()
+    for operation in alignment.script:
+        if operation.code == kernels.EQUAL:
+            continue
+        found = read[operation.first_begin : operation.first_end]
+        expected = words[operation.second_begin : operation.second_end]
+        # the change can join substitutions, deletions and insertions of separately aligned parts
+        metrics.word_errors += operation.edits
+        metrics.char_errors += match(" ".join(found), " ".join(expected), False)[1]
+        misread.update(expected)
+    metrics.misread_words = dict(misread)
+    return metrics
+
+
+def metric_rates(totals: Mapping[str, float]) -> Dict[str, float]:
+    """
+    :param totals: the counts of ReadingMetrics, of a reading or added up
+    :return: the word error rate, the character error rate and the words read per minute
+    """
+    return {
+        "word_error_rate": totals["word_errors"] / max(1, totals["reference_words"]),
+        "character_error_rate": totals["char_errors"]
+        / max(1, totals["reference_chars"]),
+        "words_per_minute": totals["words_read"] * 60 / totals["seconds"]
+        if totals["seconds"] > 0
+        else 0.0,
+    }
+
+
+def record_metrics(
+    redis: Redis, username: str, task_id: str, metrics: ReadingMetrics
+) -> None:
+    """
+    Adds the metrics of a comparison to the totals of the user in one transaction,
+    so the totals are kept up to date without going through the old results
+    :param redis: the connection to redis
+    :param username: the user who made the comparison
+    :param task_id: the id of the comparison task
+    :param metrics: the metrics of the comparison
+    """
+    key = METRICS_KEY_PREFIX + username
+    counts = asdict(metrics)
+    del counts["misread_words"]
+    now = time.time()
+    entry = dict(task_id=task_id, time=now, **metric_rates(counts))
+
+    try:
+        pipeline = redis.pipeline()
+        pipeline.hincrby(key, "comparisons", 1)
+        for name, value in counts.items():
+            if isinstance(value, int):
+                pipeline.hincrby(key, name, value)
+            else:
+                pipeline.hincrbyfloat(key, name, value)
+        for word, errors in metrics.misread_words.items():
+            pipeline.zincrby(key + ":words", errors, word)
+        pipeline.zadd(key + ":history", {json.dumps(entry): now})
+        pipeline.zremrangebyrank(key + ":history", 0, -METRICS_HISTORY_ENTRIES - 1)
+        pipeline.execute()
+    except RedisError as error:
+        logger.error(f"Failed to record the reading metrics of {username}: {error}")
@@ -0,0 +1,226 @@
+import mmap
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, cast
+
+from loguru import logger
+
+from core.processing.text import prepare_text
+
+logger.add(
+    "./logs/ngram_index.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`INDEX_NGRAM_SIZE` is the number of consecutive words hashed into a key of the index
+"""
+INDEX_NGRAM_SIZE = 3
+
+"""
+`INDEX_MAX_POSTINGS` is the number of occurrences in the reference text above which an n-gram
+is too common to tell the reading position and is not used for locating
+"""
+INDEX_MAX_POSTINGS = 64
+
+"""
+`INDEX_MAGIC` and `INDEX_VERSION` start the index file, an index of another version is rebuilt (see text_storage.load_reference_index)
+"""
+INDEX_MAGIC = 0x4E475258
+INDEX_VERSION = 1
+
+
+class NGramIndex:
+    """
+    `NGramIndex` is an inverted index of the word n-grams of a reference text.
+    The postings are kept as two parallel arrays sorted by the key and then by the position of the n-gram,
+    so an n-gram is looked up by binary search. On disk the arrays follow a header of 5 integers
+    (INDEX_MAGIC, INDEX_VERSION, the n-gram size, the number of postings, the number of words)
+    and are memory-mapped when loaded, so the index of a whole book is not read into memory,
+    the loaded index has to be closed (see close, it is a context manager as well)
+    """
+
+    def __init__(
+        self,
+        size: int,
+        keys: Any,
+        positions: Any,
+        words: int,
+        mapped: memoryview | None = None,
+    ) -> None:
+        self.size = size
+        self.keys = keys
+        self.positions = positions
+        self.words = words
+        # the view of the whole file of a loaded index, the keys and the positions are its slices
+        self.mapped = mapped
+
+    def __enter__(self) -> "NGramIndex":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the file of an index loaded by load, the index cannot be used afterwards
+        """
+        if self.mapped is None:
+            return
+        # The views of the map have to be released before the map is closed
+        mapped = cast(mmap.mmap, self.mapped.obj)
+        for view in (self.keys, self.positions, self.mapped):
+            view.release()
+        mapped.close()
+        self.mapped = None
+
+    @staticmethod
+    def _ngram_keys(word_ids: Any, size: int) -> array:
+        """
+        Hashes every n-gram of the word ids into a 32-bit key, the n-grams with unknown words (id -1) get no key
+        :param word_ids: the ids of the words of a text
+        :param size: the number of words in an n-gram
+        :return: the keys of the n-grams by their first word, 0xFFFFFFFF for the n-grams without a key,
+                 array of type 'I'
+        """
+        keys = array("I")
+        for position in range(len(word_ids) - size + 1):
+            key = 0x811C9DC5
+            for word_id in word_ids[position : position + size]:
+                if word_id < 0:
+                    key = 0xFFFFFFFF
+                    break
+                key = ((key ^ word_id) * 0x01000193) & 0xFFFFFFFE
+            keys.append(key)
+        return keys
+
+    @classmethod
+    def build(cls, word_ids: array, size: int = INDEX_NGRAM_SIZE) -> "NGramIndex":
+        """
+        Builds the index of the words of a reference text
+        :param word_ids: the ids of the words of the text (see prepare_text)
+        :param size: the number of words in an n-gram
+        :return: the index
+        """
+        ngram_keys = cls._ngram_keys(word_ids, size)
+        # The sort is stable, so the positions of every key stay sorted
+        order = sorted(range(len(ngram_keys)), key=ngram_keys.__getitem__)
+        keys = array("I", [ngram_keys[i] for i in order])
+        positions = array("I", order)
+        return cls(size, keys, positions, len(word_ids))
+
+    def save(self, path: Path) -> None:
+        """
+        Writes the index to a file
+        :param path: the file of the index
+        """
+        with open(path, "wb") as file:
+            array(
+                "I", [INDEX_MAGIC, INDEX_VERSION, self.size, len(self.keys), self.words]
+            ).tofile(file)
+            array("I", self.keys).tofile(file)
+            array("I", self.positions).tofile(file)
+
+    @classmethod
+    def load(cls, path: Path) -> "NGramIndex":
+        """
+        Memory-maps an index written by save
+        :param path: the file of the index
+        :return: the index, which reads the postings from the file on demand
+        """
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped).cast("I")
+        magic, version, size, count, words = view[:5]
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            view.release()
+            mapped.close()
+            raise ValueError(f"{path} is not an index of version {INDEX_VERSION}")
+        return cls(
+            size, view[5 : 5 + count], view[5 + count : 5 + 2 * count], words, view
+        )
+
+    def postings(self, key: int) -> Any:
+        """
+        :param key: the key of an n-gram
+        :return: the sorted positions of the n-grams with the key
+        """
+        begin = bisect_left(self.keys, key)
+        return self.positions[begin : bisect_right(self.keys, key, begin)]
+
+    def locate(self, word_ids: array, reference_ids: Any) -> Tuple[int, int] | None:
+        """
+        Finds the span of the reference text that a reading covers.
+        Every n-gram of the reading votes for the diagonal (its position in the reference minus its position
+        in the reading) of its occurrences, the n-grams on the diagonals close to the most voted one
+        tell where the reading starts and ends
+        :param word_ids: the ids of the words of the reading in the vocabulary of the reference, -1 for unknown words
+        :param reference_ids: the ids of the words of the reference text, the n-grams found by their keys
+                              are compared with them, as different n-grams may have the same key
+        :return: Tuple[the index of the first word of the span, the index after its last word]
+                 or None if no n-gram of the reading occurs in the reference
+        """
+        hits: List[Tuple[int, int]] = []
+        votes: Counter[int] = Counter()
+        for position, key in enumerate(self._ngram_keys(word_ids, self.size)):
+            if key == 0xFFFFFFFF:
+                continue
+            occurrences = self.postings(key)
+            if len(occurrences) > INDEX_MAX_POSTINGS:
+                continue
+            ngram = word_ids[position : position + self.size]
+            for occurrence in occurrences:
+                if reference_ids[occurrence : occurrence + self.size] != ngram:
+                    continue
+                hits.append((position, occurrence))
+                votes[occurrence - position] += 1
+
+        if len(hits) == 0:
+            return None
+
+        # The reading may skip or repeat some words, so the diagonal drifts
+        diagonal = votes.most_common(1)[0][0]
+        tolerance = max(self.size, len(word_ids) // 10)
+        near = [
+            (position, occurrence)
+            for position, occurrence in hits
+            if abs(occurrence - position - diagonal) <= tolerance
+        ]
+        first_position, first_occurrence = min(near, key=lambda hit: hit[1])
+        last_position, last_occurrence = max(near, key=lambda hit: hit[1])
+
+        begin = max(0, first_occurrence - first_position)
+        end = min(self.words, last_occurrence + len(word_ids) - last_position)
+        return begin, max(begin, end)
+
+
+def locate_reading(
+    phrases: List[str],
+    vocabulary: Dict[str, int],
+    reference_ids: Any,
+    index: NGramIndex,
+) -> Tuple[int, int] | None:
+    """
+    Finds the span of the reference text that the phrases are read from,
+    so only the span is aligned with the phrases (e.g. by match_phrases)
+    :param phrases: the phrases of the reading
+    :param vocabulary: the dictionary from the words of the reference text to their ids (see prepare_text)
+    :param reference_ids: the ids of the words of the reference text
+    :param index: the index of the reference text
+    :return: Tuple[the index of the first word of the span, the index after its last word]
+             or None if the reading is not found
+    """
+    logger.info("Starting locate_reading algorithm.")
+
+    words = prepare_text(" ".join(phrases)).text.split()
+    span = index.locate(
+        array("i", [vocabulary.get(w, -1) for w in words]), reference_ids
+    )
+    if span is None:
+        logger.warning("The reading was not found in the reference text.")
+    else:
+        logger.info(f"The reading is located at the words [{span[0]}, {span[1]}).")
+    return span
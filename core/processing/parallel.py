@@ -0,0 +1,142 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from threading import Lock
+from typing import List
+
+from loguru import logger
+
+from core.processing.text import (
+    PhraseAlignment,
+    PreparedText,
+    align_phrases,
+    join_alignments,
+    prepare_text,
+    split_phrases,
+    tokenize_text,
+)
+
+logger.add(
+    "./logs/parallel.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`PARALLEL_MIN_CHUNK_WORDS` is the number of words of the phrases below which a chunk is not worth
+sending to another process, the phrases shorter than two such chunks are aligned in the calling thread
+"""
+PARALLEL_MIN_CHUNK_WORDS = 2_000
+
+
+class ParallelAligner:
+    """
+    `ParallelAligner` aligns long lists of phrases with texts across a pool of processes,
+    so a single long comparison is not serialized by the GIL of the worker that runs it.
+    The phrases and the text are split into chunks at anchors (see text.split_phrases),
+    the chunks are aligned by text.align_phrases in the pool and their alignments are joined.
+    The pool is started on the first long alignment and shared by the threads of the worker,
+    if it cannot be started (or breaks) the phrases are aligned in the calling thread
+    """
+
+    def __init__(
+        self, workers: int = 0, min_chunk_words: int = PARALLEL_MIN_CHUNK_WORDS
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.min_chunk_words = min_chunk_words
+        self.executor: ProcessPoolExecutor | None = None
+        self.lock = Lock()
+
+    def align_phrases(
+        self,
+        phrases: List[str],
+        text: str | PreparedText,
+        linear_memory: bool | None = None,
+        banded: bool = True,
+        anchored: bool | None = None,
+        prepared_phrases: PreparedText | None = None,
+    ) -> PhraseAlignment:
+        """
+        Parallel version of text.align_phrases, the result may differ from the one of text.align_phrases
+        only if the optimal alignment does not pass through the anchors the chunks are cut at
+        :param phrases: a list of phrases to be checked
+        :param text: the "correct" text (or the text prepared by prepare_text, it is tokenized in place)
+        :param linear_memory: whether the alignment keeps memory proportional to the length of the texts
+        :param banded: whether the alignment is first computed only around the diagonal
+        :param anchored: whether long texts are aligned only between unique common word n-grams
+        :param prepared_phrases: the phrases joined with spaces and prepared by prepare_text, computed if not given
+        :return: the alignment of the phrases with the text (see text.align_phrases)
+        """
+        prepared_text = tokenize_text(
+            text if isinstance(text, PreparedText) else prepare_text(text)
+        )
+        if prepared_phrases is None:
+            prepared_phrases = prepare_text(" ".join(phrases))
+
+        chunks = min(
+            self.workers, len(prepared_phrases.text.split()) // self.min_chunk_words
+        )
+        if chunks < 2:
+            return align_phrases(
+                phrases,
+                prepared_text,
+                linear_memory,
+                banded,
+                anchored,
+                prepared_phrases,
+            )
+
+        parts = split_phrases(phrases, prepared_text, chunks, prepared_phrases)
+        logger.info(f"Aligning the phrases in {len(parts)} chunks in parallel.")
+        try:
+            executor = self._executor()
+            futures = [
+                executor.submit(
+                    align_phrases,
+                    part_phrases,
+                    part_text,
+                    linear_memory,
+                    banded,
+                    anchored,
+                )
+                for part_phrases, part_text in parts
+            ]
+            alignments = [future.result() for future in futures]
+        except (OSError, NotImplementedError, BrokenProcessPool) as error:
+            # e.g. the processes cannot be spawned in a sandbox, or one of them was killed
+            logger.warning(
+                f"The pool cannot be used ({error!r}), aligning the phrases in the calling thread."
+            )
+            # The broken pool is started again by the next alignment
+            self.shutdown()
+            return align_phrases(
+                phrases,
+                prepared_text,
+                linear_memory,
+                banded,
+                anchored,
+                prepared_phrases,
+            )
+        return join_alignments(alignments, prepared_text)
+
+    def shutdown(self) -> None:
+        """
+        Stops the processes of the pool, a later alignment starts them again
+        """
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """
+        :return: the pool of the processes, started if needed
+        """
+        with self.lock:
+            if self.executor is None:
+                # The worker runs threads, so the processes are spawned rather than forked
+                self.executor = ProcessPoolExecutor(
+                    self.workers, mp_context=get_context("spawn")
+                )
+            return self.executor
@@ -0,0 +1,309 @@
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Tuple
+
+import numpy as np
+from loguru import logger
+from pydub import AudioSegment
+from pydub.exceptions import CouldntDecodeError
+
+from config import get_config
+
+config = get_config()
+
+logger.add(
+    "./logs/pcm_cache.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`PCM_SAMPLE_RATE` is the sample rate of the decoded audio, the one the speech recognition models expect,
+the samples are mono and 16-bit (`PCM_SAMPLE_WIDTH` bytes)
+"""
+PCM_SAMPLE_RATE = 16_000
+PCM_SAMPLE_WIDTH = 2
+
+"""
+`PCM_SUFFIX` is appended to the path of an audio file to get the path of its decoded samples,
+they are stored raw (16-bit little-endian), so they can be written block by block as they are decoded
+"""
+PCM_SUFFIX = ".pcm"
+
+"""
+`PCM_BLOCK_SAMPLES` is the number of samples in the blocks the audio is decoded and read in (10 seconds),
+so the memory used does not depend on the length of the audio
+"""
+PCM_BLOCK_SAMPLES = 10 * PCM_SAMPLE_RATE
+
+"""
+`PCM_CUT_SEARCH_SAMPLES` is the length of the end of a window (see pcm_windows), where the window is cut
+at its quietest frame of `PCM_CUT_FRAME_SAMPLES` samples (0.1 second), so the words are not cut in two
+"""
+PCM_CUT_SEARCH_SAMPLES = 5 * PCM_SAMPLE_RATE
+PCM_CUT_FRAME_SAMPLES = PCM_SAMPLE_RATE // 10
+
+"""
+`AUDIO_FORMATS` are the storage modes of the audio files (config.storage.audio_format):
+"mp3" keeps an mp3 file along with the decoded samples,
+"pcm" keeps only the decoded samples, the mp3 file is encoded when it is downloaded for the first time
+"""
+AUDIO_FORMATS = ("mp3", "pcm")
+
+
+def pcm_path(path: str | Path) -> Path:
+    """
+    :param path: the path to an audio file
+    :return: the path to the decoded samples of the file
+    """
+    return Path(f"{path}{PCM_SUFFIX}")
+
+
+def decode_blocks(
+    path: str | Path, block_samples: int = PCM_BLOCK_SAMPLES
+) -> Iterator[np.ndarray]:
+    """
+    Decodes an audio file through an ffmpeg pipe, converting it to the cached format on the way
+    :param path: the path to the audio file (of any format ffmpeg can decode)
+    :param block_samples: the number of samples in a block
+    :return: the iterator over the blocks of the samples, arrays of type int16 (the last one can be shorter)
+    """
+    command = [
+        AudioSegment.converter,
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        str(path),
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-ar",
+        str(PCM_SAMPLE_RATE),
+        "-",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        assert process.stdout is not None and process.stderr is not None
+        while block := process.stdout.read(block_samples * PCM_SAMPLE_WIDTH):
+            yield np.frombuffer(block, dtype=np.int16)
+        error = process.stderr.read().decode(errors="replace")
+        if process.wait() != 0:
+            raise CouldntDecodeError(f"Decoding failed ({path}): {error}")
+    finally:
+        # The decoding is stopped if the blocks are not read to the end
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def write_pcm(blocks: Iterable[np.ndarray], path: str | Path) -> None:
+    """
+    Stores the samples of an audio file next to it, block by block
+    :param blocks: the samples in the cached format (see decode_blocks)
+    :param path: the path to the audio file
+    """
+    # The samples are written to a temporary file first, so a concurrent reader never sees a partial file,
+    # the file is unique to the thread, as the threads of a process may write the same file at once
+    cached = pcm_path(path)
+    temporary = cached.with_name(
+        f"{cached.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        with open(temporary, "wb") as file:
+            for block in blocks:
+                file.write(block.astype("<i2", copy=False).tobytes())
+        os.replace(temporary, cached)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+def save_pcm(audio: AudioSegment, path: str | Path) -> None:  # type: ignore
+    """
+    Converts decoded audio to the cached format and stores it next to the audio file
+    :param audio: the decoded audio (e.g. a segment of a file)
+    :param path: the path to the audio file
+    """
+    audio = (
+        audio.set_frame_rate(PCM_SAMPLE_RATE)
+        .set_channels(1)
+        .set_sample_width(PCM_SAMPLE_WIDTH)
+    )
+    write_pcm([np.frombuffer(audio.raw_data, dtype=np.int16)], path)
+
+
+def store_audio(audio: AudioSegment, path: str | Path) -> None:  # type: ignore
+    """
+    Stores decoded audio in the format of config.storage.audio_format (see AUDIO_FORMATS)
+    :param audio: the decoded audio
+    :param path: the path to the audio file
+    """
+    if config.storage.audio_format == "mp3":
+        audio.export(out_f=path, format="mp3")
+    save_pcm(audio, path)
+
+
+def store_upload(source: str | Path, path: str | Path) -> None:
+    """
+    Stores an uploaded audio file in the format of config.storage.audio_format (see AUDIO_FORMATS),
+    the file is decoded and encoded by ffmpeg block by block, so it is never loaded into memory whole
+    :param source: the path to the uploaded file
+    :param path: the path to the audio file
+    """
+    write_pcm(decode_blocks(source), path)
+    if config.storage.audio_format == "mp3":
+        encode_mp3(source, path)
+
+
+def encode_mp3(source: str | Path, path: str | Path, raw: bool = False) -> None:
+    """
+    Encodes an audio file into mp3 with ffmpeg
+    :param source: the path to the audio file to encode
+    :param path: the path to the mp3 file
+    :param raw: whether the source is decoded samples in the cached format (see pcm_path)
+    """
+    path = Path(path)
+    # Like the samples, the file is encoded to a temporary file first
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    raw_format = ["-f", "s16le", "-ac", "1", "-ar", str(PCM_SAMPLE_RATE)]
+    command = [
+        AudioSegment.converter,
+        "-nostdin",
+        "-v",
+        "error",
+        "-y",
+        *(raw_format if raw else []),
+        "-i",
+        str(source),
+        "-f",
+        "mp3",
+        str(temporary),
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True)
+        if result.returncode != 0:
+            raise CouldntDecodeError(
+                f"Encoding failed ({source}): {result.stderr.decode(errors='replace')}"
+            )
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+def audio_exists(path: str | Path) -> bool:
+    """
+    :param path: the path to an audio file
+    :return: whether the audio file or its decoded samples are stored
+    """
+    return Path(path).exists() or pcm_path(path).exists()
+
+
+def ensure_mp3(path: str | Path) -> Path:
+    """
+    Encodes the decoded samples of an audio file into mp3 if the file is not stored yet
+    :param path: the path to the audio file
+    :return: the path to the mp3 file
+    """
+    path = Path(path)
+    if not path.exists():
+        logger.info(f"Encoding the audio ({path}) into mp3.")
+        encode_mp3(pcm_path(path), path, raw=True)
+    return path
+
+
+def remove_audio(path: str | Path) -> None:
+    """
+    Removes an audio file and its decoded samples (e.g. of an intermediate segment)
+    :param path: the path to the audio file
+    """
+    Path(path).unlink(missing_ok=True)
+    pcm_path(path).unlink(missing_ok=True)
+
+
+def load_pcm(path: str | Path) -> Any:
+    """
+    Memory-maps the decoded samples of an audio file, the file is decoded once if they are not stored yet
+    :param path: the path to the audio file
+    :return: the samples, read-only array of type int16 (PCM_SAMPLE_RATE samples per second, mono)
+    """
+    cached = pcm_path(path)
+    if not cached.exists():
+        logger.info(f"Decoding the audio ({path}) into the cache.")
+        write_pcm(decode_blocks(path), path)
+    # An empty file can not be memory-mapped
+    if cached.stat().st_size == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(cached, dtype="<i2", mode="r")
+
+
+def pcm_blocks(
+    path: str | Path, block_samples: int = PCM_BLOCK_SAMPLES
+) -> Iterator[np.ndarray]:
+    """
+    :param path: the path to an audio file
+    :param block_samples: the number of samples in a block
+    :return: the iterator over the blocks of the decoded samples of the file (see load_pcm),
+    only the blocks being read are loaded into memory
+    """
+    samples = load_pcm(path)
+    for begin in range(0, len(samples), block_samples):
+        yield samples[begin : begin + block_samples]
+
+
+def pcm_windows(samples: np.ndarray, window_samples: int) -> Iterator[Tuple[int, int]]:
+    """
+    Splits the samples into consecutive windows, so a long audio is processed window by window
+    (e.g. by whisper) instead of as a whole, every window but the last one ends at the quietest frame
+    of its last PCM_CUT_SEARCH_SAMPLES samples
+    :param samples: the samples given by load_pcm
+    :param window_samples: the maximal number of samples in a window, more than PCM_CUT_SEARCH_SAMPLES
+    :return: the iterator over the windows, Tuple[the index of the first sample, the index after the last sample]
+    """
+    begin = 0
+    while len(samples) - begin > window_samples:
+        end = begin + window_samples
+        tail = samples[end - PCM_CUT_SEARCH_SAMPLES : end].astype(np.int32)
+        frames = tail[: len(tail) // PCM_CUT_FRAME_SAMPLES * PCM_CUT_FRAME_SAMPLES]
+        energy = np.abs(frames.reshape(-1, PCM_CUT_FRAME_SAMPLES)).sum(axis=1)
+        cut = (
+            end
+            - PCM_CUT_SEARCH_SAMPLES
+            + int(np.argmin(energy)) * PCM_CUT_FRAME_SAMPLES
+            + PCM_CUT_FRAME_SAMPLES // 2
+        )
+        yield begin, cut
+        begin = cut
+    if begin < len(samples):
+        yield begin, len(samples)
+
+
+def pcm_float(samples: np.ndarray) -> np.ndarray:
+    """
+    :param samples: the samples given by load_pcm
+    :return: the samples scaled to [-1, 1], array of type float32 (e.g. for whisper)
+    """
+    return samples.astype(np.float32) / 32768
+
+
+def pcm_audio_segment(samples: np.ndarray) -> AudioSegment:  # type: ignore
+    """
+    :param samples: the samples given by load_pcm
+    :return: the samples as pydub.AudioSegment
+    """
+    return AudioSegment(
+        samples.tobytes(),
+        frame_rate=PCM_SAMPLE_RATE,
+        sample_width=PCM_SAMPLE_WIDTH,
+        channels=1,
+    )
+
+
+def pcm_duration(path: str | Path) -> float:
+    """
+    :param path: the path to an audio file
+    :return: the duration of the audio in seconds
+    """
+    return len(load_pcm(path)) / PCM_SAMPLE_RATE
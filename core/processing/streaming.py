@@ -0,0 +1,181 @@
+from array import array
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from core.processing.text import (
+    PhraseAlignment,
+    PreparedText,
+    align_phrases,
+    join_alignments,
+    match_words,
+    phrase_errors,
+    prepare_text,
+    tokenize_text,
+)
+
+logger.add(
+    "./logs/streaming.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`STREAM_STABLE_WORDS` is the number of the last words of the transcript (and of the aligned part of the text)
+whose alignment may still change when the next segments arrive, the segments ending among them are not emitted yet
+"""
+STREAM_STABLE_WORDS = 8
+
+"""
+`STREAM_WINDOW_MARGIN` is the number of words of the text beyond the length of the pending transcript
+that the pending segments are aligned with, in addition to a half of their length
+"""
+STREAM_WINDOW_MARGIN = 32
+
+"""
+`STREAM_ANCHOR_WORDS` is the number of matched words that have to precede a word of the transcript
+for the alignment to be cut there, so that the segments are not cut at the words matched by chance
+(e.g. when the reader skips a part of the text)
+"""
+STREAM_ANCHOR_WORDS = 3
+
+
+class StreamingAligner:
+    """
+    `StreamingAligner` aligns the transcript segments with the text one by one, as they arrive.
+    It keeps the frontier, the word of the text up to which the segments are already aligned, and the pending
+    segments after it. The pending segments are aligned with a window of the text after the frontier,
+    and the segments that end at a matched word far enough from the end of the transcript and of the window
+    are stable: their errors are emitted and the frontier moves to their end.
+    The errors are the same as match_phrases gives for the segments and the span of the text they are aligned with
+    """
+
+    def __init__(self, text: str | PreparedText) -> None:
+        self.reference = tokenize_text(
+            text if isinstance(text, PreparedText) else prepare_text(text)
+        )
+        self.words: List[str] = self.reference.words or []
+        # The index of the first symbol of every word in the prepared text, and the end of the text
+        self.starts = array("I", [0])
+        for word in self.words:
+            self.starts.append(self.starts[-1] + len(word) + 1)
+        self.frontier = 0
+        self.pending: List[str] = []
+        self.pending_words: List[int] = []
+        self.alignments: List[PhraseAlignment] = []
+
+    def push(self, phrase: str) -> List[List[Tuple[int, str, str]]]:
+        """
+        Adds the next segment of the transcript
+        :param phrase: the text of the segment
+        :return: the errors of the segments that became stable (see text.match_phrases), possibly none
+        """
+        self.pending.append(phrase)
+        self.pending_words.append(len(prepare_text(phrase).text.split()))
+        if sum(self.pending_words) <= STREAM_STABLE_WORDS:
+            return []
+
+        transcript = prepare_text(" ".join(self.pending)).text
+        transcript_words = len(transcript.split())
+        window_end = min(
+            len(self.words),
+            self.frontier
+            + transcript_words
+            + transcript_words // 2
+            + STREAM_WINDOW_MARGIN,
+        )
+        cuts = self._cuts(transcript, match_words(transcript, self._span(window_end)))
+
+        # The last segment that ends at a stable matched word
+        stable, end, cut = 0, 0, 0
+        for index, words in enumerate(self.pending_words):
+            end += words
+            if end > transcript_words - STREAM_STABLE_WORDS:
+                break
+            if (
+                end in cuts
+                and self.frontier + cuts[end] <= window_end - STREAM_STABLE_WORDS
+            ):
+                stable, cut = index + 1, cuts[end]
+
+        if stable == 0:
+            return []
+        return self._emit(stable, self.frontier + cut)
+
+    def finish(self) -> List[List[Tuple[int, str, str]]]:
+        """
+        Aligns the rest of the segments with the rest of the text
+        :return: the errors of the rest of the segments (see text.match_phrases)
+        """
+        if len(self.pending) == 0:
+            return []
+        return self._emit(len(self.pending), len(self.words))
+
+    def alignment(self) -> PhraseAlignment:
+        """
+        :return: the alignment of all the segments with the text (see text.align_phrases), once finished
+        """
+        return join_alignments(self.alignments, self.reference)
+
+    def _emit(self, segments: int, end: int) -> List[List[Tuple[int, str, str]]]:
+        """
+        Aligns the first pending segments with the text up to the given word and moves the frontier there
+        :param segments: the number of the pending segments to be aligned
+        :param end: the index of the word of the text after the segments
+        :return: the errors of the segments
+        """
+        self.alignments.append(align_phrases(self.pending[:segments], self._span(end)))
+        errors = phrase_errors(self.alignments[-1])
+        logger.info(
+            f"Segments are aligned with the words [{self.frontier}, {end}) of the text."
+        )
+        self.frontier = end
+        del self.pending[:segments]
+        del self.pending_words[:segments]
+        return errors
+
+    def _span(self, end: int) -> PreparedText:
+        """
+        :param end: the index of the word of the text after the span
+        :return: the words of the prepared text from the frontier to the given word
+        """
+        begin = self.starts[self.frontier]
+        text_end = max(begin, self.starts[end] - 1)
+        return PreparedText(
+            self.reference.text[begin:text_end],
+            self.reference.indices[begin:text_end],
+            self.words[self.frontier : end],
+            self.reference.word_ids[self.frontier : end],  # type: ignore[index]
+            self.reference.vocabulary,
+        )
+
+    @staticmethod
+    def _cuts(transcript: str, errors: List[Tuple[int, str, str]]) -> Dict[int, int]:
+        """
+        Finds the words of the transcript at which its alignment with the text can be cut,
+        i.e. the ones preceded by STREAM_ANCHOR_WORDS matched words, and the words of the text they are aligned with
+        :param transcript: the prepared transcript
+        :param errors: the errors of the transcript (see text.match_words)
+        :return: the dictionary from the indices of the words of the transcript to the indices of the words
+                 of the text (relative to the aligned span)
+        """
+        # The index of the word of the transcript by the index of its first symbol
+        word_at: Dict[int, int] = {}
+        position = 0
+        for index, token in enumerate(transcript.split()):
+            word_at[position] = index
+            position += len(token) + 1
+        word_at[position] = len(word_at)
+
+        cuts = {0: 0}
+        # The words of both texts after the last error
+        first, second = 0, 0
+        for at_char, found, expected in errors:
+            begin = word_at[at_char]
+            for word in range(first + STREAM_ANCHOR_WORDS, begin + 1):
+                cuts[word] = second + word - first
+            second += begin - first + len(expected.split())
+            first = begin + len(found.split())
+        for word in range(first + STREAM_ANCHOR_WORDS, len(word_at)):
+            cuts[word] = second + word - first
+        return cuts
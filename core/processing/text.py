@@ -1,9 +1,13 @@
-import itertools
-from math import inf
-from typing import Any, List, Tuple
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
 
 from loguru import logger
 
+from core.processing import kernels
+
 logger.add(
     "./logs/text.log",
     format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
@@ -11,223 +15,1079 @@ logger.add(
 )
 
 
-def __backtracking_levenshtein(
-    first_text: List[str] | str, second_text: List[str] | str
-) -> Tuple[List[str], int]:
+"""
+`LINEAR_MEMORY_THRESHOLD` is the number of dynamic programming cells above which
+the levenshtein algorithm stores only checkpointed rows instead of the full table
+(used when the memory mode is not specified explicitly)
+"""
+LINEAR_MEMORY_THRESHOLD = 4_000_000
+
+"""
+`CHECKPOINT_BLOCK_ROWS` is the maximum number of rows of the dynamic programming table
+that are stored at once when the levenshtein algorithm runs in the linear memory mode
+"""
+CHECKPOINT_BLOCK_ROWS = 64
+
+"""
+`BAND_INITIAL_WIDTH` is the number of diagonals on each side of the main one that the banded
+levenshtein algorithm computes first, the band is doubled while the distance does not fit into it
+"""
+BAND_INITIAL_WIDTH = 16
+
+"""
+`ANCHORED_ALIGNMENT_THRESHOLD` is the number of dynamic programming cells above which lists of words
+are split by anchors (unique common n-grams) and only the gaps between them are aligned
+(used when the anchoring is not specified explicitly)
+"""
+ANCHORED_ALIGNMENT_THRESHOLD = 250_000
+
+"""
+`ANCHOR_NGRAM_SIZE` is the number of words in the n-grams used as anchors
+"""
+ANCHOR_NGRAM_SIZE = 3
+
+"""
+`WORDS_OR_SPACES` matches the runs of spaces and the runs of words separated by single spaces,
+the words consist of word symbols except digits and underscores, i.e. of letters and a few numeric symbols
+(the latter are filtered out by isalpha())
+"""
+WORDS_OR_SPACES = re.compile(r"[^\W\d_]+(?: [^\W\d_]+)*| +")
+
+"""
+`QGRAM_SIZE` is the number of characters in the q-grams by which the text is indexed
+when several phrases are located in it at once
+"""
+QGRAM_SIZE = 3
+
+"""
+`REALIGNMENT_MARGIN` is the number of words of the text around every edit of the text
+that are aligned with the phrases again when an alignment is updated after the edits (see realign_phrases)
+"""
+REALIGNMENT_MARGIN = 16
+
+"""
+`ALGORITHM_VERSION` identifies the results of the alignment algorithms, it is a part of the keys
+of the cached results (see cache.AlignmentCache) and has to be increased whenever the results change
+"""
+ALGORITHM_VERSION = 2
+
+
+@dataclass
+class PreparedText:
     """
-    Levenshtein distance algorithm that takes two texts and returns the optimal transitions list and the final distance
-    Treats a list as a collection of words separated by spaces
-    :param first_text: a text to be compared, either as a string or a list of words
-    :param second_text: a text to be compared, either as a string or a list of words
-    :return: Tuple[path that the dynamic programming algorithm found in format of
-                   List["entry from first text or "_" if empty" + "-" + "entry from second text or "_" if empty"],
-                   the levenshtein distance computed]
+    `PreparedText` is a text prepared for the comparison (see prepare_text),
+    it can be computed once and passed to match_phrases, find_phrases and locate_phrases
     """
-    logger.info("Starting match_words algorithm.")
-    # If we need to compare words, we need to separate them with spaces in the final answer
-    if isinstance(first_text, list):
-        separator = " "
-    else:
-        separator = ""
 
-    # Initialize the dynamic programming table
-    levenshtein_dp = [
-        [inf] * (len(second_text) + 1) for i in range(len(first_text) + 1)
-    ]
+    text: str
+    # the indices of the symbols of the initial text that were kept, array of the type 'I'
+    indices: array
+    # the words of the text, their ids and the dictionary from the words to the ids, if the text is tokenized
+    words: List[str] | None = None
+    word_ids: array | None = None
+    vocabulary: Dict[str, int] | None = None
+
+
+class EditOp:
+    """
+    `EditOp` is an operation of the edit script that transforms the first text into the second one:
+    the entries first[first_begin:first_end] become second[second_begin:second_end],
+    `code` is one of kernels.EQUAL, kernels.REPLACE, kernels.DELETE and kernels.INSERT,
+    `edits` is the number of the single entry changes joined into the operation
+    (by default the length of its longer side if it is a change)
+    """
 
-    # Count the dynamic programming table as per the usual algorithm
-    levenshtein_dp[0][0] = 0
-    for i in range(1, len(first_text) + 1):
-        levenshtein_dp[i][0] = i
-    for i in range(1, len(second_text) + 1):
-        levenshtein_dp[0][i] = i
-    for i, j in itertools.product(
-        range(1, len(first_text) + 1), range(1, len(second_text) + 1)
+    __slots__ = (
+        "code",
+        "first_begin",
+        "first_end",
+        "second_begin",
+        "second_end",
+        "edits",
+    )
+
+    def __init__(
+        self,
+        code: int,
+        first_begin: int,
+        first_end: int,
+        second_begin: int,
+        second_end: int,
+        edits: int | None = None,
+    ) -> None:
+        self.code = code
+        self.first_begin = first_begin
+        self.first_end = first_end
+        self.second_begin = second_begin
+        self.second_end = second_end
+        if edits is None:
+            edits = (
+                0
+                if code == kernels.EQUAL
+                else max(first_end - first_begin, second_end - second_begin)
+            )
+        self.edits = edits
+
+    def __setstate__(self, state: Tuple[None, Dict[str, int]]) -> None:
+        # The operations pickled before `edits` was kept get the default count
+        slots = state[1]
+        self.__init__(  # type: ignore[misc]
+            slots["code"],
+            slots["first_begin"],
+            slots["first_end"],
+            slots["second_begin"],
+            slots["second_end"],
+            slots.get("edits"),
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"EditOp({self.code}, {self.first_begin}, {self.first_end}, "
+            f"{self.second_begin}, {self.second_end}, {self.edits})"
+        )
+
+
+@dataclass
+class PhraseAlignment:
+    """
+    `PhraseAlignment` is the alignment of the words of phrases with a text (see align_phrases),
+    the errors of the phrases are given by phrase_errors, and it can be updated after the text is edited
+    (see realign_phrases) instead of aligning the phrases again
+    """
+
+    phrases: List[str]
+    # the phrases joined with spaces and prepared by prepare_text
+    prepared_phrases: PreparedText
+    # the text prepared and tokenized by prepare_text
+    text: PreparedText
+    # the edit script that transforms the words of the prepared phrases into the words of the text
+    script: List[EditOp]
+
+
+def __tokenize(
+    first_text: List[str] | str,
+    second_text: List[str] | str,
+    reference: PreparedText | None = None,
+) -> Tuple[array, array]:
+    """
+    Maps the entries of both texts to integer ids once per comparison,
+    so the levenshtein algorithm compares integers instead of strings
+    Symbols are mapped to their code points, words to ids shared by both texts
+    :param first_text: a text, either as a string or a list of words
+    :param second_text: a text, either as a string or a list of words
+    :param reference: the second text prepared with the word ids (see prepare_text),
+                      its ids are reused and only the first text is tokenized
+    :return: Tuple[the ids of the entries of the first text, the ids of the entries of the second text]
+    """
+    if isinstance(first_text, str) and isinstance(second_text, str):
+        return array("i", map(ord, first_text)), array("i", map(ord, second_text))
+
+    if (
+        reference is not None
+        and reference.word_ids is not None
+        and reference.vocabulary is not None
     ):
-        levenshtein_dp[i][j] = min(
-            levenshtein_dp[i - 1][j - 1] + (first_text[i - 1] != second_text[j - 1]),
-            levenshtein_dp[i - 1][j] + 1,
-            levenshtein_dp[i][j - 1] + 1,
+        known = reference.vocabulary
+        unknown: Dict[str, int] = {}
+        first_ids = array(
+            "i",
+            [
+                known[w]
+                if w in known
+                else unknown.setdefault(w, len(known) + len(unknown))
+                for w in first_text
+            ],
         )
+        return first_ids, reference.word_ids
+
+    vocabulary: Dict[str, int] = {}
+    return (
+        array("i", [vocabulary.setdefault(w, len(vocabulary)) for w in first_text]),
+        array("i", [vocabulary.setdefault(w, len(vocabulary)) for w in second_text]),
+    )
+
+
+def __levenshtein_rows(
+    first_ids: Any,
+    second_ids: Any,
+    top_row: Any,
+    row_begin: int,
+    row_end: int,
+    keep_rows: bool,
+    compiled: bool,
+) -> Any:
+    """
+    Computes the rows of the levenshtein dynamic programming table, starting from a known row
+    Only the first len(top_row) columns are computed
+    :param first_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param second_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param top_row: the values of the table in the row row_begin
+    :param row_begin: the index of the row given by top_row
+    :param row_end: the index of the last row to be computed
+    :param keep_rows: whether all the rows are returned or only the last one
+    :param compiled: whether the compiled kernel is used
+    :return: the rows from row_begin to row_end (inclusive) if keep_rows is set, otherwise [the row row_end]
+    """
+    if compiled:
+        return kernels.levenshtein_rows(
+            first_ids, second_ids, top_row, row_begin, row_end, keep_rows
+        )
+
+    rows = [top_row]
+    width = len(top_row)
+    for i in range(row_begin + 1, row_end + 1):
+        previous = rows[-1]
+        current = [i] * width
+        symbol = first_ids[i - 1]
+        for j in range(1, width):
+            current[j] = min(
+                previous[j - 1] + (symbol != second_ids[j - 1]),
+                previous[j] + 1,
+                current[j - 1] + 1,
+            )
+        if keep_rows:
+            rows.append(current)
+        else:
+            rows[-1] = current
+    return rows
+
+
+def __backtrack_rows(
+    first_ids: Any,
+    second_ids: Any,
+    rows: Any,
+    row_begin: int,
+    current_row: int,
+    current_column: int,
+    operations: List[int],
+    compiled: bool,
+) -> Tuple[int, int]:
+    """
+    Backtracks the levenshtein dynamic programming table inside a block of computed rows
+    Stops when the path leaves the block through its first row or reaches the first column
+    :param first_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param second_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param rows: the rows of the table, rows[0] being the row row_begin
+    :param row_begin: the index of the first row of the block
+    :param current_row: the row from which the backtracking starts
+    :param current_column: the column from which the backtracking starts
+    :param operations: the list the codes of the found transitions are appended to (see kernels.EQUAL etc.)
+    :param compiled: whether the compiled kernel is used
+    :return: the row and the column at which the backtracking has stopped
+    """
+    if compiled:
+        found, current_row, current_column = kernels.backtrack_rows(
+            first_ids, second_ids, rows, row_begin, current_row, current_column
+        )
+        operations.extend(found.tolist())
+        return current_row, current_column
 
-    # Backtracks the result getting the list of matched words
-    backtrack_result: List[str] = list()
-    current_row = len(first_text)
-    current_column = len(second_text)
-    while current_row * current_column != 0:
-        if first_text[current_row - 1] == second_text[current_column - 1]:
-            backtrack_result.append(first_text[current_row - 1])
+    while current_row > row_begin and current_column != 0:
+        if first_ids[current_row - 1] == second_ids[current_column - 1]:
+            operations.append(kernels.EQUAL)
             current_row -= 1
             current_column -= 1
             continue
 
+        upper = rows[current_row - 1 - row_begin]
+        lower = rows[current_row - row_begin]
         optimal = min(
-            levenshtein_dp[current_row - 1][current_column - 1],
-            levenshtein_dp[current_row - 1][current_column],
-            levenshtein_dp[current_row][current_column - 1],
+            upper[current_column - 1],
+            upper[current_column],
+            lower[current_column - 1],
         )
-        if optimal == levenshtein_dp[current_row - 1][current_column - 1]:
-            backtrack_result.append(
-                first_text[current_row - 1] + "-" + second_text[current_column - 1]
+        if optimal == upper[current_column - 1]:
+            operations.append(kernels.REPLACE)
+            current_row -= 1
+            current_column -= 1
+        elif optimal == upper[current_column]:
+            operations.append(kernels.DELETE)
+            current_row -= 1
+        else:
+            operations.append(kernels.INSERT)
+            current_column -= 1
+
+    return current_row, current_column
+
+
+def __checkpointed_backtrack(
+    first_ids: Any,
+    second_ids: Any,
+    top_row: Any,
+    row_begin: int,
+    row_end: int,
+    current_column: int,
+    operations: List[int],
+    compiled: bool,
+) -> Tuple[int, int, int]:
+    """
+    Backtracks the levenshtein dynamic programming table without storing it fully
+    The rows are split in halves: the middle row is computed and stored as a checkpoint,
+    the lower half is backtracked first and the upper half is recomputed only up to the column
+    where the path has left the lower half, so only O(log(rows)) rows are kept at once
+    :param first_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param second_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param top_row: the values of the table in the row row_begin
+    :param row_begin: the index of the row given by top_row
+    :param row_end: the row from which the backtracking starts
+    :param current_column: the column from which the backtracking starts
+    :param operations: the list the codes of the found transitions are appended to
+    :param compiled: whether the compiled kernels are used
+    :return: Tuple[the row at which the backtracking has stopped,
+                   the column at which the backtracking has stopped,
+                   the value of the table in the cell the backtracking has started from]
+    """
+    if row_end - row_begin <= CHECKPOINT_BLOCK_ROWS:
+        rows = __levenshtein_rows(
+            first_ids, second_ids, top_row, row_begin, row_end, True, compiled
+        )
+        current_row, current_column = __backtrack_rows(
+            first_ids,
+            second_ids,
+            rows,
+            row_begin,
+            row_end,
+            current_column,
+            operations,
+            compiled,
+        )
+        return current_row, current_column, int(rows[-1][-1])
+
+    # Compute the middle row and backtrack the lower half starting from it
+    middle = (row_begin + row_end) // 2
+    middle_row = __levenshtein_rows(
+        first_ids, second_ids, top_row, row_begin, middle, False, compiled
+    )[-1]
+    current_row, current_column, distance = __checkpointed_backtrack(
+        first_ids,
+        second_ids,
+        middle_row,
+        middle,
+        row_end,
+        current_column,
+        operations,
+        compiled,
+    )
+    del middle_row
+
+    # The path has reached the first column, nothing is left to backtrack
+    if current_column == 0:
+        return current_row, current_column, distance
+
+    # The path has left the lower half, continue in the upper half
+    current_row, current_column, _ = __checkpointed_backtrack(
+        first_ids,
+        second_ids,
+        top_row[: current_column + 1],
+        row_begin,
+        current_row,
+        current_column,
+        operations,
+        compiled,
+    )
+    return current_row, current_column, distance
+
+
+def __levenshtein_band(
+    first_ids: Any,
+    second_ids: Any,
+    width: int,
+    max_distance: int,
+    compiled: bool,
+) -> Tuple[Any, int]:
+    """
+    Computes the levenshtein dynamic programming table only inside a band around the main diagonal
+    The cell (i, j) is stored as band[i][j - i + width], the cells outside the band are kernels.BAND_INFINITY
+    The cells with the values not exceeding width are guaranteed to be the same as in the full table
+    :param first_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param second_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param width: the number of diagonals on each side of the main one that are computed
+    :param max_distance: the computation is abandoned once every cell of a row exceeds it
+    :param compiled: whether the compiled kernel is used
+    :return: Tuple[the band, the minimum of the row at which the computation was abandoned or -1]
+    """
+    if compiled:
+        return kernels.levenshtein_band(first_ids, second_ids, width, max_distance)  # type: ignore
+
+    columns = len(second_ids)
+    band = [[kernels.BAND_INFINITY] * (2 * width + 1)]
+    for j in range(min(width, columns) + 1):
+        band[0][j + width] = j
+
+    for i in range(1, len(first_ids) + 1):
+        previous = band[-1]
+        current = [kernels.BAND_INFINITY] * (2 * width + 1)
+        symbol = first_ids[i - 1]
+        for b in range(max(0, width - i), min(2 * width, columns - i + width) + 1):
+            j = i + b - width
+            if j == 0:
+                current[b] = i
+                continue
+            current[b] = min(
+                previous[b] + (symbol != second_ids[j - 1]),
+                previous[b + 1] + 1 if b < 2 * width else kernels.BAND_INFINITY,
+                current[b - 1] + 1 if b > 0 else kernels.BAND_INFINITY,
             )
+        band.append(current)
+        row_minimum = min(current)
+        if row_minimum > max_distance:
+            return band, row_minimum
+
+    return band, -1
+
+
+def __backtrack_band(
+    first_ids: Any,
+    second_ids: Any,
+    band: Any,
+    width: int,
+    operations: List[int],
+    compiled: bool,
+) -> Tuple[int, int]:
+    """
+    Backtracks the banded levenshtein dynamic programming table from its last cell
+    :param first_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param second_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param band: the band computed by __levenshtein_band
+    :param width: the number of diagonals on each side of the main one in the band
+    :param operations: the list the codes of the found transitions are appended to
+    :param compiled: whether the compiled kernel is used
+    :return: the row and the column at which the backtracking has stopped
+    """
+    current_row = len(first_ids)
+    current_column = len(second_ids)
+    if compiled:
+        found, current_row, current_column = kernels.backtrack_band(
+            first_ids, second_ids, band, width, current_row, current_column
+        )
+        operations.extend(found.tolist())
+        return current_row, current_column
+
+    while current_row != 0 and current_column != 0:
+        if first_ids[current_row - 1] == second_ids[current_column - 1]:
+            operations.append(kernels.EQUAL)
             current_row -= 1
             current_column -= 1
-        elif optimal == levenshtein_dp[current_row - 1][current_column]:
-            backtrack_result.append(first_text[current_row - 1] + "-_")
+            continue
+
+        b = current_column - current_row + width
+        diagonal = band[current_row - 1][b]
+        upper = band[current_row - 1][b + 1] if b < 2 * width else kernels.BAND_INFINITY
+        left = band[current_row][b - 1] if b > 0 else kernels.BAND_INFINITY
+        optimal = min(diagonal, upper, left)
+        if optimal == diagonal:
+            operations.append(kernels.REPLACE)
             current_row -= 1
-        elif optimal == levenshtein_dp[current_row][current_column - 1]:
-            backtrack_result.append("_-" + second_text[current_column - 1])
             current_column -= 1
+        elif optimal == upper:
+            operations.append(kernels.DELETE)
+            current_row -= 1
+        else:
+            operations.append(kernels.INSERT)
+            current_column -= 1
+
+    return current_row, current_column
 
-    # Put all the remaining symbols(words) in the answer
-    if current_row != 0:
-        backtrack_result.append(separator.join(first_text[:current_row]) + "-_")
-    elif current_column != 0:
-        backtrack_result.append("_-" + separator.join(second_text[:current_column]))
 
-    return backtrack_result, int(levenshtein_dp[-1][-1])
+def __banded_backtrack(
+    first_ids: Any,
+    second_ids: Any,
+    max_distance: int | None,
+    linear_memory: bool,
+    operations: List[int],
+    compiled: bool,
+) -> Tuple[int, int, int] | None:
+    """
+    Backtracks the levenshtein dynamic programming table computed only inside a band around
+    the main diagonal (Ukkonen's algorithm), which takes O(length * distance) instead of O(length ^ 2)
+    for similar texts. The band is doubled until the distance fits into it, in which case the optimal path
+    stays inside the band and the transitions are exactly the same as for the full table
+    :param first_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param second_ids: the ids of the entries of a text to be compared (as a numpy array if compiled)
+    :param max_distance: the band is not widened beyond it, the computation is abandoned once it is exceeded
+    :param linear_memory: whether the band is not allowed to exceed LINEAR_MEMORY_THRESHOLD cells
+    :param operations: the list the codes of the found transitions are appended to
+    :param compiled: whether the compiled kernels are used
+    :return: Tuple[the row at which the backtracking has stopped,
+                   the column at which the backtracking has stopped,
+                   the distance (a lower bound for it if max_distance was exceeded)]
+             or None if the band has become as wide as the full table
+    """
+    rows = len(first_ids)
+    columns = len(second_ids)
+    width = max(abs(rows - columns), BAND_INITIAL_WIDTH)
+    limit = kernels.BAND_INFINITY
+    if max_distance is not None:
+        # The distance is at least the difference of the lengths
+        if abs(rows - columns) > max_distance:
+            return rows, columns, abs(rows - columns)
+        width = min(width, max_distance)
+        limit = max_distance
+
+    while 2 * width < columns and not (
+        linear_memory and (rows + 1) * (2 * width + 1) > LINEAR_MEMORY_THRESHOLD
+    ):
+        # A row exceeding the limit proves that the distance does too only if the band is at least
+        # as wide as the limit, otherwise the optimal path might go outside the band
+        band, row_minimum = __levenshtein_band(
+            first_ids,
+            second_ids,
+            width,
+            limit if width == limit else kernels.BAND_INFINITY,
+            compiled,
+        )
+        if row_minimum != -1:
+            return rows, columns, row_minimum
+
+        distance = int(band[-1][columns - rows + width])
+        if distance <= width:
+            current_row, current_column = __backtrack_band(
+                first_ids, second_ids, band, width, operations, compiled
+            )
+            return current_row, current_column, distance
+        if width == limit:
+            return rows, columns, distance
+        width = min(2 * width, limit)
+        del band
+
+    return None
+
+
+def __levenshtein_operations(
+    first_ids: array,
+    second_ids: array,
+    linear_memory: bool | None,
+    banded: bool,
+    max_distance: int | None,
+    operations: List[int],
+) -> Tuple[int, int, int]:
+    """
+    Computes the levenshtein dynamic programming table for two tokenized texts and backtracks it
+    Uses the compiled kernels if numba is available
+    :param first_ids: the ids of the entries of a text to be compared
+    :param second_ids: the ids of the entries of a text to be compared
+    :param linear_memory: whether only checkpointed rows of the table are stored,
+                          decided by LINEAR_MEMORY_THRESHOLD if not specified
+    :param banded: whether the table is first computed only around its diagonal
+    :param max_distance: if the distance exceeds it, the computation may be abandoned early
+    :param operations: the list the codes of the found transitions are appended to
+    :return: Tuple[the row at which the backtracking has stopped,
+                   the column at which the backtracking has stopped,
+                   the levenshtein distance computed]
+    """
+    if linear_memory is None:
+        linear_memory = (len(first_ids) + 1) * (
+            len(second_ids) + 1
+        ) > LINEAR_MEMORY_THRESHOLD
+
+    compiled = kernels.AVAILABLE
+    if compiled:
+        first_encoded: Any = kernels.as_array(first_ids)
+        second_encoded: Any = kernels.as_array(second_ids)
+        first_row: Any = kernels.first_row(len(second_ids))
+    else:
+        first_encoded, second_encoded = first_ids, second_ids
+        first_row = list(range(len(second_ids) + 1))
+
+    # Count the dynamic programming table as per the usual algorithm and backtrack the result
+    # getting the list of transitions
+    if banded:
+        band_result = __banded_backtrack(
+            first_encoded,
+            second_encoded,
+            max_distance,
+            linear_memory,
+            operations,
+            compiled,
+        )
+        if band_result is not None:
+            return band_result
+
+    if linear_memory:
+        return __checkpointed_backtrack(
+            first_encoded,
+            second_encoded,
+            first_row,
+            0,
+            len(first_ids),
+            len(second_ids),
+            operations,
+            compiled,
+        )
 
+    levenshtein_dp = __levenshtein_rows(
+        first_encoded, second_encoded, first_row, 0, len(first_ids), True, compiled
+    )
+    current_row, current_column = __backtrack_rows(
+        first_encoded,
+        second_encoded,
+        levenshtein_dp,
+        0,
+        len(first_ids),
+        len(second_ids),
+        operations,
+        compiled,
+    )
+    return current_row, current_column, int(levenshtein_dp[-1][-1])
+
+
+def __find_anchors(
+    first_ids: array, second_ids: array, ngram_size: int
+) -> List[Tuple[int, int]]:
+    """
+    Finds high-confidence exact matches between two tokenized texts (as in the patience diff):
+    n-grams of entries that occur exactly once in each text, of which the longest chain
+    that appears in the same order in both texts is taken. The chosen n-grams do not overlap
+    :param first_ids: the ids of the entries of a text
+    :param second_ids: the ids of the entries of a text
+    :param ngram_size: the number of entries in an n-gram
+    :return: the list of the beginnings of the matched n-grams, i.e. List[Tuple[index in first, index in second]]
+    """
 
-def __joined_levenshtein(
-    first_text: List[str] | str, second_text: List[str] | str
-) -> Tuple[List[List[str] | str], int]:
+    def unique_ngrams(ids: array) -> Dict[Tuple[int, ...], int]:
+        positions: Dict[Tuple[int, ...], int] = {}
+        for i in range(len(ids) - ngram_size + 1):
+            ngram = tuple(ids[i : i + ngram_size])
+            positions[ngram] = -1 if ngram in positions else i
+        return positions
+
+    first_positions = unique_ngrams(first_ids)
+    second_positions = unique_ngrams(second_ids)
+    candidates = sorted(
+        (position, second_positions[ngram])
+        for ngram, position in first_positions.items()
+        if position != -1 and second_positions.get(ngram, -1) != -1
+    )
+
+    # Longest increasing subsequence of the positions in the second text (patience sorting)
+    pile_tops: List[int] = []
+    pile_candidates: List[int] = []
+    previous: List[int] = []
+    for index, (_, position) in enumerate(candidates):
+        pile = bisect_left(pile_tops, position)
+        previous.append(pile_candidates[pile - 1] if pile > 0 else -1)
+        if pile == len(pile_tops):
+            pile_tops.append(position)
+            pile_candidates.append(index)
+        else:
+            pile_tops[pile] = position
+            pile_candidates[pile] = index
+
+    chain: List[Tuple[int, int]] = []
+    index = pile_candidates[-1] if pile_candidates else -1
+    while index != -1:
+        chain.append(candidates[index])
+        index = previous[index]
+    chain.reverse()
+
+    # Drop the n-grams that overlap with the previous one
+    anchors: List[Tuple[int, int]] = []
+    for first_position, second_position in chain:
+        if (
+            len(anchors) == 0
+            or first_position >= anchors[-1][0] + ngram_size
+            and second_position >= anchors[-1][1] + ngram_size
+        ):
+            anchors.append((first_position, second_position))
+    return anchors
+
+
+def __anchored_operations(
+    first_ids: array,
+    second_ids: array,
+    linear_memory: bool | None,
+    banded: bool,
+    operations: List[int],
+) -> Tuple[int, int, int]:
+    """
+    Splits two tokenized texts by the anchors (see __find_anchors) and computes the levenshtein
+    transitions only for the gaps between them, which is much cheaper for long texts
+    :param first_ids: the ids of the entries of a text to be compared
+    :param second_ids: the ids of the entries of a text to be compared
+    :param linear_memory: whether only checkpointed rows of the tables are stored
+    :param banded: whether the tables are first computed only around their diagonals
+    :param operations: the list the codes of the found transitions are appended to
+    :return: Tuple[the row at which the backtracking has stopped (always 0),
+                   the column at which the backtracking has stopped (always 0),
+                   the sum of the levenshtein distances of the gaps]
+    """
+    anchors = __find_anchors(first_ids, second_ids, ANCHOR_NGRAM_SIZE)
+    logger.info(f"Found {len(anchors)} anchors for the alignment.")
+
+    # The transitions are collected from the end, so the gaps are processed in reverse order
+    bounds = [(0, 0)] + [
+        (i + ANCHOR_NGRAM_SIZE, j + ANCHOR_NGRAM_SIZE) for i, j in anchors
+    ]
+    ends = anchors + [(len(first_ids), len(second_ids))]
+    distance = 0
+    for index in range(len(ends) - 1, -1, -1):
+        (first_begin, second_begin), (first_end, second_end) = (
+            bounds[index],
+            ends[index],
+        )
+        if index != len(ends) - 1:
+            operations.extend([kernels.EQUAL] * ANCHOR_NGRAM_SIZE)
+
+        current_row, current_column, gap_distance = __levenshtein_operations(
+            first_ids[first_begin:first_end],
+            second_ids[second_begin:second_end],
+            linear_memory,
+            banded,
+            None,
+            operations,
+        )
+        operations.extend([kernels.DELETE] * current_row)
+        operations.extend([kernels.INSERT] * current_column)
+        distance += gap_distance
+
+    return 0, 0, distance
+
+
+def __backtracking_levenshtein(
+    first_text: List[str] | str,
+    second_text: List[str] | str,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    max_distance: int | None = None,
+    anchored: bool | None = None,
+    reference: PreparedText | None = None,
+) -> Tuple[List[int], int]:
     """
-    Joins the answers given by the initial levenshtein algorithm so they resemble errors more
+    Levenshtein distance algorithm that takes two texts and returns the optimal transitions list and the final distance
     Treats a list as a collection of words separated by spaces
     :param first_text: a text to be compared, either as a string or a list of words
     :param second_text: a text to be compared, either as a string or a list of words
-    :return: Tuple[the joined result in the format of
-                   List[List[the phrase from the first text to be replaced, the replacement from the second text]
-                        OR
-                        str if both texts are the same at this interval],
+    :param linear_memory: whether only checkpointed rows of the table are stored
+                          (slower, but the memory is proportional to the length of the texts instead of their product),
+                          decided by LINEAR_MEMORY_THRESHOLD if not specified
+    :param banded: whether the table is first computed only around its diagonal (fast for similar texts)
+    :param max_distance: if the distance exceeds it, the computation may be abandoned early
+                         and an empty path is returned with a lower bound of the distance
+    :param anchored: whether lists of words are split by unique common n-grams and only the gaps between them are aligned
+                     (the result may be slightly worse than the optimal one),
+                     decided by ANCHORED_ALIGNMENT_THRESHOLD if not specified
+    :param reference: the second text prepared with the word ids, which are reused (see __tokenize)
+    :return: Tuple[path that the dynamic programming algorithm found in format of
+                   List[the codes of the transitions (see kernels.EQUAL etc.) in the order of the texts],
                    the levenshtein distance computed]
     """
+    logger.info("Starting match_words algorithm.")
 
-    # Compute the full levenshtein answer
-    backtrack_result, distance = __backtracking_levenshtein(first_text, second_text)
+    if anchored is None:
+        anchored = len(first_text) * len(second_text) > ANCHORED_ALIGNMENT_THRESHOLD
+    anchored = anchored and isinstance(first_text, list) and max_distance is None
 
-    # If we need to compare words, we need to separate them with spaces in the final answer
-    if isinstance(first_text, str):
-        separator = ""
+    # The dynamic programming and the backtracking compare only the ids of the entries
+    first_ids, second_ids = __tokenize(first_text, second_text, reference)
+    operations: List[int] = list()
+    if anchored:
+        current_row, current_column, distance = __anchored_operations(
+            first_ids, second_ids, linear_memory, banded, operations
+        )
     else:
-        separator = " "
+        current_row, current_column, distance = __levenshtein_operations(
+            first_ids, second_ids, linear_memory, banded, max_distance, operations
+        )
 
-    # Create the answer list and initialize it with the first element
-    joined_result: List[List[str] | str] = list()
+    # The texts are too different, the path is not needed
+    if max_distance is not None and distance > max_distance:
+        return [], distance
 
-    if "-" in backtrack_result[-1]:
-        joined_result.append(backtrack_result[-1].split("-"))
-    else:
-        joined_result.append(backtrack_result[-1])
-
-    # Add the rest of the errors, keeping track of type to know whether we should start creating a new phrase
-    for current_str in backtrack_result[-2::-1]:
-        if isinstance(joined_result[-1], list) and "-" in current_str:
-            # We are collecting two separate phrases and the current_str is also separate, continue the last phrase
-            joined_result[-1][0] += separator + current_str[: current_str.find("-")]
-            joined_result[-1][1] += separator + current_str[current_str.find("-") + 1 :]
-        elif isinstance(joined_result[-1], list):
-            # We are collecting two separate phrases and the current_str is the same, start a new phrase
-            joined_result.append(current_str)
-        elif "-" in current_str:
-            # We are collecting two same phrases and the current_str is separate, start a new phrase
-            joined_result.append(current_str.split("-"))
-        else:
-            # We are collecting two same phrases and the current_str is also the same, continue the last phrase
-            joined_result[-1] += separator + current_str
+    # Put all the remaining symbols(words) in the answer and turn the transitions into the order of the texts
+    operations.extend([kernels.DELETE] * current_row)
+    operations.extend([kernels.INSERT] * current_column)
+    operations.reverse()
+
+    return operations, distance
+
+
+def __joined_levenshtein(
+    first_text: List[str] | str,
+    second_text: List[str] | str,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    max_distance: int | None = None,
+    anchored: bool | None = None,
+    reference: PreparedText | None = None,
+) -> Tuple[List[EditOp], int]:
+    """
+    Joins the transitions given by the initial levenshtein algorithm so they resemble errors more:
+    the consecutive equal entries form one operation, and so do the consecutive changed ones
+    :param first_text: a text to be compared, either as a string or a list of words
+    :param second_text: a text to be compared, either as a string or a list of words
+    :param linear_memory: whether the levenshtein table is stored only by checkpointed rows
+    :param banded: whether the levenshtein table is first computed only around its diagonal
+    :param max_distance: if the distance exceeds it, the computation may be abandoned early (with an empty result)
+    :param anchored: whether lists of words are aligned only between the found anchors
+    :param reference: the second text prepared with the word ids, which are reused (see __tokenize)
+    :return: Tuple[the edit script, i.e. the list of the joined operations covering both texts in their order,
+                   the levenshtein distance computed]
+    """
 
-    # Replace any symbols that symbolise empty space with empty space
-    for data in joined_result:
-        if not isinstance(data, list):
+    # Compute the full levenshtein answer
+    operations, distance = __backtracking_levenshtein(
+        first_text,
+        second_text,
+        linear_memory,
+        banded,
+        max_distance,
+        anchored,
+        reference,
+    )
+
+    script: List[EditOp] = list()
+    row = 0
+    column = 0
+    for operation in operations:
+        # Start a new operation whenever the entries switch from being the same to being changed or back
+        if len(script) == 0 or (script[-1].code == kernels.EQUAL) != (
+            operation == kernels.EQUAL
+        ):
+            script.append(EditOp(operation, row, row, column, column, 0))
+
+        current = script[-1]
+        if operation != kernels.EQUAL:
+            current.edits += 1
+        if operation != kernels.INSERT:
+            row += 1
+            current.first_end = row
+        if operation != kernels.DELETE:
+            column += 1
+            current.second_end = column
+
+    return __merged_script(script), distance
+
+
+def __merged_script(script: List[EditOp]) -> List[EditOp]:
+    """
+    Joins the consecutive operations of an edit script that are both equal or both changes,
+    e.g. after parts of the script were computed separately, and drops the empty ones
+    :param script: the edit script
+    :return: the edit script in which equal operations and changes alternate
+    """
+    merged: List[EditOp] = []
+    for operation in script:
+        if (
+            operation.first_begin == operation.first_end
+            and operation.second_begin == operation.second_end
+        ):
+            continue
+        if len(merged) != 0 and (merged[-1].code == kernels.EQUAL) == (
+            operation.code == kernels.EQUAL
+        ):
+            merged[-1].first_end = operation.first_end
+            merged[-1].second_end = operation.second_end
+            merged[-1].edits += operation.edits
             continue
+        merged.append(
+            EditOp(
+                operation.code,
+                operation.first_begin,
+                operation.first_end,
+                operation.second_begin,
+                operation.second_end,
+                operation.edits,
+            )
+        )
 
-        while "_ " in data[0] or "_ " in data[1]:
-            data[0] = data[0].replace("_ ", "_")
-            data[1] = data[1].replace("_ ", "_")
-        data[0] = data[0].replace("_", "")
-        data[1] = data[1].replace("_", "")
+    # The joined change is a replacement unless one of its sides is empty
+    for current in merged:
+        if current.code == kernels.EQUAL:
+            continue
+        if current.second_begin == current.second_end:
+            current.code = kernels.DELETE
+        elif current.first_begin == current.first_end:
+            current.code = kernels.INSERT
+        else:
+            current.code = kernels.REPLACE
 
-    return joined_result, distance
+    return merged
 
 
 def match(
-    first_text_str: str, second_text_str: str, separate_words: bool
+    first_text_str: str,
+    second_text_str: str | PreparedText,
+    separate_words: bool,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    max_distance: int | None = None,
+    anchored: bool | None = None,
 ) -> Tuple[List[Tuple[int, str, str]], int]:
     """
     Matches two texts and returns the difference via a list of errors
     (i.e. the changes that need to be made to the first text to obtain the second)
     :param first_text_str: the text in which we try to find the errors
-    :param second_text_str: the "correct" text
+    :param second_text_str: the "correct" text, or the text prepared by prepare_text
+                            (its word ids are reused if it is tokenized)
     :param separate_words: whether the algorithm matches using whole words or just symbols
+    :param linear_memory: whether the alignment keeps memory proportional to the length of the texts
+                          instead of their product, decided by the size of the texts if not specified
+    :param banded: whether the alignment is first computed only around the diagonal, which is much faster
+                   for similar texts and gives the same result
+    :param max_distance: if the distance between the texts exceeds it, the alignment may be abandoned early,
+                         in which case no errors are returned and the distance is only a lower bound
+    :param anchored: whether long texts are split by unique common word n-grams and only the gaps between them
+                     are aligned, decided by the size of the texts if not specified (only used with separate_words)
     :return: a Tuple[List[Tuple(the index at which the error occurs (the beginning of the phrase to replace),
                           the incorrect phrase,
                           the correct phrase)],
                      the distance between the texts]
     """
 
+    # The words of the prepared text are split already
+    reference = None
+    if isinstance(second_text_str, PreparedText):
+        if separate_words and second_text_str.words is not None:
+            reference = second_text_str
+        second_text_str = second_text_str.text
+
     # Split the text if needed so the algorithm compares whole words
     if separate_words:
         first_text: List[str] | str = first_text_str.split()
-        second_text: List[str] | str = second_text_str.split()
+        second_text: List[str] | str = (
+            second_text_str.split() if reference is None else reference.words  # type: ignore[assignment]
+        )
     else:
         first_text = first_text_str
         second_text = second_text_str
 
     # This algorithm uses levenshtein distance to determine the most probable matching
-    joined_result, distance = __joined_levenshtein(first_text, second_text)
-
-    # Calculating the final answer by cross-referencing the joined answers with the initial text
-    answer: List[Tuple[int, str, str]] = []
-    first_index = 0
-
-    for data in joined_result:
-        if isinstance(data, list):
-            answer.append((first_index, data[0], data[1]))
-            first_index += len(data[0])
-            if separate_words and data[0] != "":
-                first_index += 1
-        else:
-            first_index += len(data) + 1
+    script, distance = __joined_levenshtein(
+        first_text,
+        second_text,
+        linear_memory,
+        banded,
+        max_distance,
+        anchored,
+        reference,
+    )
+
+    # If we need to compare words, we need to separate them with spaces in the final answer
+    answer = __script_errors(
+        first_text, second_text, script, " " if separate_words else ""
+    )
 
     logger.info("Process match_words has ended. Returning the result.")
     return answer, distance
 
 
+def __script_errors(
+    first_text: List[str] | str,
+    second_text: List[str] | str,
+    script: List[EditOp],
+    separator: str,
+) -> List[Tuple[int, str, str]]:
+    """
+    Turns the changes of an edit script into the errors of the first text
+    :param first_text: the text in which the errors are, either as a string or a list of words
+    :param second_text: the "correct" text, either as a string or a list of words
+    :param script: the edit script that transforms the first text into the second one
+    :param separator: the separator of the entries of the texts (" " for words)
+    :return: List[Tuple(the index at which the error occurs in the first text joined by the separator,
+                        the incorrect phrase,
+                        the correct phrase)]
+    """
+
+    # The index of every entry of the first text in the text joined by the separator
+    offsets = array("I", [0])
+    for entry in first_text:
+        offsets.append(offsets[-1] + len(entry) + len(separator))
+
+    # Slicing the texts by the spans of the changes
+    return [
+        (
+            offsets[operation.first_begin],
+            separator.join(first_text[operation.first_begin : operation.first_end]),
+            separator.join(second_text[operation.second_begin : operation.second_end]),
+        )
+        for operation in script
+        if operation.code != kernels.EQUAL
+    ]
+
+
 def __match_symbols(
-    first_text: str, second_text: str
+    first_text: str, second_text: str, max_distance: int | None = None
 ) -> Tuple[List[Tuple[int, str, str]], int]:
     """
     Interface for match() that matches using symbols
     Used for symbol matching for finding short phrases in text more reliably
     :param first_text: the text in which we try to find the errors
     :param second_text: the "correct" text
+    :param max_distance: if the distance between the texts exceeds it, the matching may be abandoned early
     :return: a Tuple[List[Tuple(the index at which the error occurs (the beginning of the phrase to replace),
                           the incorrect phrase,
                           the correct phrase)],
                      the distance between the texts]
     """
-    return match(first_text, second_text, False)
+    return match(first_text, second_text, False, max_distance=max_distance)
 
 
-def match_words(first_text: str, second_text: str) -> List[Tuple[int, str, str]]:
+def match_words(
+    first_text: str,
+    second_text: str | PreparedText,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    anchored: bool | None = None,
+) -> List[Tuple[int, str, str]]:
     """
     Interface for match() that matches using whole words
     Used for finding errors in most cases
     :param first_text: the text in which we try to find the errors
-    :param second_text: the "correct" text
+    :param second_text: the "correct" text, or the text prepared by prepare_text
+    :param linear_memory: whether the alignment keeps memory proportional to the length of the texts
+    :param banded: whether the alignment is first computed only around the diagonal
+    :param anchored: whether long texts are aligned only between unique common word n-grams
     :return: List[Tuple(the index at which the error occurs (the beginning of the phrase to replace),
                         the incorrect phrase,
                         the correct phrase)]
     """
-    return match(first_text, second_text, True)[0]
+    return match(
+        first_text, second_text, True, linear_memory, banded, anchored=anchored
+    )[0]
 
 
-def match_phrases(phrases: List[str], text: str) -> List[List[Tuple[int, str, str]]]:
+def match_characters(found: str, expected: str) -> List[Tuple[int, str, str]]:
+    """
+    Interface for match() that matches the symbols of an incorrect phrase with the correct one
+    Used for showing which letters of a word error were misread, the case and the non-letter symbols
+    of the incorrect phrase are ignored (see prepare_text)
+    :param found: the incorrect phrase of a word error (see match_phrases)
+    :param expected: the correct phrase of the word error (prepared already)
+    :return: List[Tuple(the index in `found` at which the error occurs,
+                        the incorrect symbols of `found`,
+                        the correct symbols)]
+    """
+    prepared = prepare_text(found)
+    errors, _ = match(prepared.text, expected, False)
+
+    answers: List[Tuple[int, str, str]] = []
+    for at_char, incorrect, correct in errors:
+        # The symbols missing after the end of the phrase are inserted at its end
+        begin = (
+            prepared.indices[at_char] if at_char < len(prepared.indices) else len(found)
+        )
+        end = prepared.indices[at_char + len(incorrect) - 1] + 1 if incorrect else begin
+        answers.append((begin, found[begin:end], correct))
+    return answers
+
+
+def match_phrases(
+    phrases: List[str],
+    text: str | PreparedText,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    anchored: bool | None = None,
+    prepared_phrases: PreparedText | None = None,
+) -> List[List[Tuple[int, str, str]]]:
     """
     Matches a list of phrases with a text and returns the errors in the phrases
     Assumes that the list of phrases combines into the text
     :param phrases: a list of phrases to be checked
-    :param text: the "correct" text
+    :param text: the "correct" text (or the text prepared by prepare_text)
+    :param linear_memory: whether the alignment keeps memory proportional to the length of the texts
+    :param banded: whether the alignment is first computed only around the diagonal
+    :param anchored: whether long texts are aligned only between unique common word n-grams
+    :param prepared_phrases: the phrases joined with spaces and prepared by prepare_text, computed if not given
     :return: the list of errors by phrases, i.e.
             List[List[Tuple[the index at which the error occurs (the beginning of the phrase to replace],
                           the incorrect phrase,
@@ -236,143 +1096,601 @@ def match_phrases(phrases: List[str], text: str) -> List[List[Tuple[int, str, st
 
     logger.info("Starting match_phrases algorithm.")
 
+    answers = phrase_errors(
+        align_phrases(phrases, text, linear_memory, banded, anchored, prepared_phrases)
+    )
+
+    logger.info("Process match_phrases has ended. Returning the result.")
+    return answers
+
+
+def align_phrases(
+    phrases: List[str],
+    text: str | PreparedText,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    anchored: bool | None = None,
+    prepared_phrases: PreparedText | None = None,
+) -> PhraseAlignment:
+    """
+    Aligns the words of a list of phrases with a text (see match_phrases)
+    :param phrases: a list of phrases to be checked
+    :param text: the "correct" text (or the text prepared by prepare_text, it is tokenized in place)
+    :param linear_memory: whether the alignment keeps memory proportional to the length of the texts
+    :param banded: whether the alignment is first computed only around the diagonal
+    :param anchored: whether long texts are aligned only between unique common word n-grams
+    :param prepared_phrases: the phrases joined with spaces and prepared by prepare_text, computed if not given
+    :return: the alignment
+    """
+
     # Preparing the texts so that capital letters and non-letter symbols are ignored
-    better_text, text_indices = __prep_text(text)
-    better_phrases, phrase_indices = __prep_text(" ".join(phrases))
+    prepared_text = tokenize_text(__prepared(text))
+    if prepared_phrases is None:
+        prepared_phrases = prepare_text(" ".join(phrases))
 
     # Calculating the full answer using levenshtein distance
-    full_answer = match_words(better_phrases, better_text)
+    script, _ = __joined_levenshtein(
+        prepared_phrases.text.split(),
+        prepared_text.words,  # type: ignore[arg-type]
+        linear_memory,
+        banded,
+        None,
+        anchored,
+        prepared_text,
+    )
+    return PhraseAlignment(phrases, prepared_phrases, prepared_text, script)
+
+
+def phrase_errors(alignment: PhraseAlignment) -> List[List[Tuple[int, str, str]]]:
+    """
+    Distributes the errors of an alignment by its phrases
+    :param alignment: the alignment of the phrases with a text (see align_phrases)
+    :return: the list of errors by phrases (see match_phrases)
+    """
+    phrases = alignment.phrases
+    # The words of the text are not read by any phrase
+    if len(phrases) == 0:
+        return []
+    phrase_indices = alignment.prepared_phrases.indices
+    full_answer = __script_errors(
+        alignment.prepared_phrases.text.split(),
+        alignment.text.words,  # type: ignore[arg-type]
+        alignment.script,
+        " ",
+    )
 
     # Cross-referencing the indices in the full answer to distribute the errors by phrases
     answers: List[List[Tuple[int, str, str]]] = [[] for i in phrases]
     y = 0
     cur_ind = 0
     for i in full_answer:
-        while phrase_indices[i[0]] > cur_ind + len(phrases[y]):
+        # The words missing after the end of the phrases are inserted at the end of the last phrase
+        begin = (
+            phrase_indices[i[0]]
+            if i[0] < len(phrase_indices)
+            else sum(map(len, phrases)) + len(phrases) - 1
+        )
+        end = phrase_indices[i[0] + len(i[1]) - 1] + 1 if len(i[1]) != 0 else begin
+        while y + 1 < len(phrases) and begin > cur_ind + len(phrases[y]):
             cur_ind += 1 + len(phrases[y])
             y += 1
         answers[y].append(
-            (
-                phrase_indices[i[0]] - cur_ind,
-                phrases[y][
-                    phrase_indices[i[0]]
-                    - cur_ind : phrase_indices[i[0] + len(i[1]) - 1]
-                    + 1
-                    - cur_ind
-                ],
-                i[2],
-            )
+            (begin - cur_ind, phrases[y][begin - cur_ind : end - cur_ind], i[2])
         )
 
-    logger.info("Process match_phrases has ended. Returning the result.")
     return answers
 
 
-def __prep_text(text: str) -> Tuple[str, List[int]]:
+def realign_phrases(
+    alignment: PhraseAlignment,
+    text: str | PreparedText,
+    linear_memory: bool | None = None,
+    banded: bool = True,
+    anchored: bool | None = None,
+) -> PhraseAlignment:
+    """
+    Updates the alignment of phrases after their text is edited: the old text is compared with the new one,
+    and only the phrases around the edits (REALIGNMENT_MARGIN words of the text on each side) are aligned again,
+    the rest of the edit script is reused
+    :param alignment: the alignment of the phrases with the old text (see align_phrases)
+    :param text: the new text (or the text prepared by prepare_text, it is tokenized in place)
+    :param linear_memory: whether the alignment keeps memory proportional to the length of the texts
+    :param banded: whether the alignment is first computed only around the diagonal
+    :param anchored: whether long texts are aligned only between unique common word n-grams
+    :return: the alignment of the phrases with the new text
+    """
+
+    logger.info("Starting realign_phrases algorithm.")
+
+    new_text = tokenize_text(__prepared(text))
+    old_words: List[str] = alignment.text.words  # type: ignore[assignment]
+    new_words: List[str] = new_text.words  # type: ignore[assignment]
+    first_words = alignment.prepared_phrases.text.split()
+
+    # The edits of the text, the texts are almost the same, so the band stays narrow
+    # (the compiled band is faster than finding the anchors, the python one is not)
+    edits, _ = __joined_levenshtein(
+        old_words, new_words, None, True, None, not kernels.AVAILABLE
+    )
+    changes = [edit for edit in edits if edit.code != kernels.EQUAL]
+
+    # The positions of the words of the old text after the changes, and the shifts of their indices
+    change_ends = [change.first_end for change in changes]
+    shifts = [0]
+    for change in changes:
+        shifts.append(
+            shifts[-1]
+            + (change.second_end - change.second_begin)
+            - (change.first_end - change.first_begin)
+        )
+
+    # The script can be cut between its operations, the cuts around the changes are aligned again
+    rows = array("I", [operation.first_begin for operation in alignment.script])
+    columns = array("I", [operation.second_begin for operation in alignment.script])
+    rows.append(len(first_words))
+    columns.append(len(old_words))
+    regions: List[Tuple[int, int]] = []
+    for change in changes:
+        low = max(0, bisect_right(columns, change.first_begin - REALIGNMENT_MARGIN) - 1)
+        high = min(
+            len(columns) - 1,
+            bisect_left(columns, change.first_end + REALIGNMENT_MARGIN),
+        )
+        if len(regions) != 0 and low <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(high, regions[-1][1]))
+        else:
+            regions.append((low, high))
+
+    script: List[EditOp] = []
+    done = 0
+    for low, high in regions + [(len(alignment.script), len(alignment.script))]:
+        # The operations between the regions are only shifted
+        for operation in alignment.script[done:low]:
+            shift = shifts[bisect_right(change_ends, operation.second_begin)]
+            script.append(
+                EditOp(
+                    operation.code,
+                    operation.first_begin,
+                    operation.first_end,
+                    operation.second_begin + shift,
+                    operation.second_end + shift,
+                    operation.edits,
+                )
+            )
+        if low == high:
+            break
+
+        # The words inserted at the cuts (at the ends of the text) belong to the region
+        begin = columns[low] + shifts[bisect_left(change_ends, columns[low])]
+        end = columns[high] + shifts[bisect_right(change_ends, columns[high])]
+        region, _ = __joined_levenshtein(
+            first_words[rows[low] : rows[high]],
+            new_words[begin:end],
+            linear_memory,
+            banded,
+            None,
+            anchored,
+        )
+        for operation in region:
+            script.append(
+                EditOp(
+                    operation.code,
+                    operation.first_begin + rows[low],
+                    operation.first_end + rows[low],
+                    operation.second_begin + begin,
+                    operation.second_end + begin,
+                    operation.edits,
+                )
+            )
+        done = high
+
+    logger.info(
+        f"Process realign_phrases has ended, {len(regions)} regions were aligned again."
+    )
+    return PhraseAlignment(
+        alignment.phrases,
+        alignment.prepared_phrases,
+        new_text,
+        __merged_script(script),
+    )
+
+
+def join_alignments(
+    alignments: Sequence[PhraseAlignment], text: PreparedText
+) -> PhraseAlignment:
+    """
+    Joins the alignments of consecutive lists of phrases with consecutive parts of a text into one
+    :param alignments: the alignments, the parts of the text they are aligned with cover the text in order
+    :param text: the whole text prepared and tokenized by prepare_text
+    :return: the alignment of all the phrases with the text
+    """
+    phrases: List[str] = []
+    script: List[EditOp] = []
+    row, column = 0, 0
+    for alignment in alignments:
+        phrases.extend(alignment.phrases)
+        for operation in alignment.script:
+            script.append(
+                EditOp(
+                    operation.code,
+                    operation.first_begin + row,
+                    operation.first_end + row,
+                    operation.second_begin + column,
+                    operation.second_end + column,
+                    operation.edits,
+                )
+            )
+        row += len(alignment.prepared_phrases.text.split())
+        column += len(alignment.text.words or [])
+    return PhraseAlignment(
+        phrases,
+        prepare_text(" ".join(phrases)),
+        tokenize_text(text),
+        __merged_script(script),
+    )
+
+
+def split_phrases(
+    phrases: List[str],
+    text: str | PreparedText,
+    chunks: int,
+    prepared_phrases: PreparedText | None = None,
+) -> List[Tuple[List[str], PreparedText]]:
+    """
+    Splits a list of phrases and a text into consecutive chunks that can be aligned independently
+    (e.g. in parallel), the alignments of the chunks joined by join_alignments give the alignment of the whole.
+    The chunks are cut only between phrases that lie inside anchors (see __find_anchors),
+    i.e. inside n-grams that occur exactly once in both texts and in the same order, so the cuts are matched words
+    :param phrases: a list of phrases to be checked
+    :param text: the "correct" text (or the text prepared by prepare_text, it is tokenized in place)
+    :param chunks: the number of chunks wanted, there are fewer of them if the texts have too few anchors
+    :param prepared_phrases: the phrases joined with spaces and prepared by prepare_text, computed if not given
+    :return: the list of Tuple[the phrases of the chunk, the prepared part of the text they are aligned with],
+             the parts of the text are not tokenized
+    """
+    prepared_text = tokenize_text(__prepared(text))
+    if prepared_phrases is None:
+        prepared_phrases = prepare_text(" ".join(phrases))
+    words: List[str] = prepared_text.words  # type: ignore[assignment]
+
+    # The index of the first word of every phrase, and the number of the words
+    word_indices = array(
+        "I",
+        [
+            prepared_phrases.indices[match.start()]
+            for match in re.finditer(r"\S+", prepared_phrases.text)
+        ],
+    )
+    boundaries = [0]
+    phrase_end = -1
+    for phrase in phrases:
+        phrase_end += len(phrase) + 1
+        boundaries.append(bisect_left(word_indices, phrase_end))
+
+    first_ids, second_ids = __tokenize(
+        prepared_phrases.text.split(), words, prepared_text
+    )
+    # The boundaries of the phrases inside the anchors and the words of the text they are matched with
+    cuts: List[Tuple[int, int]] = []
+    for first_position, second_position in __find_anchors(
+        first_ids, second_ids, ANCHOR_NGRAM_SIZE
+    ):
+        begin = bisect_left(boundaries, first_position)
+        end = bisect_right(boundaries, first_position + ANCHOR_NGRAM_SIZE)
+        for boundary in range(max(begin, 1), min(end, len(phrases))):
+            if len(cuts) == 0 or cuts[-1][0] < boundary:
+                cuts.append(
+                    (boundary, second_position + boundaries[boundary] - first_position)
+                )
+
+    # The cuts closest to the even division of the phrases by their words
+    chosen = [(0, 0)]
+    for chunk in range(1, chunks):
+        target = boundaries[-1] * chunk // chunks
+        index = bisect_left(cuts, target, key=lambda cut: boundaries[cut[0]])
+        nearest = [
+            cut for cut in cuts[max(0, index - 1) : index + 1] if cut[0] > chosen[-1][0]
+        ]
+        if len(nearest) != 0:
+            chosen.append(
+                min(nearest, key=lambda cut: abs(boundaries[cut[0]] - target))
+            )
+    chosen.append((len(phrases), len(words)))
+
+    # The words of the prepared text are separated by single spaces
+    starts = [0]
+    for word in words:
+        starts.append(starts[-1] + len(word) + 1)
+
+    result: List[Tuple[List[str], PreparedText]] = []
+    for (first_phrase, first_word), (last_phrase, last_word) in zip(
+        chosen[:-1], chosen[1:], strict=True
+    ):
+        begin = starts[first_word]
+        end = max(begin, starts[last_word] - 1)
+        result.append(
+            (
+                phrases[first_phrase:last_phrase],
+                PreparedText(
+                    prepared_text.text[begin:end], prepared_text.indices[begin:end]
+                ),
+            )
+        )
+    return result
+
+
+def prepare_text(text: str, tokenize: bool = False) -> PreparedText:
     """
     Prepares the text, so it is fully lowercase and does not contain any non-letter symbols
     It is using inbuilt isalpha() and lower() functions so it should support multiple languages
+    Takes linear time: the text is scanned by runs of words instead of symbol by symbol,
+    or the symbols are filtered by vectorized numpy operations if numba (and thus numpy) is available
     :param text: the text to be prepared
-    :return: the changed text and a list of indices that map the changed text to the initial one
+    :param tokenize: whether the words of the prepared text are split and mapped to ids as well,
+                     so the comparisons with the text do not repeat it (see __tokenize)
+    :return: the changed text and the indices that map the changed text to the initial one
     """
 
-    logger.info("Starting prep_text algorithm.")
+    logger.info("Starting prepare_text algorithm.")
 
-    changed: str = ""
-    indices: List[int] = []
+    if kernels.AVAILABLE:
+        kept, indices = kernels.kept_symbols(text)
+    else:
+        kept, indices = __kept_symbols(text)
+    prepared = PreparedText(kept.lower(), indices)
 
-    # Remove any non-letter symbols
-    for i in range(len(text)):
-        if (
-            text[i].isalpha()
-            or text[i] == " "
-            and (len(changed) == 0 or changed[-1] != " ")
-        ):
-            changed += text[i]
-            indices.append(i)
+    if tokenize:
+        tokenize_text(prepared)
 
-    # Cut off any unnecessary spaces in the beginning and end
-    indices = indices[len(changed) - len(changed.lstrip()) :]
+    logger.info("Process prepare_text has ended. Returning the result.")
+    return prepared
 
-    if changed.rstrip() != changed:
-        indices = indices[: len(changed.rstrip()) - len(changed)]
 
-    logger.info("Process prep_text has ended. Returning the result.")
-    return changed.lower().strip(), indices
+def tokenize_text(prepared: PreparedText) -> PreparedText:
+    """
+    Splits the words of a prepared text and maps them to ids, if it is not tokenized yet
+    :param prepared: the text prepared by prepare_text, it is changed in place
+    :return: the same prepared text
+    """
+    if prepared.words is None:
+        vocabulary: Dict[str, int] = {}
+        prepared.words = prepared.text.split()
+        prepared.word_ids = array(
+            "i", [vocabulary.setdefault(w, len(vocabulary)) for w in prepared.words]
+        )
+        prepared.vocabulary = vocabulary
+    return prepared
 
 
-def __find(iterable: List[Any] | str, start_index: int, to_find: Any, step: int) -> int:
+def __kept_symbols(text: str) -> Tuple[str, array]:
     """
-    Helper function for finding the index of a certain element in a list
-    Works with any initial position and step(whole, non-zero)
-    :param iterable: The list or string to search
-    :param start_index: The initial position for the search
-    :param to_find: The element or symbol to be found
-    :param step: The step with which to search for (can be negative)
-    :return: The index of the first found instance that follows the search parameters
-             returns len(iterable) (or -1 with negative step) if nothing was found
+    Removes the non-letter symbols of the text and collapses its spaces (see prepare_text)
+    :param text: the text to be prepared
+    :return: Tuple[the kept symbols (not lowercased), the indices of the kept symbols in the text, array of type 'I']
     """
 
-    # Check for validness of step
-    if type(step) != int or step == 0:
-        raise ValueError("Step of 0 or not int step")
+    parts: List[str] = []
+    indices = array("I")
+
+    # Remove any non-letter symbols and collapse the spaces, the leading spaces are dropped at once
+    after_space = True
+    for run in WORDS_OR_SPACES.finditer(text):
+        begin, end = run.span()
+        if text[begin] == " ":
+            if not after_space:
+                parts.append(" ")
+                indices.append(begin)
+                after_space = True
+            continue
+
+        words = run.group()
+        if words.replace(" ", "").isalpha():
+            parts.append(words)
+            indices.extend(range(begin, end))
+            after_space = False
+            continue
+
+        # The run contains numeric symbols that are not digits, e.g. superscripts
+        for i in range(begin, end):
+            if text[i] == " ":
+                if not after_space:
+                    parts.append(" ")
+                    indices.append(i)
+                    after_space = True
+            elif text[i].isalpha():
+                parts.append(text[i])
+                indices.append(i)
+                after_space = False
 
-    # Set iteration bound so negative steps work
-    if step < 0:
-        iteration_end = -1
-    else:
-        iteration_end = len(iterable)
+    # Cut off the space in the end
+    if after_space and len(parts) != 0:
+        parts.pop()
+        indices.pop()
 
-    # Iterate to find the element
-    for i in range(start_index, iteration_end, step):
-        if iterable[i] == to_find:
-            return i
+    return "".join(parts), indices
 
-    # If it was not found, return the end of iteration
-    return iteration_end
 
+def __prepared(text: str | PreparedText) -> PreparedText:
+    """
+    Prepares the text unless it is already prepared
+    :param text: the text or the prepared text
+    :return: the prepared text
+    """
+    if isinstance(text, PreparedText):
+        return text
+    return prepare_text(text)
 
-def find_phrases(phrases: List[str], to_find: str, margin: float = 1.05) -> List[int]:
+
+def __semi_global_alignment(pattern: str, text: str) -> Tuple[int, int, int]:
+    """
+    Finds the substring of the text with the minimal levenshtein distance to the pattern in one pass
+    (the levenshtein table where skipping the beginning and the end of the text is free)
+    Takes O(len(pattern) * len(text)) time and O(len(pattern)) memory
+    Uses the compiled kernel if numba is available
+    :param pattern: the text to be found
+    :param text: the text to search in
+    :return: Tuple[the distance, the beginning of the found substring, the end of the found substring (exclusive)],
+             the earliest substring is returned if there are several best ones
+    """
+    pattern_ids, text_ids = __tokenize(pattern, text)
+    if kernels.AVAILABLE:
+        distance, begin, end = kernels.semi_global_alignment(
+            kernels.as_array(pattern_ids), kernels.as_array(text_ids)
+        )
+        return int(distance), int(begin), int(end)
+
+    # The table is computed column by column, every cell remembers where its path has started in the text
+    rows = len(pattern_ids)
+    column = list(range(rows + 1))
+    starts = [0] * (rows + 1)
+    best, best_begin, best_end = rows, 0, 0
+    for j in range(1, len(text_ids) + 1):
+        symbol = text_ids[j - 1]
+        diagonal, diagonal_start = column[0], starts[0]
+        column[0], starts[0] = 0, j
+        for i in range(1, rows + 1):
+            value, start = diagonal + (pattern_ids[i - 1] != symbol), diagonal_start
+            if column[i - 1] + 1 < value:
+                value, start = column[i - 1] + 1, starts[i - 1]
+            if column[i] + 1 < value:
+                value, start = column[i] + 1, starts[i]
+            diagonal, diagonal_start = column[i], starts[i]
+            column[i], starts[i] = value, start
+
+        if column[rows] < best:
+            best, best_begin, best_end = column[rows], starts[rows], j
+
+    return best, best_begin, best_end
+
+
+def __myers_scan(
+    pattern_ids: array, text_ids: array, anchored: bool
+) -> Tuple[int, int]:
+    """
+    Bit-parallel approximate search (Myers' algorithm): the columns of the levenshtein table are kept
+    as bit-vectors of the vertical differences, so a whole column is computed by a few integer operations
+    Python integers hold patterns of any length, the compiled kernel splits them into blocks of 64 symbols
+    :param pattern_ids: the ids of the symbols of the pattern (not empty)
+    :param text_ids: the ids of the symbols of the text
+    :param anchored: whether the match has to start at the beginning of the text
+    :return: Tuple[the minimal distance of the pattern to a substring of the text,
+                   the earliest end (exclusive) of such substring]
+    """
+    if kernels.AVAILABLE:
+        alphabet = {
+            symbol: index for index, symbol in enumerate(dict.fromkeys(pattern_ids))
+        }
+        distance, end = kernels.myers_search(
+            kernels.as_array(array("i", [alphabet[s] for s in pattern_ids])),
+            kernels.as_array(
+                array("i", [alphabet.get(s, len(alphabet)) for s in text_ids])
+            ),
+            len(alphabet),
+            anchored,
+        )
+        return int(distance), int(end)
+
+    # Bit masks of the positions of every symbol in the pattern
+    peq: Dict[int, int] = {}
+    for i, symbol in enumerate(pattern_ids):
+        peq[symbol] = peq.get(symbol, 0) | 1 << i
+
+    mask = (1 << len(pattern_ids)) - 1
+    last_bit = 1 << (len(pattern_ids) - 1)
+    positive, negative = mask, 0
+    score = best = len(pattern_ids)
+    best_end = 0
+    for j, symbol in enumerate(text_ids, 1):
+        eq = peq.get(symbol, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        ph = negative | ~(xh | positive) & mask
+        mh = positive & xh
+        if ph & last_bit:
+            score += 1
+        elif mh & last_bit:
+            score -= 1
+        ph = (ph << 1 | anchored) & mask
+        mh = mh << 1 & mask
+        positive = mh | ~(xv | ph) & mask
+        negative = ph & xv
+        if score < best:
+            best, best_end = score, j
+
+    return best, best_end
+
+
+def __myers_search(pattern: str, text: str) -> Tuple[int, int, int]:
+    """
+    Finds the substring of the text with the minimal levenshtein distance to the pattern using bit-parallelism
+    The end of the substring is found by scanning the text, the beginning by scanning back from the end
+    :param pattern: the text to be found
+    :param text: the text to search in
+    :return: Tuple[the distance, the beginning of the found substring, the end of the found substring (exclusive)],
+             the earliest and then the shortest substring is returned if there are several best ones
+    """
+    pattern_ids, text_ids = __tokenize(pattern, text)
+    if len(pattern_ids) == 0:
+        return 0, 0, 0
+
+    distance, end = __myers_scan(pattern_ids, text_ids, False)
+    _, length = __myers_scan(pattern_ids[::-1], text_ids[end - 1 :: -1], True)
+    return distance, end - length, end
+
+
+def find_phrases(
+    phrases: List[str],
+    to_find: str | PreparedText,
+    engine: str = "myers",
+    prepared_phrases: PreparedText | None = None,
+) -> Tuple[List[int], int]:
     """
     Finds a piece of text in a list of phrases and returns the indices of the phrases in which the text appears in
     :param phrases: a list of phrases
-    :param to_find: the text to be found
-    :param margin: the margin for error, used for bloating the search window if to_find has contractions
-    :return: the indices of the phrases which compose to_find
+    :param to_find: the text to be found (or the text prepared by prepare_text)
+    :param engine: the search algorithm, either "myers" (bit-parallel) or "dp" (semi-global levenshtein table),
+                   both find a substring with the minimal distance
+    :param prepared_phrases: the phrases joined with spaces and prepared by prepare_text, computed if not given
+    :return: Tuple[the indices of the phrases which compose to_find,
+                   the levenshtein distance between to_find and the found text (the lower, the more confident)]
     """
 
     # Prepare text to ignore multiple spaces and non-letter symbols
-    better_text, text_indices = __prep_text(to_find)
-    better_phrases, phrase_indices = __prep_text(" ".join(phrases))
+    better_text = __prepared(to_find).text
+    if prepared_phrases is None:
+        prepared_phrases = prepare_text(" ".join(phrases))
+    better_phrases, phrase_indices = prepared_phrases.text, prepared_phrases.indices
+
+    # Find the part of the phrases that best fits the string
+    if engine == "myers":
+        distance, best_beg, best_end = __myers_search(better_text, better_phrases)
+    elif engine == "dp":
+        distance, best_beg, best_end = __semi_global_alignment(
+            better_text, better_phrases
+        )
+    else:
+        raise ValueError(f"Unknown search engine: {engine}")
+    if best_beg == best_end:
+        return [], distance
 
-    # Compute the size of a window to compare to the text
-    window = int(len(better_text) * margin)
+    return __covered_phrases(phrases, phrase_indices, best_beg, best_end), distance
 
-    # Find the window that best fits the string
-    best_window_min = inf
-    best_window_result = []
 
-    best_end = 0
-    for j in range(window, len(better_phrases) + 1):
-        new_ans, lev_dist = __match_symbols(better_text, better_phrases[j - window : j])
-        if best_window_min > lev_dist:
-            best_window_result = new_ans
-            best_window_min = lev_dist
-            best_end = j
-    best_beg = best_end - window
-
-    # Trim the window to exclude unnecessary symbols (trims using full words)
-    optimal_ans = best_window_result
-
-    if len(optimal_ans) > 0 and optimal_ans[0][0] == 0:
-        first_word = __find(
-            optimal_ans[0][2], len(optimal_ans[0][2]) - len(optimal_ans[0][1]) - 1, " ", -1
-        )
-        best_beg += first_word + 1
+def __covered_phrases(
+    phrases: List[str], phrase_indices: array, begin: int, end: int
+) -> List[int]:
+    """
+    Finds the phrases which are covered by a substring of the prepared joined phrases
+    :param phrases: a list of phrases
+    :param phrase_indices: the indices that map the prepared joined phrases to the initial ones (see prepare_text)
+    :param begin: the beginning of the substring in the prepared joined phrases
+    :param end: the end of the substring in the prepared joined phrases (exclusive, greater than begin)
+    :return: the indices of the phrases which compose the substring
+    """
 
     # Transform the indices from prepared text to initial text
-    actual_beg = phrase_indices[best_beg]
-    actual_end = phrase_indices[best_end - 1] + 1
+    actual_beg = phrase_indices[begin]
+    actual_end = phrase_indices[end - 1] + 1
 
     # Iterate through phrases to compute the final answer
     answer = []
@@ -389,6 +1707,140 @@ def find_phrases(phrases: List[str], to_find: str, margin: float = 1.05) -> List
     return answer
 
 
+def __qgram_index(text: str, size: int) -> Dict[str, List[int]]:
+    """
+    Builds an inverted index of the q-grams of the text
+    :param text: the text to be indexed
+    :param size: the length of the q-grams
+    :return: the dictionary from every q-gram of the text to the list of its positions in the text
+    """
+    index: Dict[str, List[int]] = {}
+    for position in range(len(text) - size + 1):
+        index.setdefault(text[position : position + size], []).append(position)
+    return index
+
+
+def __candidate_regions(
+    pattern: str, index: Dict[str, List[int]], size: int, text_length: int
+) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Counts the q-grams of the pattern found in the indexed text by regions where the pattern may occur
+    A hit of the q-gram at the position i of the pattern and the position p of the text votes for the diagonal p - i,
+    the diagonals are grouped into bins of len(pattern), and a region is a pair of the consecutive bins
+    (the region b covers the matches starting in the text between b * len(pattern) and (b + 2) * len(pattern))
+    Every q-gram of the pattern is counted at most once in a region, and the q-grams that occur in the text
+    more often than there are bins are skipped since they do not tell the regions apart
+    :param pattern: the text to be found (not shorter than size)
+    :param index: the q-gram index of the text (see __qgram_index)
+    :param size: the length of the q-grams
+    :param text_length: the length of the indexed text
+    :return: Tuple[the number of the q-grams of the pattern that were counted,
+                   the list of Tuple[the number of hits, the region] ordered by the number of hits descending]
+    """
+    length = len(pattern)
+    frequent = text_length // length + 1
+    counted = 0
+    regions: Dict[int, int] = {}
+    for i in range(length - size + 1):
+        positions = index.get(pattern[i : i + size], ())
+        if len(positions) > frequent:
+            continue
+
+        counted += 1
+        hit = set()
+        for position in positions:
+            current = max(position - i, 0) // length
+            hit.add(current)
+            if current > 0:
+                hit.add(current - 1)
+        for region in hit:
+            regions[region] = regions.get(region, 0) + 1
+
+    return counted, sorted(
+        ((hits, region) for region, hits in regions.items()),
+        key=lambda candidate: (-candidate[0], candidate[1]),
+    )
+
+
+def __filtered_search(
+    pattern: str, text: str, index: Dict[str, List[int]]
+) -> Tuple[int, int, int]:
+    """
+    Finds the substring of the text with the minimal levenshtein distance to the pattern,
+    running the exact search only on the regions of the text that pass the q-gram filter
+    By the q-gram lemma every edit spoils at most QGRAM_SIZE q-grams of the pattern, so a substring at the distance k
+    contains all but k * QGRAM_SIZE of the counted q-grams, and the number of hits in a region gives a lower bound
+    of the distance inside it. The regions are verified while their bound is lower than the best distance found,
+    and the whole text is searched if the regions without hits can still be better
+    :param pattern: the text to be found
+    :param text: the text to search in
+    :param index: the q-gram index of the text (see __qgram_index)
+    :return: Tuple[the distance, the beginning of the found substring, the end of the found substring (exclusive)]
+    """
+    length = len(pattern)
+    if length < 2 * QGRAM_SIZE:
+        return __myers_search(pattern, text)
+
+    # The lower bound of a region is ceil((counted - hits) / QGRAM_SIZE)
+    counted, regions = __candidate_regions(pattern, index, QGRAM_SIZE, len(text))
+    no_hits_bound = -(-counted // QGRAM_SIZE)
+
+    best, best_begin, best_end = length + 1, 0, 0
+    for hits, region in regions:
+        if -(-(counted - hits) // QGRAM_SIZE) > best:
+            break
+        offset = region * length
+        distance, begin, end = __myers_search(
+            pattern, text[offset : offset + 3 * length]
+        )
+        if distance < best or distance == best and offset + end < best_end:
+            best, best_begin, best_end = distance, offset + begin, offset + end
+
+    # A match outside the verified regions cannot be better than the bound of a region without hits
+    if best >= no_hits_bound:
+        return __myers_search(pattern, text)
+    return best, best_begin, best_end
+
+
+def locate_phrases(
+    phrases: List[str],
+    to_find: Sequence[str | PreparedText],
+    prepared_phrases: PreparedText | None = None,
+) -> List[Tuple[List[int], int]]:
+    """
+    Finds several pieces of text in a list of phrases, the batch version of find_phrases
+    The joined phrases are prepared and indexed by q-grams once, then every piece of text is searched
+    only in the regions of the phrases which share enough q-grams with it
+    :param phrases: a list of phrases
+    :param to_find: the texts to be found (or the texts prepared by prepare_text)
+    :param prepared_phrases: the phrases joined with spaces and prepared by prepare_text, computed if not given
+    :return: the list of Tuple[the indices of the phrases which compose the text,
+                               the levenshtein distance between the text and the found one]
+             in the order of to_find
+    """
+
+    logger.info("Starting locate_phrases algorithm.")
+
+    if prepared_phrases is None:
+        prepared_phrases = prepare_text(" ".join(phrases))
+    better_phrases, phrase_indices = prepared_phrases.text, prepared_phrases.indices
+    index = __qgram_index(better_phrases, QGRAM_SIZE)
+
+    answers: List[Tuple[List[int], int]] = []
+    for text in to_find:
+        better_text = __prepared(text).text
+        distance, begin, end = __filtered_search(better_text, better_phrases, index)
+        if begin == end:
+            answers.append(([], distance))
+        else:
+            answers.append(
+                (__covered_phrases(phrases, phrase_indices, begin, end), distance)
+            )
+
+    logger.info("Process locate_phrases has ended. Returning the result.")
+    return answers
+
+
 # tests = {
 #     "test_cases": [
 #         {
@@ -0,0 +1,251 @@
+import mmap
+import pickle
+import re
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from core.processing.ngram_index import NGramIndex, locate_reading
+from core.processing.text import PreparedText, prepare_text, tokenize_text
+
+logger.add(
+    "./logs/text_storage.log",
+    format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
+    enqueue=True,
+)
+
+"""
+`PREPARED_SUFFIX` is the suffix of the file next to a stored reference text,
+which keeps the text prepared for the comparisons (see StoredText)
+"""
+PREPARED_SUFFIX = ".prepared"
+
+"""
+`VOCABULARY_SUFFIX` is the suffix of the file next to a stored reference text,
+which keeps the dictionary from the words of the text to their ids
+"""
+VOCABULARY_SUFFIX = ".vocabulary"
+
+"""
+`INDEX_SUFFIX` is the suffix of the file next to a stored reference text,
+which keeps the word n-gram index of the text (see ngram_index.NGramIndex)
+"""
+INDEX_SUFFIX = ".index"
+
+"""
+`PREPARED_MAGIC` and `PREPARED_VERSION` start the file of the prepared text,
+a file of another version is written again from the reference text (see open_reference_text)
+"""
+PREPARED_MAGIC = 0x50525054
+PREPARED_VERSION = 1
+
+"""
+`TEXT_ENCODING` stores every symbol of the prepared text in 4 bytes of the native byte order,
+so the symbols of a span are read from the file by their indices
+"""
+TEXT_ENCODING = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+
+
+class StoredText:
+    """
+    `StoredText` is the prepared form of a stored reference text memory-mapped from its file,
+    so a span of a whole book is read without loading the book. The file holds a header of 4 integers
+    (PREPARED_MAGIC, PREPARED_VERSION, the number of symbols, the number of words) and the arrays
+    of the symbols of the prepared text, their indices in the reference text, the bounds of the words
+    in the prepared text and the ids of the words. It has to be closed (see close, it is a context manager as well)
+    """
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        # e.g. the pickled prepared texts stored by the previous versions
+        if len(mapped) < 16 or len(mapped) % 4 != 0:
+            mapped.close()
+            raise ValueError(f"{path} is not a prepared text")
+        view = memoryview(mapped).cast("I")
+        magic, version, symbols, words = view[:4]
+        if magic != PREPARED_MAGIC or version != PREPARED_VERSION:
+            view.release()
+            mapped.close()
+            raise ValueError(
+                f"{path} is not a prepared text of version {PREPARED_VERSION}"
+            )
+
+        self.mapped = mapped
+        self.view = view
+        arrays = []
+        offset = 4
+        for count in (symbols, symbols, words, words, words):
+            arrays.append(view[offset : offset + count])
+            offset += count
+        self.symbols, self.indices, self.starts, self.ends, self.word_ids = arrays
+
+    def __enter__(self) -> "StoredText":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the file, the text cannot be used afterwards
+        """
+        if self.mapped.closed:
+            return
+        # The views of the map have to be released before the map is closed
+        for view in (self.symbols, self.indices, self.starts, self.ends, self.word_ids):
+            view.release()
+        self.view.release()
+        self.mapped.close()
+
+    @staticmethod
+    def write(prepared: PreparedText, path: Path) -> None:
+        """
+        Writes the prepared text to a file
+        :param prepared: the text prepared with the word ids (see prepare_text)
+        :param path: the file of the prepared text
+        """
+        starts, ends = array("I"), array("I")
+        for word in re.finditer(r"\S+", prepared.text):
+            starts.append(word.start())
+            ends.append(word.end())
+        with open(path, "wb") as file:
+            array(
+                "I", [PREPARED_MAGIC, PREPARED_VERSION, len(prepared.text), len(starts)]
+            ).tofile(file)
+            file.write(prepared.text.encode(TEXT_ENCODING))
+            array("I", prepared.indices).tofile(file)
+            starts.tofile(file)
+            ends.tofile(file)
+            array("I", prepared.word_ids or array("i")).tofile(file)
+
+    def _text(self, begin: int, end: int) -> str:
+        return self.symbols[begin:end].tobytes().decode(TEXT_ENCODING)
+
+    def prepared(self, vocabulary: Dict[str, int]) -> PreparedText:
+        """
+        :param vocabulary: the dictionary from the words of the text to their ids
+        :return: the whole prepared text
+        """
+        text = self._text(0, len(self.symbols))
+        return PreparedText(
+            text,
+            array("I", self.indices),
+            text.split(),
+            array("i", self.word_ids),
+            vocabulary,
+        )
+
+    def span(self, begin: int, end: int) -> PreparedText:
+        """
+        Reads a span of the text, its words get the ids of their own vocabulary,
+        so the span does not hold the vocabulary of the whole text
+        :param begin: the index of the first word of the span
+        :param end: the index after the last word of the span
+        :return: the prepared span
+        """
+        if begin >= end:
+            return tokenize_text(PreparedText("", array("I")))
+        text_begin, text_end = self.starts[begin], self.ends[end - 1]
+        return tokenize_text(
+            PreparedText(
+                self._text(text_begin, text_end),
+                array("I", self.indices[text_begin:text_end]),
+            )
+        )
+
+
+def save_reference_text(text: str, path: Path) -> PreparedText:
+    """
+    Stores a reference text together with its prepared form (the normalized text, the offset map and the word ids),
+    so the comparisons with the text do not prepare it again, and the index of its word n-grams
+    :param text: the reference text
+    :param path: the file to store the text in, the prepared text is stored next to it
+    :return: the prepared text
+    """
+    logger.info(f"Preparing the reference text ({path}).")
+    prepared = prepare_text(text, tokenize=True)
+
+    path.write_text(text, encoding="utf-8")
+    _save_prepared(prepared, path)
+
+    logger.info(f"The reference text ({path}) has been stored.")
+    return prepared
+
+
+def _save_prepared(prepared: PreparedText, path: Path) -> None:
+    StoredText.write(prepared, path.with_name(path.name + PREPARED_SUFFIX))
+    with open(path.with_name(path.name + VOCABULARY_SUFFIX), "wb") as file:
+        pickle.dump(prepared.vocabulary, file, protocol=pickle.HIGHEST_PROTOCOL)
+    index = NGramIndex.build(prepared.word_ids or array("i"))
+    index.save(path.with_name(path.name + INDEX_SUFFIX))
+
+
+def open_reference_text(path: Path) -> StoredText:
+    """
+    Memory-maps the prepared form of a reference text stored by save_reference_text,
+    it is prepared again if it is missing or outdated
+    :param path: the file of the reference text
+    :return: the prepared text, which has to be closed (see StoredText.close)
+    """
+    try:
+        return StoredText(path.with_name(path.name + PREPARED_SUFFIX))
+    except (OSError, ValueError):
+        logger.warning(f"Preparing the reference text ({path}) again.")
+
+    _save_prepared(prepare_text(path.read_text(encoding="utf-8"), tokenize=True), path)
+    return StoredText(path.with_name(path.name + PREPARED_SUFFIX))
+
+
+def _load_vocabulary(path: Path) -> Dict[str, int]:
+    # The vocabulary is written together with the prepared text (see open_reference_text)
+    with open(path.with_name(path.name + VOCABULARY_SUFFIX), "rb") as file:
+        vocabulary: Dict[str, int] = pickle.load(file)
+    return vocabulary
+
+
+def load_reference_text(path: Path) -> PreparedText:
+    """
+    Loads the prepared form of a reference text stored by save_reference_text
+    :param path: the file of the reference text
+    :return: the prepared text
+    """
+    with open_reference_text(path) as stored:
+        return stored.prepared(_load_vocabulary(path))
+
+
+def load_reference_index(path: Path) -> NGramIndex:
+    """
+    Memory-maps the word n-gram index of a reference text stored by save_reference_text,
+    the index is built again if it is missing or outdated
+    :param path: the file of the reference text
+    :return: the index, which has to be closed (see NGramIndex.close)
+    """
+    index_path = path.with_name(path.name + INDEX_SUFFIX)
+    try:
+        return NGramIndex.load(index_path)
+    except (OSError, ValueError):
+        logger.warning(f"Rebuilding the index of the reference text ({path}).")
+
+    with open_reference_text(path) as stored:
+        NGramIndex.build(array("i", stored.word_ids)).save(index_path)
+    return NGramIndex.load(index_path)
+
+
+def load_reference_reading(phrases: List[str], path: Path) -> PreparedText:
+    """
+    Loads only the span of a reference text stored by save_reference_text that the phrases are read from
+    (see ngram_index.locate_reading), so only the span is read from the file and aligned with the phrases
+    :param phrases: the phrases of the reading
+    :param path: the file of the reference text
+    :return: the prepared span of the reference text, the whole text if the reading is not found
+    """
+    with open_reference_text(path) as stored, load_reference_index(path) as index:
+        vocabulary = _load_vocabulary(path)
+        span = locate_reading(phrases, vocabulary, stored.word_ids, index)
+        if span is None:
+            return stored.prepared(vocabulary)
+        return stored.span(*span)
@@ -1,8 +1,11 @@
-from typing import Any, Dict, List, Tuple
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
 
 from huey import RedisHuey
 from loguru import logger
 
+from config import get_config
 from core.plugins import (
     AUDIO_PLUGINS,
     IMAGE_PLUGINS,
@@ -11,10 +14,12 @@ from core.plugins import (
     load_plugins,
 )
 from core.plugins.base import (
+    AudioChunk,
     AudioExtractPhrasesResponse,
     AudioPhrase,
     AudioProcessingFunction,
     AudioSegment,
+    AudioStreamingFunction,
     AudioTaskResult,
     AudioToImageComparisonResponse,
     AudioToTextComparisonResponse,
@@ -22,11 +27,44 @@ from core.plugins.base import (
     TextDiff,
 )
 from core.plugins.loader import PluginInfo
-from core.processing.audio_split import split_audio
-from core.processing.text import find_phrases, match_phrases
+from core.processing.audio_split import silence_intervals, split_audio
+from core.processing.cache import AlignmentCache
+from core.processing.metrics import reading_metrics, record_metrics
+from core.processing.parallel import ParallelAligner
+from core.processing.pcm_cache import (
+    audio_exists,
+    load_pcm,
+    pcm_duration,
+    remove_audio,
+)
+from core.processing.streaming import StreamingAligner
+from core.processing.text import PhraseAlignment, PreparedText, phrase_errors
+from core.processing.text_storage import load_reference_reading, load_reference_text
+
+config = get_config()
 
 scheduler = RedisHuey()
 
+"""
+`parallel_aligner` aligns the long texts across the processes of the worker (by default one per core),
+the consumer runs threads, which would otherwise hold the GIL for the whole alignment
+"""
+parallel_aligner = ParallelAligner(
+    config.parallel.workers, config.parallel.min_chunk_words
+)
+
+"""
+`alignment_cache` memoizes the text alignments of the worker, the redis tier uses the connection of the scheduler
+"""
+alignment_cache = AlignmentCache(
+    config.cache.memory_entries,
+    config.cache.memory_bytes,
+    scheduler.storage.conn if config.cache.redis_enabled else None,
+    config.cache.redis_entries,
+    config.cache.ttl_seconds,
+    parallel_aligner.align_phrases,
+)
+
 logger.add(
     "./logs/task_system.log",
     format="{time:DD-MM-YYYY HH:mm:ss zz} {level} {message}",
@@ -35,6 +73,20 @@ logger.add(
 
 plugins = []
 
+"""
+`PARTIAL_RESULT_INTERVAL` is the minimum number of seconds between the updates of the partial result
+of a streaming comparison
+"""
+PARTIAL_RESULT_INTERVAL = 2.0
+
+"""
+`STREAM_PAUSE_SECONDS` is the pause between the chunks of a streaming comparison (e.g. the words of vosk),
+which ends a phrase, the chunks of a phrase are cut out of the audio (see split_audio) and aligned together,
+a phrase is ended after `STREAM_PHRASE_CHUNKS` chunks as well
+"""
+STREAM_PAUSE_SECONDS = 0.3
+STREAM_PHRASE_CHUNKS = 64
+
 
 @scheduler.on_startup()
 def load_plugins_into_memories() -> None:
@@ -48,16 +100,12 @@ def load_plugins_into_memories() -> None:
     logger.info("Plugins have been loaded successfully.")
 
 
-def _plugin_class_method_call(class_name: str, function: str, filepath: str) -> Any:
+def _plugin_class(class_name: str) -> Any:
     """
-    `_plugin_class_method_call` is a function, which search each plugin for `class_name`
+    `_plugin_class` is a function, which search each plugin for `class_name`
     object. If the object is not found, it raises KeyError. If found, the function
-    gets the class and loads the `function` from it. According to `AudioProcessingPlugin`
-    and `ImageProcessingPlugin` this function must be `@staticmethod`. Then,
-    `_plugin_class_method_call` calls the loaded function with `filepath` argument and
-    returns the result.
+    returns the class.
     """
-    logger.info("Starting _plugin_class_method_call algorithm.")
     logger.info(f"Searching target plugin, which contains {class_name}")
     target = None
     # look through all loaded plugin
@@ -73,7 +121,20 @@ def _plugin_class_method_call(class_name: str, function: str, filepath: str) ->
         raise KeyError(f"No plugin contain class {class_name}")
 
     logger.info(f"Getting class object ({class_name}) from target plugin")
-    cls = getattr(target, class_name)  # load class from plugin module
+    return getattr(target, class_name)  # load class from plugin module
+
+
+def _plugin_class_method_call(class_name: str, function: str, filepath: str) -> Any:
+    """
+    `_plugin_class_method_call` is a function, which search each plugin for `class_name`
+    object. If the object is not found, it raises KeyError. If found, the function
+    gets the class and loads the `function` from it. According to `AudioProcessingPlugin`
+    and `ImageProcessingPlugin` this function must be `@staticmethod`. Then,
+    `_plugin_class_method_call` calls the loaded function with `filepath` argument and
+    returns the result.
+    """
+    logger.info("Starting _plugin_class_method_call algorithm.")
+    cls = _plugin_class(class_name)
     logger.info(f"Getting function ({function}) from class")
     func = getattr(cls, function)  # load function from class
     logger.info(
@@ -94,13 +155,122 @@ def dynamic_plugin_call(class_name: str, function: str, filepath: str) -> Any:
     return _plugin_class_method_call(class_name, function, filepath)
 
 
+def chunk_claim_key(chunk_path: str) -> str:
+    """
+    `chunk_claim_key` returns the key, which is set by the first worker that starts
+    transcribing the chunk `chunk_path` of a long audio (see `scheduler.put_if_empty`),
+    so every chunk is transcribed once, the keys are deleted when the chunks are joined
+    """
+    return f"chunk_claim:{chunk_path}"
+
+
+def _transcribe_chunk(
+    audio_class: str, audio_function: str, chunk_path: str, offset: float
+) -> AudioProcessingResult:
+    """
+    `_transcribe_chunk` transcribes the chunk of a long audio and moves the timestamps
+    of its segments by `offset` (the beginning of the chunk in the audio, in seconds)
+    """
+    logger.info(f"Transcribing the chunk ({chunk_path}) at {offset} s.")
+    response: AudioProcessingResult = _plugin_class_method_call(
+        audio_class, audio_function, chunk_path
+    )
+    return AudioProcessingResult(
+        text=response.text,
+        segments=[
+            AudioChunk(
+                start=max(0.0, segment.start + offset),
+                end=max(0.0, segment.end + offset),
+                text=segment.text,
+            )
+            for segment in response.segments
+        ],
+    )
+
+
+@scheduler.task()
+def transcribe_audio_chunk(
+    audio_class: str, audio_function: str, chunk_path: str, offset: float
+) -> AudioProcessingResult | None:
+    """
+    `transcribe_audio_chunk` is a scheduled job, which transcribes the chunk of a long audio
+    (see `_long_audio_process`), it returns None if the chunk was claimed by another worker
+    """
+    claim = chunk_claim_key(chunk_path)
+    if not scheduler.put_if_empty(claim, True):
+        return None
+    # The chunks are removed before their claims, so a claim made after the chunks were joined is dropped
+    if not audio_exists(chunk_path):
+        scheduler.get(claim)
+        return None
+    return _transcribe_chunk(audio_class, audio_function, chunk_path, offset)
+
+
+def _long_audio_process(
+    audio_class: str, audio_function: str, audio_path: str
+) -> AudioProcessingResult:
+    """
+    `_long_audio_process` cuts the audio into chunks of about `config.long_audio.chunk_seconds`
+    on silence, transcribes them across all the workers (see `transcribe_audio_chunk`)
+    and joins their segments into a single result.
+
+    The chunks are claimed in order: the ones that no worker has started yet are transcribed
+    by the calling worker, so it waits only for the chunks that are being transcribed,
+    even if all the other workers are busy.
+    """
+    logger.info(f"Splitting the long audio ({audio_path}) into chunks.")
+    intervals, lead = silence_intervals(audio_path, config.long_audio.chunk_seconds)
+    offsets = [(begin - lead) / 1000 for begin, _ in intervals]
+    files = split_audio(
+        audio_path,
+        [
+            (offset, offset + (end - begin) / 1000)
+            for offset, (begin, end) in zip(offsets, intervals, strict=True)
+        ],
+    )
+    chunk_paths = [(config.storage.audio_dir / str(file)).as_posix() for file in files]
+
+    jobs = [
+        transcribe_audio_chunk(audio_class, audio_function, chunk_path, offset)
+        for chunk_path, offset in zip(chunk_paths, offsets, strict=True)
+    ]
+    responses: List[AudioProcessingResult] = []
+    try:
+        for chunk_path, offset, job in zip(chunk_paths, offsets, jobs, strict=True):
+            # the queued job of a chunk claimed here finds the claim and returns at once
+            if scheduler.put_if_empty(chunk_claim_key(chunk_path), True):
+                responses.append(
+                    _transcribe_chunk(audio_class, audio_function, chunk_path, offset)
+                )
+            else:
+                responses.append(job.get(blocking=True))
+    finally:
+        # the chunks are not needed anymore, the segments are cut from the whole audio
+        for chunk_path in chunk_paths:
+            remove_audio(chunk_path)
+        for chunk_path in chunk_paths:
+            scheduler.get(chunk_claim_key(chunk_path))
+
+    logger.info(f"The {len(chunk_paths)} chunks of the audio were transcribed.")
+    return AudioProcessingResult(
+        text=" ".join(response.text for response in responses if response.text),
+        segments=[segment for response in responses for segment in response.segments],
+    )
+
+
 def _audio_process(
     audio_class: str, audio_function: str, audio_path: str
 ) -> AudioTaskResult:
     logger.info("Executing audio processing")
-    audio_model_response: AudioProcessingResult = _plugin_class_method_call(
-        audio_class, audio_function, audio_path
-    )
+    # The long audio is transcribed in chunks across the workers
+    if 0 < config.long_audio.min_seconds <= pcm_duration(audio_path):
+        audio_model_response = _long_audio_process(
+            audio_class, audio_function, audio_path
+        )
+    else:
+        audio_model_response = _plugin_class_method_call(
+            audio_class, audio_function, audio_path
+        )
 
     segments = []
     if len(audio_model_response.segments) != 0:
@@ -149,7 +319,7 @@ def image_processing_call(
     return _image_process(image_class, image_function, image_path)
 
 
-@scheduler.task()
+@scheduler.task(context=True)
 def compare_audio_image(
     audio_class: str,
     audio_function: str,
@@ -157,6 +327,8 @@ def compare_audio_image(
     image_class: str,
     image_function: str,
     image_path: str,
+    username: str | None = None,
+    task: Any = None,
 ) -> AudioToImageComparisonResponse:
     """
     `compare_image_audio` is a scheduled job, which accepts these parameters:
@@ -166,6 +338,7 @@ def compare_audio_image(
     - `image_class: str`
     - `image_function: str`
     - `image_path: str`
+    - `username: str | None`, the user whose reading metrics are updated (see `_record_metrics`)
 
     Then `compare_image_audio` calls `_plugin_class_method_call` two times: for audio
     and for image correspondingly. When both of the calls are completed, it matches
@@ -185,14 +358,20 @@ def compare_audio_image(
     logger.info("Starting compare_image_audio algorithm.")
 
     phrases = [x.text for x in audio_model_response.segments]
-    text_diffs = match_phrases(phrases, image_model_response.text)
+    alignment = alignment_cache.align_phrases(phrases, image_model_response.text)
+    text_diffs = phrase_errors(alignment)
+    # The alignment is updated when the recognized text is corrected (see realign_phrases)
+    if task is not None:
+        put_task_data(alignment_key(task.id), alignment)
+        if username is not None:
+            _record_metrics(username, task.id, alignment, audio_model_response)
 
     data = []
     for index, diff in enumerate(text_diffs):
         for at_char, found, expected in diff:
             data.append(
                 TextDiff(
-                    audio_segment=audio_model_response.segments[index],
+                    segment_index=index,
                     at_char=at_char,
                     found=found,
                     expected=expected,
@@ -206,24 +385,230 @@ def compare_audio_image(
     )
 
 
-@scheduler.task()
+def _record_metrics(
+    username: str, task_id: str, alignment: PhraseAlignment, audio: AudioTaskResult
+) -> None:
+    """
+    `_record_metrics` adds the word and character error rates, the reading speed and
+    the misread words of a comparison to the metrics of the user (see `record_metrics`)
+    """
+    seconds = audio.segments[-1].end - audio.segments[0].start if audio.segments else 0
+    record_metrics(
+        scheduler.storage.conn, username, task_id, reading_metrics(alignment, seconds)
+    )
+
+
+def put_task_data(key: str, value: Any) -> None:
+    """
+    `put_task_data` stores `value` under `key` for `config.cache.task_data_ttl_seconds`,
+    unlike `scheduler.put`, which keeps the value in the result hash until it is read
+    """
+    scheduler.storage.conn.set(
+        f"{scheduler.name}.data.{key}",
+        scheduler.serializer.serialize(value),
+        ex=config.cache.task_data_ttl_seconds,
+    )
+
+
+def get_task_data(key: str) -> Any:
+    """
+    `get_task_data` returns the value stored under `key` (see `put_task_data`),
+    `None` if it was not stored or has expired
+    """
+    data = scheduler.storage.conn.get(f"{scheduler.name}.data.{key}")
+    return None if data is None else scheduler.serializer.deserialize(data)
+
+
+def delete_task_data(key: str) -> None:
+    """
+    `delete_task_data` removes the value stored under `key` (see `put_task_data`)
+    """
+    scheduler.storage.conn.delete(f"{scheduler.name}.data.{key}")
+
+
+def alignment_key(task_id: str) -> str:
+    """
+    `alignment_key` returns the key, under which the comparison with the id `task_id`
+    stores the alignment of the audio with the text (see `put_task_data`), so the errors
+    can be updated after the text is corrected without running the task again
+    """
+    return f"alignment:{task_id}"
+
+
+def error_details_key(task_id: str) -> str:
+    """
+    `error_details_key` returns the key, under which the character-level errors of the errors
+    of the comparison with the id `task_id` are cached by their indices (see `put_task_data`)
+    """
+    return f"error_details:{task_id}"
+
+
+def partial_result_key(task_id: str) -> str:
+    """
+    `partial_result_key` returns the key, under which the streaming comparison
+    with the id `task_id` stores its partial result (see `put_task_data`)
+    """
+    return f"partial_result:{task_id}"
+
+
+def _audio_chunks(
+    audio_class: str, audio_function: str, audio_path: str
+) -> Iterator[AudioChunk]:
+    """
+    `_audio_chunks` yields the chunks of the audio as the plugin transcribes them,
+    if the plugin does not stream (see `StreamingAudioProcessingPlugin`), the whole audio
+    is transcribed first
+    """
+    stream_audio = getattr(_plugin_class(audio_class), AudioStreamingFunction, None)
+    if stream_audio is not None:
+        chunks: Iterator[AudioChunk] = stream_audio(audio_path)
+    else:
+        logger.info(f"{audio_class} does not stream, transcribing the whole audio.")
+        audio_model_response: AudioProcessingResult = _plugin_class_method_call(
+            audio_class, audio_function, audio_path
+        )
+        chunks = iter(audio_model_response.segments)
+    return chunks
+
+
+def _stream_compare_audio_text(
+    task_id: str,
+    audio_class: str,
+    audio_function: str,
+    audio_path: str,
+    original_text: str | PreparedText,
+    username: str | None = None,
+) -> AudioToTextComparisonResponse:
+    """
+    `_stream_compare_audio_text` aligns the chunks of the audio with the text as they are
+    transcribed (see `StreamingAligner`) phrase by phrase (see `STREAM_PAUSE_SECONDS`),
+    and stores the errors of the aligned chunks as the partial result at most every
+    `PARTIAL_RESULT_INTERVAL` seconds. The alignment cache is not used, as the phrases are known
+    only when the whole audio is transcribed
+    """
+    logger.info("Starting streaming compare_text_audio algorithm.")
+    aligner = StreamingAligner(original_text)
+    # the plugins decode the audio into the same cache, so it is decoded once
+    samples = load_pcm(audio_path)
+    segments: List[AudioSegment] = []
+    data: List[TextDiff] = []
+    published = time.monotonic()
+
+    def add_errors(text_diffs: List[List[Tuple[int, str, str]]]) -> None:
+        # the errors are given for the next unaligned segments
+        first = len(segments) - len(aligner.pending) - len(text_diffs)
+        for index, diff in enumerate(text_diffs, first):
+            for at_char, found, expected in diff:
+                data.append(
+                    TextDiff(
+                        segment_index=index,
+                        at_char=at_char,
+                        found=found,
+                        expected=expected,
+                    )
+                )
+
+    def add_phrase(chunks: List[AudioChunk]) -> None:
+        # the chunks of a phrase are cut out of the audio at once
+        files = split_audio(samples, [(chunk.start, chunk.end) for chunk in chunks])
+        for chunk, file in zip(chunks, files, strict=True):
+            segments.append(
+                AudioSegment(
+                    start=chunk.start, end=chunk.end, text=chunk.text, file=file
+                )
+            )
+            add_errors(aligner.push(chunk.text))
+
+    try:
+        phrase: List[AudioChunk] = []
+        for chunk in _audio_chunks(audio_class, audio_function, audio_path):
+            ended = len(phrase) > 0 and (
+                chunk.start - phrase[-1].end >= STREAM_PAUSE_SECONDS
+                or len(phrase) >= STREAM_PHRASE_CHUNKS
+            )
+            if ended:
+                add_phrase(phrase)
+                phrase = []
+            phrase.append(chunk)
+
+            if ended and time.monotonic() - published >= PARTIAL_RESULT_INTERVAL:
+                put_task_data(
+                    partial_result_key(task_id),
+                    AudioToTextComparisonResponse(
+                        audio=AudioTaskResult(
+                            text=" ".join(s.text for s in segments), segments=segments
+                        ),
+                        errors=data,
+                    ),
+                )
+                published = time.monotonic()
+
+        if len(phrase) > 0:
+            add_phrase(phrase)
+        add_errors(aligner.finish())
+    finally:
+        # the partial result is replaced by the result of the task (or its error)
+        delete_task_data(partial_result_key(task_id))
+
+    audio_result = AudioTaskResult(
+        text=" ".join(s.text for s in segments), segments=segments
+    )
+    alignment = aligner.alignment()
+    put_task_data(alignment_key(task_id), alignment)
+    if username is not None:
+        _record_metrics(username, task_id, alignment, audio_result)
+
+    logger.info(
+        "Process streaming compare_text_audio has been completed successfully. Returning the result."
+    )
+    return AudioToTextComparisonResponse(audio=audio_result, errors=data)
+
+
+@scheduler.task(context=True)
 def compare_audio_text(
-    audio_class: str, audio_function: str, audio_path: str, text: List[str]
+    audio_class: str,
+    audio_function: str,
+    audio_path: str,
+    text: List[str] | None,
+    text_path: str | None = None,
+    locate: bool = False,
+    stream: bool = False,
+    username: str | None = None,
+    task: Any = None,
 ) -> AudioToTextComparisonResponse:
+    # The uploaded texts are prepared once at upload, only the span of a located reading is loaded (see below)
+    original_text: str | PreparedText = " ".join(text or [])
+    if text_path is not None and (stream or not locate):
+        original_text = load_reference_text(Path(text_path))
+
+    # The alignment overlaps with the transcription, the errors of the first chunks are available early
+    if stream and task is not None:
+        return _stream_compare_audio_text(
+            task.id, audio_class, audio_function, audio_path, original_text, username
+        )
+
     audio_model_response: AudioTaskResult = _audio_process(
         audio_class, audio_function, audio_path
     )
     logger.info("Starting compare_text_audio algorithm.")
     phrases = [x.text for x in audio_model_response.segments]
-    original_text = " ".join(text)
-    text_diffs = match_phrases(phrases, original_text)
+    # Only the located span of a long text (e.g. of a book) is loaded and aligned
+    if locate and text_path is not None:
+        original_text = load_reference_reading(phrases, Path(text_path))
+    alignment = alignment_cache.align_phrases(phrases, original_text)
+    text_diffs = phrase_errors(alignment)
+    # The alignment is updated when the text is corrected (see realign_phrases)
+    if task is not None:
+        put_task_data(alignment_key(task.id), alignment)
+        if username is not None:
+            _record_metrics(username, task.id, alignment, audio_model_response)
 
     data = []
     for index, diff in enumerate(text_diffs):
         for at_char, found, expected in diff:
             data.append(
                 TextDiff(
-                    audio_segment=audio_model_response.segments[index],
+                    segment_index=index,
                     at_char=at_char,
                     found=found,
                     expected=expected,
@@ -254,6 +639,15 @@ def _get_image_plugins() -> Dict[str, PluginInfo]:
     return IMAGE_PLUGINS
 
 
+@scheduler.task()
+def _get_alignment_cache_stats() -> Dict[str, int]:
+    """
+    `_get_alignment_cache_stats` is scheduled job, which returns the hit and miss
+    counters of the alignment cache of the worker that executes it, and their totals of all the workers.
+    """
+    return alignment_cache.stats()
+
+
 def _extact_phrases_from_audio(
     audio_class: str, audio_path: str, phrases: List[str]
 ) -> AudioExtractPhrasesResponse:
@@ -267,14 +661,16 @@ def _extact_phrases_from_audio(
     # intermediate results
     intervals: List[Tuple[float, float] | None] = []
     audio_chunks: List[AudioSegment | None] = []
+    distances: List[int | None] = []
 
-    # search each phrase
-    for search_phrase in phrases:
-        segment_indexes = find_phrases(extracted_phrases, search_phrase)
-
+    # search all the phrases at once
+    for segment_indexes, distance in alignment_cache.locate_phrases(
+        extracted_phrases, phrases
+    ):
         if len(segment_indexes) == 0:
             intervals.append(None)
             audio_chunks.append(None)
+            distances.append(None)
             continue
 
         # join segments
@@ -290,6 +686,7 @@ def _extact_phrases_from_audio(
 
         intervals.append((start, end))
         audio_chunks.append(joined_segments)
+        distances.append(distance)
 
     # split by non-none intervals
     non_none_intevals: List[Tuple[float, float]] = list(
@@ -306,7 +703,10 @@ def _extact_phrases_from_audio(
 
     data: List[AudioPhrase] = [
         AudioPhrase(
-            audio_segment=segment, found=segment is not None, phrase=phrases[index]
+            audio_segment=segment,
+            found=segment is not None,
+            phrase=phrases[index],
+            distance=distances[index],
         )
         for index, segment in enumerate(audio_chunks)
     ]
@@ -34,6 +34,9 @@ async def startup() -> None:
     if not config.storage.audio_dir.exists():
         config.storage.audio_dir.mkdir()
 
+    if not config.storage.text_dir.exists():
+        config.storage.text_dir.mkdir()
+
     # wait for atleast one worker to startup by executing lightweight functions
     get_audio_plugins()
     get_image_plugins()
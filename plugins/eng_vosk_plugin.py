@@ -1,10 +1,10 @@
 import json
-import wave
+from typing import Iterator
 
-from pydub import AudioSegment
 from vosk import KaldiRecognizer, Model
 
 from core.plugins import AudioChunk, AudioProcessingResult, register_plugin
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, pcm_blocks
 
 
 @register_plugin
@@ -27,16 +27,14 @@ class EngVoskPlugin:
 
     @staticmethod
     def process_audio(filename: str) -> AudioProcessingResult:
-        AudioSegment.from_file(filename).export(filename, format="wav")
-        wf = wave.open(filename, "rb")
-        rec = KaldiRecognizer(EngVoskPlugin.model, wf.getframerate())
+        rec = KaldiRecognizer(EngVoskPlugin.model, PCM_SAMPLE_RATE)
         rec.SetWords(True)
         rec.SetPartialWords(True)
 
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
+        # the samples are decoded once per file and shared with the rest of the pipeline,
+        # they are read block by block
+        for block in pcm_blocks(filename, 4000):
+            data = block.tobytes()
             if rec.AcceptWaveform(data):
                 # print(rec.Result())  # todo: logging
                 pass
@@ -52,3 +50,20 @@ class EngVoskPlugin:
         ]
 
         return AudioProcessingResult(text=model_response["text"], segments=chunks)
+
+    @staticmethod
+    def stream_audio(filename: str) -> Iterator[AudioChunk]:
+        rec = KaldiRecognizer(EngVoskPlugin.model, PCM_SAMPLE_RATE)
+        rec.SetWords(True)
+
+        # every finished utterance is yielded word by word
+        for block in pcm_blocks(filename, 4000):
+            data = block.tobytes()
+            if rec.AcceptWaveform(data):
+                for seg in json.loads(rec.Result()).get("result", []):
+                    yield AudioChunk(
+                        start=seg["start"], end=seg["end"], text=seg["word"]
+                    )
+
+        for seg in json.loads(rec.FinalResult()).get("result", []):
+            yield AudioChunk(start=seg["start"], end=seg["end"], text=seg["word"])
@@ -1,10 +1,9 @@
 import json
-import wave
 
-from pydub import AudioSegment
 from vosk import KaldiRecognizer, Model
 
 from core.plugins import AudioChunk, AudioProcessingResult, register_plugin
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, pcm_blocks
 
 
 @register_plugin
@@ -24,16 +23,14 @@ class RusVoskPlugin:
 
     @staticmethod
     def process_audio(filename: str) -> AudioProcessingResult:
-        AudioSegment.from_file(filename).export(filename, format="wav")
-        wf = wave.open(filename, "rb")
-        rec = KaldiRecognizer(RusVoskPlugin.model, wf.getframerate())
+        rec = KaldiRecognizer(RusVoskPlugin.model, PCM_SAMPLE_RATE)
         rec.SetWords(True)
         rec.SetPartialWords(True)
 
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
+        # the samples are decoded once per file and shared with the rest of the pipeline,
+        # they are read block by block
+        for block in pcm_blocks(filename, 4000):
+            data = block.tobytes()
             if rec.AcceptWaveform(data):
                 # print(rec.Result())  # todo: logging
                 pass
@@ -1,6 +1,15 @@
+from typing import List
+
 import whisper
 
 from core.plugins import AudioChunk, AudioProcessingResult, register_plugin
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, load_pcm, pcm_float, pcm_windows
+
+"""
+`WHISPER_WINDOW_SAMPLES` is the length of the windows the audio is transcribed in (10 minutes),
+only the samples of one window are converted to float and to the spectrogram at a time
+"""
+WHISPER_WINDOW_SAMPLES = 10 * 60 * PCM_SAMPLE_RATE
 
 
 @register_plugin
@@ -13,10 +22,26 @@ class WhisperPlugin:
 
     @staticmethod
     def process_audio(filename: str) -> AudioProcessingResult:
-        model_response = WhisperPlugin.model.transcribe(filename)
-        chunks = [
-            AudioChunk(start=seg["start"], end=seg["end"], text=seg["text"])
-            for seg in model_response["segments"]
-        ]
+        # whisper takes the decoded samples instead of running ffmpeg on the file again,
+        # the memory-mapped samples are transcribed window by window
+        samples = load_pcm(filename)
+        text = ""
+        chunks: List[AudioChunk] = []
+        for begin, end in pcm_windows(samples, WHISPER_WINDOW_SAMPLES):
+            # the end of the text so far gives the context of the window,
+            # as whisper does between its own 30 second windows
+            model_response = WhisperPlugin.model.transcribe(
+                pcm_float(samples[begin:end]), initial_prompt=text[-1000:] or None
+            )
+            offset = begin / PCM_SAMPLE_RATE
+            chunks.extend(
+                AudioChunk(
+                    start=seg["start"] + offset,
+                    end=seg["end"] + offset,
+                    text=seg["text"],
+                )
+                for seg in model_response["segments"]
+            )
+            text += model_response["text"]
 
-        return AudioProcessingResult(text=model_response["text"], segments=chunks)
+        return AudioProcessingResult(text=text, segments=chunks)
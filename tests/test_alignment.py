@@ -0,0 +1,217 @@
+import itertools
+import random
+from array import array
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import pytest
+
+from core.processing import kernels, text
+from core.processing.text import (
+    EditOp,
+    find_phrases,
+    locate_phrases,
+    match,
+    match_phrases,
+    prepare_text,
+)
+
+joined_levenshtein: Callable[..., Tuple[List[EditOp], int]] = text.__dict__[
+    "__joined_levenshtein"
+]
+tokenize: Callable[..., Tuple[array, array]] = text.__dict__["__tokenize"]
+
+# linear_memory, banded, anchored
+MODES = list(itertools.product([False, True], repeat=3))
+
+PHRASES = ["The quick brown fax,", "jumps over", "the lazy dog!"]
+TEXT = "The quick brown fox jumps over the lazy dog."
+
+
+@pytest.fixture(params=["compiled", "python"])
+def kernels_available(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[bool]:
+    """Runs the test with the compiled kernels (if numba is installed) and with the pure python fallback"""
+    if request.param == "compiled" and not kernels.AVAILABLE:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(kernels, "AVAILABLE", request.param == "compiled")
+    yield kernels.AVAILABLE
+
+
+def _cases() -> List[Tuple[str, str]]:
+    """Readings of random texts with substituted, skipped and added words, cut short or read from the middle"""
+    generator = random.Random(0)
+    vocabulary = [
+        "".join(generator.choice("abcdefghij") for _ in range(generator.randint(1, 6)))
+        for _ in range(40)
+    ]
+    cases = [("", ""), ("a b", ""), ("", "a b"), ("a", "a"), ("a", "b")]
+    for length in [1, 2, 5, 30, 120, 400]:
+        for cut in ["none", "end", "start"]:
+            expected = [generator.choice(vocabulary) for _ in range(length)]
+            found = []
+            for word in expected:
+                chance = generator.random()
+                if chance < 0.05:
+                    continue
+                found.append(generator.choice(vocabulary) if chance < 0.1 else word)
+                if chance > 0.95:
+                    found.append(generator.choice(vocabulary))
+            # the text continues after (or begins before) the reading
+            if cut == "end":
+                found = found[: len(found) * 2 // 3]
+            elif cut == "start":
+                found = found[len(found) // 3 :]
+            cases.append((" ".join(found), " ".join(expected)))
+    return cases
+
+
+def _apply(errors: List[Tuple[int, str, str]], found: str) -> str:
+    """Corrects the found text by the errors, so it has the words of the expected one"""
+    corrected = []
+    position = 0
+    for index, wrong, right in errors:
+        assert found[index : index + len(wrong)] == wrong
+        corrected.extend([found[position:index], right])
+        position = index + len(wrong)
+    corrected.append(found[position:])
+    return " ".join(" ".join(corrected).split())
+
+
+@pytest.mark.parametrize("found, expected", _cases())
+def test_match_modes(kernels_available: bool, found: str, expected: str) -> None:
+    errors, distance = match(found, expected, True, False, False, None, False)
+    assert _apply(errors, found) == expected
+
+    for linear_memory, banded, anchored in MODES:
+        result = match(found, expected, True, linear_memory, banded, None, anchored)
+        if anchored:
+            # the gaps between the anchors break the ties of the alignment differently
+            assert result[1] == distance
+            assert _apply(result[0], found) == expected
+        else:
+            assert result == (errors, distance)
+
+
+@pytest.mark.skipif(not kernels.AVAILABLE, reason="numba is not installed")
+@pytest.mark.parametrize("found, expected", _cases())
+def test_match_compiled(
+    monkeypatch: pytest.MonkeyPatch, found: str, expected: str
+) -> None:
+    for mode in MODES:
+        compiled = match(found, expected, True, mode[0], mode[1], None, mode[2])
+        monkeypatch.setattr(kernels, "AVAILABLE", False)
+        assert match(found, expected, True, mode[0], mode[1], None, mode[2]) == compiled
+        monkeypatch.setattr(kernels, "AVAILABLE", True)
+
+
+@pytest.mark.parametrize("found, expected", _cases())
+def test_edit_script(kernels_available: bool, found: str, expected: str) -> None:
+    first, second = found.split(), expected.split()
+    for linear_memory, banded, anchored in MODES:
+        script, distance = joined_levenshtein(
+            first, second, linear_memory, banded, None, anchored
+        )
+        # the operations cover both texts in order, the equal ones and the changes alternate
+        assert [(op.first_begin, op.second_begin) for op in script[1:]] == [
+            (op.first_end, op.second_end) for op in script[:-1]
+        ]
+        if len(script) != 0:
+            assert (script[0].first_begin, script[0].second_begin) == (0, 0)
+            assert (script[-1].first_end, script[-1].second_end) == (
+                len(first),
+                len(second),
+            )
+        assert all(
+            (a.code == kernels.EQUAL) != (b.code == kernels.EQUAL)
+            for a, b in zip(script[:-1], script[1:], strict=True)
+        )
+        for op in script:
+            if op.code == kernels.EQUAL:
+                assert first[op.first_begin : op.first_end] == (
+                    second[op.second_begin : op.second_end]
+                )
+        assert sum(op.edits for op in script) == distance
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_match_phrases_modes(
+    kernels_available: bool, mode: Tuple[bool, bool, bool]
+) -> None:
+    assert match_phrases(PHRASES, TEXT, *mode) == [
+        [(16, "fax", "fox")],
+        [],
+        [],
+    ]
+
+    # the text continues after the phrases (this raised IndexError)
+    assert match_phrases(["The quick,", "brown"], TEXT, *mode) == [
+        [],
+        [(5, "", "fox jumps over the lazy dog")],
+    ]
+    # the text begins before the phrases
+    assert match_phrases(["the lazy dog!"], TEXT, *mode) == [
+        [(0, "", "the quick brown fox jumps over")],
+    ]
+
+
+def test_match_phrases_empty(kernels_available: bool) -> None:
+    # nothing is read (this raised IndexError)
+    assert match_phrases([], TEXT) == []
+    assert match_phrases([""], TEXT) == [[(0, "", TEXT.lower().rstrip("."))]]
+    # the text is empty
+    # the change of all the words is given in the phrase it begins in
+    assert match_phrases(PHRASES, "") == [[(0, "The quick brown fax,", "")], [], []]
+    assert match_phrases([""], "") == [[]]
+
+
+def test_tokenize() -> None:
+    first, second = tokenize(["a", "b", "a"], ["b", "c"])
+    # the words of both texts share the ids
+    assert list(first) == [0, 1, 0]
+    assert list(second) == [1, 2]
+
+    # the ids of the prepared text are reused, the unknown words get new ones
+    reference = prepare_text("b c b", tokenize=True)
+    assert reference.vocabulary == {"b": 0, "c": 1}
+    first, second = tokenize(["a", "b", "d", "a"], reference.words, reference)
+    assert list(first) == [2, 0, 3, 2]
+    assert second is reference.word_ids
+
+    # the symbols are compared by their code points
+    first, second = tokenize("ab", "b")
+    assert (list(first), list(second)) == ([97, 98], [98])
+
+
+@pytest.mark.parametrize("found, expected", _cases())
+def test_match_prepared(kernels_available: bool, found: str, expected: str) -> None:
+    # the interned ids of the prepared text give the same errors as the words themselves
+    prepared = prepare_text(expected, tokenize=True)
+    assert match(found, prepared, True) == match(found, expected, True)
+
+
+def test_find_phrases_modes(kernels_available: bool) -> None:
+    cases: Dict[str, List[int]] = {
+        "brown fox jumps": [0, 1],
+        "the lazy dog": [2],
+        "quick": [0],
+        "": [],
+        "over the lazy": [1, 2],
+    }
+    prepared = prepare_text(" ".join(PHRASES))
+    for to_find, answer in cases.items():
+        for engine in ["myers", "dp"]:
+            indices, distance = find_phrases(PHRASES, to_find, engine)
+            assert isinstance(indices, list)
+            assert all(isinstance(index, int) for index in indices)
+            assert isinstance(distance, int)
+            assert indices == answer
+            assert find_phrases(PHRASES, prepare_text(to_find), engine, prepared) == (
+                indices,
+                distance,
+            )
+
+    # the q-gram filter of the batch search finds the same phrases
+    assert locate_phrases(PHRASES, list(cases)) == [
+        find_phrases(PHRASES, to_find) for to_find in cases
+    ]
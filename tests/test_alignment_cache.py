@@ -0,0 +1,313 @@
+import pickle
+import time
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from redis import RedisError
+
+from core.processing import cache
+from core.processing.cache import REDIS_KEY_PREFIX, AlignmentCache
+from core.processing.text import (
+    PhraseAlignment,
+    align_phrases,
+    phrase_errors,
+    prepare_text,
+)
+
+PHRASES = ["the quick brown fax", "jumps over the lazy dog"]
+TEXT = "the quick brown fox jumps over the lazy dog"
+MEMORY_BYTES = 2**20
+
+
+class FakeRedis:
+    """Keeps the keys and the sorted sets used by AlignmentCache in dictionaries"""
+
+    def __init__(self) -> None:
+        self.values: Dict[str, bytes] = {}
+        self.ttls: Dict[str, int] = {}
+        self.sets: Dict[str, Dict[str, float]] = {}
+        self.hashes: Dict[str, Dict[bytes, int]] = {}
+
+    def get(self, key: str) -> bytes | None:
+        return self.values.get(key)
+
+    def set(self, key: str, value: bytes, ex: int) -> None:
+        self.values[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.values.pop(key, None)
+
+    def hincrby(self, key: str, field: str, value: int) -> None:
+        fields = self.hashes.setdefault(key, {})
+        fields[field.encode()] = fields.get(field.encode(), 0) + value
+
+    def hgetall(self, key: str) -> Dict[bytes, int]:
+        return self.hashes.get(key, {})
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        self.sets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key: str, low: str, high: float) -> None:
+        members = self.sets.setdefault(key, {})
+        for member, score in list(members.items()):
+            if score <= high:
+                del members[member]
+
+    def zcard(self, key: str) -> int:
+        return len(self.sets.get(key, {}))
+
+    def zpopmin(self, key: str, count: int) -> List[Tuple[bytes, float]]:
+        members = self.sets.get(key, {})
+        popped = sorted(members.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del members[member]
+        return [(member.encode(), score) for member, score in popped]
+
+    def pipeline(self) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues the commands until execute as the redis pipelines do"""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: List[Tuple[str, Tuple[Any, ...], Dict[str, Any]]] = []
+
+    def __getattr__(self, name: str) -> Any:
+        def queue(*args: Any, **kwargs: Any) -> None:
+            self.commands.append((name, args, kwargs))
+
+        return queue
+
+    def execute(self) -> List[Any]:
+        return [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+class BrokenRedis(FakeRedis):
+    def get(self, key: str) -> bytes | None:
+        raise RedisError("connection refused")
+
+    def pipeline(self) -> "FakePipeline":
+        raise RedisError("connection refused")
+
+    def hincrby(self, key: str, field: str, value: int) -> None:
+        raise RedisError("connection refused")
+
+    def hgetall(self, key: str) -> Dict[bytes, int]:
+        raise RedisError("connection refused")
+
+
+class CountingAligner:
+    """Counts the alignments that were computed and not found in the cache"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, *args: Any, **kwargs: Any) -> PhraseAlignment:
+        self.calls += 1
+        return align_phrases(*args, **kwargs)
+
+
+def _text(index: int) -> str:
+    """The texts differ by their last word (the digits are removed by prepare_text)"""
+    return f"{TEXT} {['one', 'two', 'three', 'four'][index]}"
+
+
+def test_memory_hits() -> None:
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(4, MEMORY_BYTES, align=aligner)
+
+    first = alignment_cache.align_phrases(PHRASES, TEXT)
+    second = alignment_cache.align_phrases(PHRASES, TEXT)
+    assert second.script is first.script
+    assert aligner.calls == 1
+    assert phrase_errors(first) == [[(16, "fax", "fox")], []]
+    assert alignment_cache.match_phrases(PHRASES, TEXT) == phrase_errors(first)
+
+    # other parameters give other results
+    alignment_cache.align_phrases(PHRASES, TEXT, linear_memory=True)
+    assert aligner.calls == 2
+
+    stats = alignment_cache.stats()
+    assert stats["memory_hits"] == 2
+    assert stats["redis_hits"] == 0
+    assert stats["misses"] == 2
+    assert stats["memory_entries"] == 2
+    assert stats["memory_bytes"] == sum(
+        size for _, size in alignment_cache.memory.values()
+    )
+    # without redis the totals are the counters of the process
+    assert stats["total_memory_hits"] == 2
+    assert stats["total_misses"] == 2
+
+
+def test_prepared_keys() -> None:
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(4, MEMORY_BYTES, align=aligner)
+
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    # the phrases and the text with another case and punctuation are the same words
+    phrases = ["The quick, brown FAX", "jumps over the lazy dog!"]
+    alignment = alignment_cache.align_phrases(phrases, TEXT.capitalize() + ".")
+    assert aligner.calls == 1
+    # the errors are given in the symbols of the phrases
+    assert alignment.phrases == phrases
+    assert phrase_errors(alignment) == [[(17, "FAX", "fox")], []]
+
+    located = alignment_cache.locate_phrases(PHRASES, ["lazy dog"])
+    assert alignment_cache.locate_phrases(phrases, ["Lazy dog!"]) == located
+    assert alignment_cache.stats()["memory_hits"] == 2
+    # the phrases without words still count, so the same words in other phrases are another key
+    assert alignment_cache.locate_phrases(
+        [PHRASES[0], "...", PHRASES[1]], ["lazy dog"]
+    ) == [([2], 0)]
+    assert alignment_cache.stats()["memory_hits"] == 2
+
+
+def test_find_phrases_hits() -> None:
+    alignment_cache = AlignmentCache(4, MEMORY_BYTES)
+
+    located = alignment_cache.locate_phrases(PHRASES, ["brown fox", "lazy dog"])
+    assert located == alignment_cache.locate_phrases(PHRASES, ["brown fox", "lazy dog"])
+    assert alignment_cache.find_phrases(PHRASES, "lazy dog") == located[1]
+    assert alignment_cache.stats()["memory_hits"] == 3
+    assert alignment_cache.stats()["misses"] == 2
+
+
+def test_eviction_by_entries() -> None:
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(2, MEMORY_BYTES, align=aligner)
+
+    for index in range(3):
+        alignment_cache.align_phrases(PHRASES, _text(index))
+    # the least recently used result is evicted
+    assert alignment_cache.stats()["memory_entries"] == 2
+    alignment_cache.align_phrases(PHRASES, _text(0))
+    assert aligner.calls == 4
+
+    # a hit makes the result the most recently used one
+    alignment_cache.align_phrases(PHRASES, _text(2))
+    alignment_cache.align_phrases(PHRASES, _text(3))
+    alignment_cache.align_phrases(PHRASES, _text(2))
+    assert aligner.calls == 5
+
+
+def test_eviction_by_bytes() -> None:
+    size = len(pickle.dumps(align_phrases(PHRASES, _text(0))))
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(100, 2 * size + size // 2, align=aligner)
+
+    for index in range(3):
+        alignment_cache.align_phrases(PHRASES, _text(index))
+    stats = alignment_cache.stats()
+    assert stats["memory_entries"] == 2
+    assert stats["memory_bytes"] <= 2 * size + size // 2
+
+    alignment_cache.align_phrases(PHRASES, _text(0))
+    assert aligner.calls == 4
+
+    # an alignment with a long text takes the place of several short ones
+    alignment_cache.align_phrases(PHRASES, " ".join([TEXT] * 3))
+    assert alignment_cache.stats()["memory_entries"] == 1
+
+
+def test_larger_than_memory() -> None:
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(100, 100, align=aligner)
+
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    # the result is computed again instead of evicting everything else
+    assert aligner.calls == 2
+    assert alignment_cache.stats()["memory_entries"] == 0
+    assert alignment_cache.stats()["memory_bytes"] == 0
+
+
+def test_redis_tier() -> None:
+    redis = FakeRedis()
+    aligner = CountingAligner()
+    first_worker = AlignmentCache(4, MEMORY_BYTES, redis, 10, 60, align=aligner)  # type: ignore[arg-type]
+    second_worker = AlignmentCache(4, MEMORY_BYTES, redis, 10, 60, align=aligner)  # type: ignore[arg-type]
+
+    alignment = first_worker.align_phrases(PHRASES, TEXT)
+    assert len(redis.values) == 1
+    assert list(redis.ttls.values()) == [60]
+
+    # the other worker finds the result in redis and keeps it in its memory
+    shared = second_worker.align_phrases(PHRASES, TEXT)
+    assert phrase_errors(shared) == phrase_errors(alignment)
+    second_worker.align_phrases(PHRASES, TEXT)
+    assert aligner.calls == 1
+    assert second_worker.stats()["redis_hits"] == 1
+    assert second_worker.stats()["memory_hits"] == 1
+    assert second_worker.stats()["memory_bytes"] == len(
+        next(iter(redis.values.values()))
+    )
+
+    # the totals of all the workers are added up in redis
+    for worker in (first_worker, second_worker):
+        stats = worker.stats()
+        assert stats["total_memory_hits"] == 1
+        assert stats["total_redis_hits"] == 1
+        assert stats["total_misses"] == 1
+    assert first_worker.stats()["misses"] == 1
+    assert first_worker.stats()["redis_hits"] == 0
+
+
+def test_redis_eviction() -> None:
+    redis = FakeRedis()
+    alignment_cache = AlignmentCache(4, MEMORY_BYTES, redis, 2, 60)  # type: ignore[arg-type]
+
+    for index in range(3):
+        alignment_cache.align_phrases(PHRASES, _text(index))
+        time.sleep(0.001)
+    # the oldest result is evicted
+    assert len(redis.values) == 2
+    assert len(redis.sets[REDIS_KEY_PREFIX + "index"]) == 2
+    oldest = AlignmentCache._key(
+        "align_phrases", prepare_text(" ".join(PHRASES)).text, _text(0), []
+    )
+    assert REDIS_KEY_PREFIX + oldest not in redis.values
+
+    # the expired results are not counted
+    redis.sets[REDIS_KEY_PREFIX + "index"] = {
+        member: score - 120
+        for member, score in redis.sets[REDIS_KEY_PREFIX + "index"].items()
+    }
+    alignment_cache.align_phrases(PHRASES, _text(3))
+    assert len(redis.sets[REDIS_KEY_PREFIX + "index"]) == 1
+
+
+def test_redis_errors() -> None:
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(4, MEMORY_BYTES, BrokenRedis(), 10, 60, align=aligner)  # type: ignore[arg-type]
+
+    # the alignments are computed and kept in memory when redis is unavailable
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    assert aligner.calls == 1
+    assert alignment_cache.stats()["misses"] == 1
+    assert alignment_cache.stats()["total_misses"] == 1
+
+
+def test_algorithm_version(monkeypatch: pytest.MonkeyPatch) -> None:
+    redis = FakeRedis()
+    aligner = CountingAligner()
+    alignment_cache = AlignmentCache(4, MEMORY_BYTES, redis, 10, 60, align=aligner)  # type: ignore[arg-type]
+
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    # the results of the previous version of the algorithms are not used
+    monkeypatch.setattr(cache, "ALGORITHM_VERSION", cache.ALGORITHM_VERSION + 1)
+    alignment_cache.align_phrases(PHRASES, TEXT)
+    assert aligner.calls == 2
+    assert len(redis.values) == 2
+
+    other_worker = AlignmentCache(4, MEMORY_BYTES, redis, 10, 60, align=aligner)  # type: ignore[arg-type]
+    other_worker.align_phrases(PHRASES, TEXT)
+    assert aligner.calls == 2
@@ -0,0 +1,70 @@
+from typing import Dict, List
+
+import numpy as np
+import pytest
+from pydub import silence
+
+from core.processing.audio_split import detect_silence
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, pcm_audio_segment
+
+MS = PCM_SAMPLE_RATE // 1000
+
+
+def _audio(*parts: tuple[str, int]) -> np.ndarray:
+    """Joins silent ("silence"), quiet ("noise") and loud ("tone") parts of the given lengths (in samples)"""
+    generator = np.random.default_rng(0)
+    samples: List[np.ndarray] = []
+    for kind, length in parts:
+        if kind == "silence":
+            samples.append(np.zeros(length, dtype=np.int16))
+        elif kind == "noise":
+            samples.append(generator.integers(-50, 50, length, dtype=np.int16))
+        else:
+            samples.append(generator.integers(-8000, 8000, length, dtype=np.int16))
+    return np.concatenate(samples)
+
+
+AUDIO: Dict[str, np.ndarray] = {
+    "leading": _audio(("silence", 500 * MS), ("tone", 1000 * MS)),
+    "trailing": _audio(("tone", 1000 * MS), ("noise", 700 * MS + 5)),
+    "pauses": _audio(
+        ("tone", 300 * MS),
+        ("silence", 250 * MS),
+        ("tone", 3 * MS),
+        ("noise", 180 * MS + 11),
+        ("tone", 400 * MS),
+        ("silence", 90 * MS),
+        ("tone", 200 * MS),
+        ("noise", 1200 * MS),
+        ("tone", 100 * MS + 9),
+    ),
+    "silent": _audio(("silence", 1000 * MS + 3)),
+    "short": _audio(("silence", 50 * MS)),
+}
+
+
+@pytest.mark.parametrize("name", list(AUDIO))
+@pytest.mark.parametrize(
+    "min_silence_len, seek_step", [(100, 1), (100, 7), (100, 150), (60, 60)]
+)
+@pytest.mark.parametrize("block", [MS * 1000, 4097])
+def test_detect_silence(
+    name: str, min_silence_len: int, seek_step: int, block: int
+) -> None:
+    samples = AUDIO[name]
+    blocks = [samples[i : i + block] for i in range(0, len(samples), block)]
+
+    expected = silence.detect_silence(
+        pcm_audio_segment(samples),
+        min_silence_len=min_silence_len,
+        silence_thresh=-40,
+        seek_step=seek_step,
+    )
+    found = detect_silence(blocks, min_silence_len, -40, seek_step)
+    assert found == [tuple(section) for section in expected]
+
+
+def test_detect_silence_short() -> None:
+    # the audio is shorter than a silent section
+    assert detect_silence([AUDIO["short"]], min_silence_len=100) == []
+    assert detect_silence([], min_silence_len=100) == []
@@ -0,0 +1,463 @@
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+from uuid import UUID
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from core import task_system
+from core.plugins.base import (
+    AudioChunk,
+    AudioSegment,
+    AudioTaskResult,
+    AudioToTextComparisonResponse,
+    TextDiff,
+)
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, write_pcm
+from core.processing.text import align_phrases, phrase_errors
+from main import app
+
+DEFAULT_UNEXISTENT_FILE = "01234567-8910-1112-1314-151617181920"
+GLOBAL_HEADERS: Dict[str, str] = {}
+
+PHRASES = ["the quick brown fax", "jumps over the lazy dog"]
+TEXT = "the quick brown fox jumps over the lazy dog"
+
+
+def _register_and_get_token_info(client: TestClient) -> dict[str, str]:
+    """Simply combine registration and getting token steps"""
+    # try to register of fetch already existed "admin"
+    response = client.put("/v1/auth/register?username=admin&password=admin")
+    assert response.status_code == 200 or response.status_code == 422
+
+    response = client.post(
+        "/v1/auth/token",
+        data={
+            "grant_type": "",
+            "username": "admin",
+            "password": "admin",
+            "scope": "",
+            "client_id": "",
+            "client_secret": "",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200  # successful auth
+
+    data: dict[str, str] = response.json()
+    return data
+
+
+def _return_headers_with_token(token_info: dict[str, str]) -> dict[str, str]:
+    """Return a headers pattern to pass auth"""
+    return {
+        "Accept": "application/json",
+        "Authorization": f"{token_info['token_type']} {token_info['access_token']}",
+    }
+
+
+def _store_comparison(phrases: list[str], text: str, embedded: bool = False) -> str:
+    """
+    Store the result and the alignment of a finished comparison as the worker does,
+    with `embedded` the errors embed their audio segments as the results stored by the previous versions
+    """
+    task_id = str(uuid.uuid4())
+    alignment = align_phrases(phrases, text)
+    task_system.put_task_data(task_system.alignment_key(task_id), alignment)
+
+    segments = [
+        AudioSegment(start=index, end=index + 1, text=phrase, file=uuid.uuid4())
+        for index, phrase in enumerate(phrases)
+    ]
+    errors = [
+        TextDiff.construct(
+            audio_segment=segments[index],
+            at_char=at_char,
+            found=found,
+            expected=expected,
+        )
+        if embedded
+        else TextDiff(
+            segment_index=index, at_char=at_char, found=found, expected=expected
+        )
+        for index, diff in enumerate(phrase_errors(alignment))
+        for at_char, found, expected in diff
+    ]
+    task_system.scheduler.put(
+        task_id,
+        AudioToTextComparisonResponse(
+            audio=AudioTaskResult(text=" ".join(phrases), segments=segments),
+            errors=errors,
+        ),
+    )
+    return task_id
+
+
+def test_start() -> None:
+    with TestClient(app) as client:
+        token_info = _register_and_get_token_info(client)
+        headers = _return_headers_with_token(token_info)
+
+        global GLOBAL_HEADERS
+        GLOBAL_HEADERS = headers
+        assert GLOBAL_HEADERS != {}
+
+
+##############
+### RESULT ###
+##############
+@pytest.mark.flaky(retries=2, delay=30)
+@pytest.mark.parametrize("embedded", [False, True])
+def test_result_success(embedded: bool) -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT.replace("dog", "cat"), embedded)
+
+        response = client.get(
+            f"/v1/comparison/audio/text/result?task_id={task_id}",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        errors = response.json()["errors"]
+        assert [e["audio_segment"]["text"] for e in errors] == PHRASES
+        assert all("segment_index" not in e for e in errors)
+
+        response = client.get(
+            f"/v1/comparison/audio/text/result?task_id={task_id}&compact=true&include_audio=false",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert "audio" not in response.json()
+        errors = response.json()["errors"]
+        assert [e["segment_index"] for e in errors] == [0, 1]
+        assert all("audio_segment" not in e for e in errors)
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+@pytest.mark.parametrize("embedded", [False, True])
+def test_task_result_success(embedded: bool) -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT.replace("dog", "cat"), embedded)
+
+        # the generic endpoint returns the errors with their segments embedded as before
+        response = client.get(
+            f"/v1/task/result?task_id={task_id}", headers=GLOBAL_HEADERS
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["audio"]["text"] == " ".join(PHRASES)
+        assert [(e["found"], e["expected"]) for e in data["errors"]] == [
+            ("fax", "fox"),
+            ("dog", "cat"),
+        ]
+        assert [e["audio_segment"] for e in data["errors"]] == data["audio"]["segments"]
+        assert all("segment_index" not in e for e in data["errors"])
+
+
+###############
+### PARTIAL ###
+###############
+@pytest.mark.flaky(retries=2, delay=30)
+def test_partial_no_auth() -> None:
+    with TestClient(app) as client:
+        response = client.get(
+            f"/v1/comparison/audio/text/partial?task_id={DEFAULT_UNEXISTENT_FILE}"
+        )
+        assert response.status_code == 401
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_partial_task_does_not_exist() -> None:
+    with TestClient(app) as client:
+        response = client.get(
+            f"/v1/comparison/audio/text/partial?task_id={DEFAULT_UNEXISTENT_FILE}",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 406
+
+
+def _stream_comparison(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    task_id: str,
+    chunks: Iterator[AudioChunk],
+) -> AudioToTextComparisonResponse:
+    """Run a streaming comparison of a silent audio, transcribed as `chunks`"""
+    monkeypatch.setattr(task_system.config.storage, "audio_dir", tmp_path)
+    monkeypatch.setattr(task_system.config.storage, "audio_format", "pcm")
+    monkeypatch.setattr(task_system, "PARTIAL_RESULT_INTERVAL", 0)
+    monkeypatch.setattr(task_system, "_audio_chunks", lambda *args: chunks)
+    write_pcm([np.zeros(2 * PCM_SAMPLE_RATE, dtype=np.int16)], tmp_path / "audio")
+
+    return task_system._stream_compare_audio_text(
+        task_id, "StubPlugin", "process_audio", (tmp_path / "audio").as_posix(), TEXT
+    )
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_partial_success(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with TestClient(app) as client:
+        responses = []
+        task_id = str(uuid.uuid4())
+
+        def chunks() -> Iterator[AudioChunk]:
+            # the words of a phrase one after another, the phrases after a pause
+            for index, phrase in enumerate(PHRASES):
+                for word_index, word in enumerate(phrase.split()):
+                    yield AudioChunk(
+                        start=index + 0.1 * word_index,
+                        end=index + 0.1 * (word_index + 1),
+                        text=word,
+                    )
+                # the partial result of the phrases so far is available
+                responses.append(
+                    client.get(
+                        f"/v1/comparison/audio/text/partial?task_id={task_id}&compact=true",
+                        headers=GLOBAL_HEADERS,
+                    )
+                )
+
+        # the chunks of a phrase are cut out of the audio at once
+        split_calls: List[Any] = []
+        split_audio = task_system.split_audio
+
+        def split_phrase(*args: Any) -> List[UUID]:
+            split_calls.append(args)
+            return split_audio(*args)
+
+        monkeypatch.setattr(task_system, "split_audio", split_phrase)
+        result = _stream_comparison(tmp_path, monkeypatch, task_id, chunks())
+
+        # a phrase is aligned when the pause after it is transcribed
+        assert [response.status_code for response in responses] == [406, 200]
+        assert responses[-1].json()["audio"]["text"] == PHRASES[0]
+        assert len(split_calls) == len(PHRASES)
+        assert result.audio.text == " ".join(PHRASES)
+        assert len(result.audio.segments) == len(" ".join(PHRASES).split())
+        assert [(e.found, e.expected) for e in result.errors] == [("fax", "fox")]
+
+        # the partial result is deleted when the final result is written
+        response = client.get(
+            f"/v1/comparison/audio/text/partial?task_id={task_id}",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 406
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_partial_failed_task(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with TestClient(app) as client:
+        task_id = str(uuid.uuid4())
+
+        def chunks() -> Iterator[AudioChunk]:
+            yield AudioChunk(start=0, end=1, text=PHRASES[0])
+            raise RuntimeError("the plugin has failed")
+
+        with pytest.raises(RuntimeError):
+            _stream_comparison(tmp_path, monkeypatch, task_id, chunks())
+
+        # the partial result of a failed task is deleted as well
+        response = client.get(
+            f"/v1/comparison/audio/text/partial?task_id={task_id}",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 406
+
+
+###############
+### REALIGN ###
+###############
+@pytest.mark.flaky(retries=2, delay=30)
+def test_realign_no_auth() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={"task_id": DEFAULT_UNEXISTENT_FILE, "text": TEXT},
+        )
+        assert response.status_code == 401
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_realign_task_does_not_exist() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={"task_id": DEFAULT_UNEXISTENT_FILE, "text": TEXT},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 406
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_realign_compact() -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT)
+
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={
+                "task_id": task_id,
+                "text": TEXT.replace("dog", "cat"),
+                "compact": True,
+            },
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert response.json()["errors"] == [
+            {"segment_index": 0, "at_char": 16, "found": "fax", "expected": "fox"},
+            {"segment_index": 1, "at_char": 20, "found": "dog", "expected": "cat"},
+        ]
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_realign_alignment_expired() -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT)
+        task_system.delete_task_data(task_system.alignment_key(task_id))
+
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={"task_id": task_id, "text": TEXT},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 406
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_realign_success() -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT)
+
+        # the text is corrected to what was read
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={"task_id": task_id, "text": TEXT.replace("fox", "fax")},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert response.json()["errors"] == []
+
+        # the corrected text becomes the text of the comparison
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={"task_id": task_id, "text": TEXT.replace("dog", "cat")},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        errors = response.json()["errors"]
+        assert [(e["found"], e["expected"]) for e in errors] == [
+            ("fax", "fox"),
+            ("dog", "cat"),
+        ]
+        assert errors[1]["audio_segment"]["text"] == PHRASES[1]
+
+        # the realigned errors become the errors of the result
+        response = client.get(
+            f"/v1/comparison/audio/text/result?task_id={task_id}",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert response.json()["errors"] == errors
+
+        # the realigned alignment expires as the first one
+        ttl = task_system.scheduler.storage.conn.ttl(
+            f"{task_system.scheduler.name}.data.{task_system.alignment_key(task_id)}"
+        )
+        assert 0 < ttl <= task_system.config.cache.task_data_ttl_seconds
+
+
+#####################
+### ERROR DETAILS ###
+#####################
+@pytest.mark.flaky(retries=2, delay=30)
+def test_error_details_no_auth() -> None:
+    with TestClient(app) as client:
+        response = client.get(
+            f"/v1/comparison/errors/details?task_id={DEFAULT_UNEXISTENT_FILE}&error_ids=0"
+        )
+        assert response.status_code == 401
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_error_details_task_does_not_exist() -> None:
+    with TestClient(app) as client:
+        response = client.get(
+            f"/v1/comparison/errors/details?task_id={DEFAULT_UNEXISTENT_FILE}&error_ids=0",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 406
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_error_details_error_does_not_exist() -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT)
+
+        response = client.get(
+            f"/v1/comparison/errors/details?task_id={task_id}&error_ids=0&error_ids=1",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_error_details_success() -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT.replace("dog", "cat"))
+
+        response = client.get(
+            f"/v1/comparison/errors/details?task_id={task_id}&error_ids=1&error_ids=0",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert response.json()["data"] == [
+            {
+                "error_id": 1,
+                "errors": [{"at_char": 0, "found": "dog", "expected": "cat"}],
+            },
+            {
+                "error_id": 0,
+                "errors": [{"at_char": 1, "found": "a", "expected": "o"}],
+            },
+        ]
+
+        # the details are stored next to the result of the comparison
+        key = task_system.error_details_key(task_id)
+        assert sorted(task_system.get_task_data(key)) == [0, 1]
+        ttl = task_system.scheduler.storage.conn.ttl(
+            f"{task_system.scheduler.name}.data.{key}"
+        )
+        assert 0 < ttl <= task_system.config.cache.task_data_ttl_seconds
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_error_details_realigned() -> None:
+    with TestClient(app) as client:
+        task_id = _store_comparison(PHRASES, TEXT.replace("dog", "cat"))
+        response = client.get(
+            f"/v1/comparison/errors/details?task_id={task_id}&error_ids=1",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+
+        # the stored details are dropped with the errors they describe
+        response = client.post(
+            "/v1/comparison/audio/realign",
+            json={"task_id": task_id, "text": TEXT.replace("dog", "dot")},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert task_system.get_task_data(task_system.error_details_key(task_id)) is None
+
+        response = client.get(
+            f"/v1/comparison/errors/details?task_id={task_id}&error_ids=1",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        assert response.json()["data"] == [
+            {
+                "error_id": 1,
+                "errors": [{"at_char": 2, "found": "g", "expected": "t"}],
+            },
+        ]
@@ -0,0 +1,120 @@
+import types
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pytest
+
+from core import task_system
+from core.plugins.base import AudioChunk, AudioProcessingResult
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, load_pcm, write_pcm
+
+WORDS = 40
+WORD_SECONDS = 1.0
+PAUSE_SECONDS = 0.5
+
+
+class StubPlugin:
+    """Recognizes every loud part of the audio as a word"""
+
+    calls = 0
+
+    @staticmethod
+    def process_audio(filename: str) -> AudioProcessingResult:
+        StubPlugin.calls += 1
+        samples = np.asarray(load_pcm(filename), dtype=np.float64)
+        frame = PCM_SAMPLE_RATE // 100
+        samples = samples[: len(samples) // frame * frame]
+        loud = np.abs(samples).reshape(-1, frame).mean(axis=1) > 1000
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], loud, [0])).astype(int)))
+        segments = [
+            AudioChunk(start=begin / 100, end=end / 100, text="word")
+            for begin, end in zip(edges[::2], edges[1::2], strict=True)
+        ]
+        return AudioProcessingResult(
+            text=" ".join(s.text for s in segments), segments=segments
+        )
+
+
+@pytest.fixture
+def long_audio(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    """A minute of words (noise) and pauses (silence), transcribed by StubPlugin"""
+    monkeypatch.setattr(task_system.config.storage, "audio_dir", tmp_path)
+    monkeypatch.setattr(task_system.config.storage, "audio_format", "pcm")
+    monkeypatch.setattr(task_system.config.long_audio, "chunk_seconds", 10)
+    monkeypatch.setattr(
+        task_system,
+        "plugins",
+        [types.SimpleNamespace(StubPlugin=StubPlugin, __name__="stub_plugin")],
+    )
+    task_system.scheduler.immediate = True
+    StubPlugin.calls = 0
+
+    generator = np.random.default_rng(0)
+    pause = np.zeros(int(PAUSE_SECONDS * PCM_SAMPLE_RATE), dtype=np.int16)
+    parts = []
+    for _ in range(WORDS):
+        word = generator.normal(0, 8000, int(WORD_SECONDS * PCM_SAMPLE_RATE))
+        parts.extend([pause, np.clip(word, -32768, 32767).astype(np.int16)])
+    parts.append(pause)
+    write_pcm(parts, tmp_path / "audio")
+
+    yield (tmp_path / "audio").as_posix()
+    task_system.scheduler.immediate = False
+
+
+def _check_result(result: AudioProcessingResult, tmp_path: Path) -> None:
+    assert len(result.segments) == WORDS
+    for index, segment in enumerate(result.segments):
+        start = PAUSE_SECONDS + index * (WORD_SECONDS + PAUSE_SECONDS)
+        assert segment.start == pytest.approx(start, abs=0.02)
+        assert segment.end == pytest.approx(start + WORD_SECONDS, abs=0.02)
+    assert result.text == " ".join(["word"] * WORDS)
+
+    # the chunks and their claims are removed
+    assert [path.name for path in tmp_path.iterdir()] == ["audio.pcm"]
+    assert not any(
+        key.startswith("chunk_claim:")
+        for key in task_system.scheduler.storage.result_items()
+    )
+
+
+def test_long_audio_queued_chunks(long_audio: str, tmp_path: Path) -> None:
+    # in the immediate mode the queued jobs claim and transcribe all the chunks
+    result = task_system._long_audio_process("StubPlugin", "process_audio", long_audio)
+    assert StubPlugin.calls > 1
+    _check_result(result, tmp_path)
+
+
+def test_long_audio_unstarted_chunks(
+    long_audio: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # the chunks no worker has started are transcribed by the calling worker
+    monkeypatch.setattr(task_system, "transcribe_audio_chunk", lambda *args: None)
+    result = task_system._long_audio_process("StubPlugin", "process_audio", long_audio)
+    assert StubPlugin.calls > 1
+    _check_result(result, tmp_path)
+
+
+def test_long_audio_late_job(long_audio: str, tmp_path: Path) -> None:
+    # a job of a chunk that was already joined and removed does nothing
+    assert (
+        task_system.transcribe_audio_chunk.call_local(
+            "StubPlugin", "process_audio", (tmp_path / "removed").as_posix(), 0.0
+        )
+        is None
+    )
+    assert StubPlugin.calls == 0
+    assert not any(
+        key.startswith("chunk_claim:")
+        for key in task_system.scheduler.storage.result_items()
+    )
+
+
+def test_long_audio_in_audio_process(
+    long_audio: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(task_system.config.long_audio, "min_seconds", 30)
+    result = task_system._audio_process("StubPlugin", "process_audio", long_audio)
+    assert len(result.segments) == WORDS
+    assert StubPlugin.calls > 1
@@ -0,0 +1,139 @@
+import uuid
+from typing import Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from core import task_system
+from core.processing.metrics import ReadingMetrics, record_metrics
+from main import app
+
+GLOBAL_HEADERS: Dict[str, str] = {}
+
+
+def _register_and_get_token_info(client: TestClient) -> dict[str, str]:
+    """Simply combine registration and getting token steps"""
+    # try to register of fetch already existed "admin"
+    response = client.put("/v1/auth/register?username=admin&password=admin")
+    assert response.status_code == 200 or response.status_code == 422
+
+    response = client.post(
+        "/v1/auth/token",
+        data={
+            "grant_type": "",
+            "username": "admin",
+            "password": "admin",
+            "scope": "",
+            "client_id": "",
+            "client_secret": "",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200  # successful auth
+
+    data: dict[str, str] = response.json()
+    return data
+
+
+def _return_headers_with_token(token_info: dict[str, str]) -> dict[str, str]:
+    """Return a headers pattern to pass auth"""
+    return {
+        "Accept": "application/json",
+        "Authorization": f"{token_info['token_type']} {token_info['access_token']}",
+    }
+
+
+def test_start() -> None:
+    with TestClient(app) as client:
+        token_info = _register_and_get_token_info(client)
+        headers = _return_headers_with_token(token_info)
+
+        global GLOBAL_HEADERS
+        GLOBAL_HEADERS = headers
+        assert GLOBAL_HEADERS != {}
+
+
+###############
+### READING ###
+###############
+@pytest.mark.flaky(retries=2, delay=30)
+def test_reading_no_auth() -> None:
+    with TestClient(app) as client:
+        response = client.get("/v1/metrics/reading")
+        assert response.status_code == 401
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_reading_wrong_format() -> None:
+    with TestClient(app) as client:
+        response = client.get(
+            "/v1/metrics/reading?history=bruh", headers=GLOBAL_HEADERS
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_reading_success() -> None:
+    with TestClient(app) as client:
+        response = client.get("/v1/metrics/reading", headers=GLOBAL_HEADERS)
+        assert response.status_code == 200
+        before = response.json()["totals"]
+
+        # the worker adds up the metrics of the comparisons of the user
+        task_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        record_metrics(
+            task_system.scheduler.storage.conn,
+            "admin",
+            task_ids[0],
+            ReadingMetrics(10, 2, 50, 4, 11, 6.0, {"zzfox": 1, "zzover": 1}),
+        )
+        record_metrics(
+            task_system.scheduler.storage.conn,
+            "admin",
+            task_ids[1],
+            ReadingMetrics(20, 1, 100, 1, 20, 14.0, {"zzfox": 1}),
+        )
+
+        response = client.get(
+            "/v1/metrics/reading?history=2&words=100", headers=GLOBAL_HEADERS
+        )
+        assert response.status_code == 200
+        data = response.json()
+
+        totals = data["totals"]
+        assert totals["comparisons"] == before["comparisons"] + 2
+        assert totals["reference_words"] == before["reference_words"] + 30
+        assert totals["word_errors"] == before["word_errors"] + 3
+        assert totals["seconds"] == pytest.approx(before["seconds"] + 20)
+        assert totals["word_error_rate"] == pytest.approx(
+            totals["word_errors"] / totals["reference_words"]
+        )
+        assert totals["words_per_minute"] == pytest.approx(
+            totals["words_read"] * 60 / totals["seconds"]
+        )
+
+        # the history returns the last comparisons from the oldest one
+        assert [entry["task_id"] for entry in data["history"]] == task_ids
+        assert data["history"][0]["word_error_rate"] == pytest.approx(0.2)
+
+        misread = {w["word"]: w["errors"] for w in data["misread_words"]}
+        assert misread["zzfox"] >= 2
+        assert misread["zzfox"] >= misread["zzover"]
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_reading_limits() -> None:
+    with TestClient(app) as client:
+        record_metrics(
+            task_system.scheduler.storage.conn,
+            "admin",
+            str(uuid.uuid4()),
+            ReadingMetrics(10, 2, 50, 4, 11, 6.0, {"zzfox": 1}),
+        )
+
+        response = client.get(
+            "/v1/metrics/reading?history=0&words=1", headers=GLOBAL_HEADERS
+        )
+        assert response.status_code == 200
+        assert response.json()["history"] == []
+        assert len(response.json()["misread_words"]) == 1
@@ -0,0 +1,120 @@
+import mmap
+import pickle
+from array import array
+from pathlib import Path
+from typing import Any, cast
+
+import pytest
+
+from core.processing.ngram_index import INDEX_MAGIC, NGramIndex
+from core.processing.text_storage import (
+    INDEX_SUFFIX,
+    PREPARED_SUFFIX,
+    StoredText,
+    load_reference_index,
+    load_reference_reading,
+    load_reference_text,
+    save_reference_text,
+)
+
+WORDS = [f"word{chr(ord('a') + i // 26)}{chr(ord('a') + i % 26)}" for i in range(60)]
+REFERENCE = " ".join(WORDS)
+
+
+def _reading(begin: int, end: int) -> list[str]:
+    """The words [begin, end) of the reference split into phrases of 5 words"""
+    return [" ".join(WORDS[i : min(i + 5, end)]) for i in range(begin, end, 5)]
+
+
+def test_locate_reading(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    save_reference_text(REFERENCE, tmp_path / "text")
+
+    # only the span is read from the stored text
+    def prepared(*args: Any) -> None:
+        raise AssertionError("the whole text is loaded")
+
+    monkeypatch.setattr(StoredText, "prepared", prepared)
+    located = load_reference_reading(_reading(20, 35), tmp_path / "text")
+    assert located.words == WORDS[20:35]
+    assert located.text == " ".join(WORDS[20:35])
+    assert REFERENCE[located.indices[0] :].startswith(WORDS[20])
+    assert len(located.indices) == len(located.text)
+    # the span does not hold the vocabulary of the whole text
+    assert located.vocabulary == {word: i for i, word in enumerate(WORDS[20:35])}
+    assert located.word_ids == array("i", range(15))
+
+
+def test_locate_reading_not_found(tmp_path: Path) -> None:
+    reference = save_reference_text(REFERENCE, tmp_path / "text")
+
+    located = load_reference_reading(
+        ["some other words", "to be read"], tmp_path / "text"
+    )
+    assert located == reference
+
+
+def test_load_reference_text(tmp_path: Path) -> None:
+    text = "The  quick, brown fox! Jumps over the lazy dog. The end."
+    reference = save_reference_text(text, tmp_path / "text")
+    assert load_reference_text(tmp_path / "text") == reference
+    assert (
+        reference.words == "the quick brown fox jumps over the lazy dog the end".split()
+    )
+
+    save_reference_text("", tmp_path / "empty")
+    assert load_reference_text(tmp_path / "empty").words == []
+
+
+def test_outdated_prepared_text(tmp_path: Path) -> None:
+    reference = save_reference_text(REFERENCE, tmp_path / "text")
+    # the previous versions pickled the prepared text
+    prepared_path = tmp_path / ("text" + PREPARED_SUFFIX)
+    prepared_path.write_bytes(pickle.dumps(reference))
+
+    assert load_reference_text(tmp_path / "text") == reference
+    assert (
+        load_reference_reading(_reading(0, 10), tmp_path / "text").words == WORDS[:10]
+    )
+
+
+def test_locate_verifies_keys(monkeypatch: pytest.MonkeyPatch) -> None:
+    # every n-gram gets the same key, so all the n-grams of the reference are found by every key
+    ngram_keys = NGramIndex._ngram_keys
+
+    def colliding_keys(word_ids: Any, size: int) -> array:
+        return array(
+            "I", [0 if key != 0xFFFFFFFF else key for key in ngram_keys(word_ids, size)]
+        )
+
+    monkeypatch.setattr(NGramIndex, "_ngram_keys", staticmethod(colliding_keys))
+    reference_ids = array("i", range(len(WORDS)))
+    index = NGramIndex.build(reference_ids)
+
+    assert index.locate(array("i", range(40, 50)), reference_ids) == (40, 50)
+    # the n-grams of the reading that are not in the reference are not found
+    assert index.locate(array("i", [3, 2, 1, 0]), reference_ids) is None
+
+
+def test_close(tmp_path: Path) -> None:
+    save_reference_text(REFERENCE, tmp_path / "text")
+
+    index = load_reference_index(tmp_path / "text")
+    assert index.mapped is not None
+    mapped = cast(mmap.mmap, index.mapped.obj)
+    index.close()
+    assert mapped.closed
+    # the index can be closed again and the built indexes are not mapped
+    index.close()
+    NGramIndex.build(array("i", range(10))).close()
+
+
+def test_outdated_index(tmp_path: Path) -> None:
+    save_reference_text(REFERENCE, tmp_path / "text")
+    index_path = tmp_path / ("text" + INDEX_SUFFIX)
+    index_path.write_bytes(array("I", [INDEX_MAGIC, 0, 3, 0, 0]).tobytes())
+
+    # the index is rebuilt and the outdated one is unmapped, so it can be replaced
+    with load_reference_index(tmp_path / "text") as index:
+        assert index.words == len(WORDS)
+    located = load_reference_reading(_reading(0, 10), tmp_path / "text")
+    assert located.words == WORDS[:10]
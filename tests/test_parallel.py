@@ -0,0 +1,143 @@
+import random
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Tuple
+
+import pytest
+
+from core.processing import parallel
+from core.processing.parallel import ParallelAligner
+from core.processing.text import (
+    PhraseAlignment,
+    align_phrases,
+    join_alignments,
+    phrase_errors,
+    prepare_text,
+    split_phrases,
+)
+
+
+def _reading(seed: int, words: int = 600) -> Tuple[List[str], str]:
+    """A random text and its reading with substituted, skipped and added words, split into phrases"""
+    generator = random.Random(seed)
+    vocabulary = [
+        "".join(generator.choice("abcdefghij") for _ in range(generator.randint(2, 7)))
+        for _ in range(300)
+    ]
+    text = [generator.choice(vocabulary) for _ in range(words)]
+    read: List[str] = []
+    for word in text:
+        chance = generator.random()
+        if chance < 0.03:
+            continue
+        read.append(generator.choice(vocabulary) if chance < 0.06 else word)
+        if chance > 0.97:
+            read.append(generator.choice(vocabulary))
+    phrases = []
+    while len(read) != 0:
+        length = generator.randint(3, 15)
+        phrases.append(" ".join(read[:length]))
+        del read[:length]
+    return phrases, " ".join(text)
+
+
+def _cost(alignment: PhraseAlignment) -> int:
+    return sum(operation.edits for operation in alignment.script)
+
+
+@pytest.fixture
+def aligner() -> Iterator[ParallelAligner]:
+    aligner = ParallelAligner(workers=3, min_chunk_words=50)
+    yield aligner
+    aligner.shutdown()
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunks", [1, 2, 3, 8])
+def test_split_phrases(seed: int, chunks: int) -> None:
+    phrases, text = _reading(seed)
+    prepared = prepare_text(text, tokenize=True)
+    parts = split_phrases(phrases, text, chunks)
+
+    # the chunks cover the phrases and the text in order
+    assert 1 <= len(parts) <= chunks
+    assert [phrase for part_phrases, _ in parts for phrase in part_phrases] == phrases
+    assert " ".join(part_text.text for _, part_text in parts).split() == (
+        prepared.words
+    )
+    # no chunk is empty
+    assert all(len(part_phrases) != 0 for part_phrases, _ in parts)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunks", [2, 3, 8])
+def test_join_alignments(seed: int, chunks: int) -> None:
+    phrases, text = _reading(seed)
+    prepared = prepare_text(text, tokenize=True)
+    whole = align_phrases(phrases, text)
+
+    joined = join_alignments(
+        [
+            align_phrases(part_phrases, part_text)
+            for part_phrases, part_text in split_phrases(phrases, text, chunks)
+        ],
+        prepared,
+    )
+    # the chunks are cut at anchors, so the joined alignment is as good as the whole one
+    assert joined.phrases == phrases
+    assert joined.text.words == prepared.words
+    assert _cost(joined) == _cost(whole)
+    assert len(phrase_errors(joined)) == len(phrases)
+
+
+def test_parallel_aligner(aligner: ParallelAligner) -> None:
+    phrases, text = _reading(0)
+    whole = align_phrases(phrases, text)
+
+    alignment = aligner.align_phrases(phrases, text)
+    # the chunks are aligned in the spawned processes
+    assert aligner.executor is not None
+    assert _cost(alignment) == _cost(whole)
+    assert len(phrase_errors(alignment)) == len(phrases)
+
+
+def test_parallel_aligner_short(aligner: ParallelAligner) -> None:
+    # the phrases shorter than two chunks are aligned in the calling thread
+    phrases, text = _reading(0, words=80)
+    alignment = aligner.align_phrases(phrases, text)
+
+    assert aligner.executor is None
+    assert phrase_errors(alignment) == phrase_errors(align_phrases(phrases, text))
+
+
+class BrokenPool:
+    """A pool whose processes have died"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        future.set_exception(BrokenProcessPool("a process has been killed"))
+        return future
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _unavailable_pool(*args: Any, **kwargs: Any) -> None:
+    raise OSError("the processes cannot be spawned")
+
+
+@pytest.mark.parametrize("pool", [_unavailable_pool, BrokenPool])
+def test_parallel_aligner_fallback(
+    aligner: ParallelAligner, monkeypatch: pytest.MonkeyPatch, pool: Any
+) -> None:
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", pool)
+    phrases, text = _reading(1)
+
+    # the phrases are aligned in the calling thread instead
+    alignment = aligner.align_phrases(phrases, text)
+    assert phrase_errors(alignment) == phrase_errors(align_phrases(phrases, text))
+    # the pool is started again by the next alignment
+    assert aligner.executor is None
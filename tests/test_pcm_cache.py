@@ -0,0 +1,61 @@
+import threading
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+
+from core.processing.pcm_cache import PCM_SAMPLE_RATE, load_pcm, pcm_windows, write_pcm
+
+
+def test_write_pcm_threads(tmp_path: Path) -> None:
+    # the threads write the same file at once, every one of them through its own temporary file
+    started = threading.Barrier(4)
+
+    def blocks(value: int) -> Iterator[np.ndarray]:
+        started.wait()
+        for _ in range(10):
+            yield np.full(PCM_SAMPLE_RATE, value, dtype=np.int16)
+
+    errors: List[OSError] = []
+
+    def write(value: int) -> None:
+        try:
+            write_pcm(blocks(value), tmp_path / "audio")
+        except OSError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(value,)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    samples = load_pcm(tmp_path / "audio")
+    assert len(samples) == 10 * PCM_SAMPLE_RATE
+    # the file is written whole by one of the threads
+    assert len(np.unique(samples)) == 1
+    assert [path.name for path in tmp_path.iterdir()] == ["audio.pcm"]
+
+
+def test_pcm_windows() -> None:
+    # a tone with a pause 3 seconds before the end of the first window
+    samples = np.full(25 * PCM_SAMPLE_RATE, 1000, dtype=np.int16)
+    samples[7 * PCM_SAMPLE_RATE : 7 * PCM_SAMPLE_RATE + PCM_SAMPLE_RATE // 5] = 0
+    window = 10 * PCM_SAMPLE_RATE
+
+    windows = list(pcm_windows(samples, window))
+    # the windows cover the samples one after another
+    assert windows[0][0] == 0
+    assert windows[-1][1] == len(samples)
+    assert all(windows[i][1] == windows[i + 1][0] for i in range(len(windows) - 1))
+    assert all(0 < end - begin <= window for begin, end in windows)
+    # the first window is cut in the pause
+    assert (
+        7 * PCM_SAMPLE_RATE
+        <= windows[0][1]
+        < 7 * PCM_SAMPLE_RATE + PCM_SAMPLE_RATE // 5
+    )
+
+    assert list(pcm_windows(samples[:window], window)) == [(0, window)]
+    assert list(pcm_windows(samples[:0], window)) == []
@@ -0,0 +1,209 @@
+import json
+import pickle
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from redis import RedisError
+
+from core.processing import kernels, metrics
+from core.processing.metrics import (
+    METRICS_KEY_PREFIX,
+    ReadingMetrics,
+    metric_rates,
+    reading_metrics,
+    record_metrics,
+)
+from core.processing.text import (
+    EditOp,
+    align_phrases,
+    join_alignments,
+    prepare_text,
+)
+
+PHRASES = ["the quick brown fax", "jumps the lazy dog dog"]
+TEXT = "The quick brown fox jumps over the lazy dog."
+KEY = METRICS_KEY_PREFIX + "reader"
+
+
+class FakeRedis:
+    """Keeps the hashes and the sorted sets written by record_metrics in dictionaries"""
+
+    def __init__(self) -> None:
+        self.hashes: Dict[str, Dict[str, float]] = {}
+        self.sets: Dict[str, Dict[str, float]] = {}
+        self.commands: List[Tuple[str, Tuple[Any, ...]]] = []
+
+    def pipeline(self) -> "FakeRedis":
+        self.commands = []
+        return self
+
+    def execute(self) -> None:
+        for name, args in self.commands:
+            getattr(self, "_" + name)(*args)
+
+    def hincrby(self, *args: Any) -> None:
+        self.commands.append(("hincrby", args))
+
+    def hincrbyfloat(self, *args: Any) -> None:
+        self.commands.append(("hincrby", args))
+
+    def zincrby(self, *args: Any) -> None:
+        self.commands.append(("zincrby", args))
+
+    def zadd(self, *args: Any) -> None:
+        self.commands.append(("zadd", args))
+
+    def zremrangebyrank(self, *args: Any) -> None:
+        self.commands.append(("zremrangebyrank", args))
+
+    def _hincrby(self, key: str, field: str, value: float) -> None:
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + value
+
+    def _zincrby(self, key: str, value: float, member: str) -> None:
+        members = self.sets.setdefault(key, {})
+        members[member] = members.get(member, 0) + value
+
+    def _zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        self.sets.setdefault(key, {}).update(mapping)
+
+    def _zremrangebyrank(self, key: str, begin: int, end: int) -> None:
+        members = sorted(self.sets.get(key, {}).items(), key=lambda item: item[1])
+        for member, _ in members[begin : max(0, len(members) + end + 1)]:
+            del self.sets[key][member]
+
+
+class BrokenRedis(FakeRedis):
+    def execute(self) -> None:
+        raise RedisError("connection refused")
+
+
+def test_reading_metrics() -> None:
+    reading = reading_metrics(align_phrases(PHRASES, TEXT), 6.0)
+
+    assert reading.reference_words == 9
+    assert reading.reference_chars == len("the quick brown fox jumps over the lazy dog")
+    assert reading.words_read == 9
+    assert reading.seconds == 6.0
+    # "fax" is read instead of "fox", "over" is skipped and "dog" is repeated
+    assert reading.word_errors == 3
+    assert reading.char_errors == 1 + len("over") + len("dog")
+    assert reading.misread_words == {"fox": 1, "over": 1}
+
+    rates = metric_rates(
+        {key: value for key, value in vars(reading).items() if key != "misread_words"}
+    )
+    assert rates["word_error_rate"] == pytest.approx(3 / 9)
+    assert rates["character_error_rate"] == pytest.approx(
+        reading.char_errors / reading.reference_chars
+    )
+    assert rates["words_per_minute"] == pytest.approx(90)
+
+
+def test_reading_metrics_mixed_change() -> None:
+    # "bran" is read instead of "brown" and "fox" is skipped, in one change of the script
+    alignment = align_phrases(["the quick bran jumps"], "the quick brown fox jumps")
+    assert [operation.code for operation in alignment.script] == [
+        kernels.EQUAL,
+        kernels.REPLACE,
+        kernels.EQUAL,
+    ]
+
+    reading = reading_metrics(alignment, 1.0)
+    assert reading.word_errors == 2
+    assert reading.misread_words == {"brown": 1, "fox": 1}
+
+
+def test_reading_metrics_joined_alignments() -> None:
+    # "over" is skipped at the end of the first part and "zzz" is added at the start of the second one,
+    # the joined script has one change of one word on each side made of both edits
+    alignment = join_alignments(
+        [
+            align_phrases(
+                ["the quick brown fox jumps"], "the quick brown fox jumps over"
+            ),
+            align_phrases(["zzz the lazy dog"], "the lazy dog"),
+        ],
+        prepare_text(TEXT, tokenize=True),
+    )
+    assert [
+        (operation.code, operation.first_end - operation.first_begin)
+        for operation in alignment.script
+    ] == [(kernels.EQUAL, 5), (kernels.REPLACE, 1), (kernels.EQUAL, 3)]
+
+    assert reading_metrics(alignment, 1.0).word_errors == 2
+
+
+def test_edit_op_unpickled_without_edits() -> None:
+    # the operations pickled before the edits were counted count the longer side of a change
+    operation = EditOp.__new__(EditOp)
+    operation.__setstate__(
+        (
+            None,
+            dict(
+                code=kernels.REPLACE,
+                first_begin=2,
+                first_end=3,
+                second_begin=2,
+                second_end=5,
+            ),
+        )
+    )
+    assert operation.edits == 3
+    assert pickle.loads(pickle.dumps(operation)).edits == 3
+
+
+def test_metric_rates_empty() -> None:
+    assert metric_rates(vars(ReadingMetrics())) == {
+        "word_error_rate": 0.0,
+        "character_error_rate": 0.0,
+        "words_per_minute": 0.0,
+    }
+
+
+def test_record_metrics() -> None:
+    redis = FakeRedis()
+    first = ReadingMetrics(10, 2, 50, 4, 11, 6.0, {"fox": 1, "over": 1})
+    second = ReadingMetrics(20, 1, 100, 1, 20, 14.0, {"fox": 1})
+
+    record_metrics(redis, "reader", "first", first)  # type: ignore[arg-type]
+    record_metrics(redis, "reader", "second", second)  # type: ignore[arg-type]
+
+    # the totals are added up
+    assert redis.hashes[KEY] == {
+        "comparisons": 2,
+        "reference_words": 30,
+        "word_errors": 3,
+        "reference_chars": 150,
+        "char_errors": 5,
+        "words_read": 31,
+        "seconds": 20.0,
+    }
+    assert redis.sets[KEY + ":words"] == {"fox": 2, "over": 1}
+
+    # the history keeps the rates of every comparison in order
+    history = [
+        json.loads(entry)
+        for entry, _ in sorted(
+            redis.sets[KEY + ":history"].items(), key=lambda item: item[1]
+        )
+    ]
+    assert [entry["task_id"] for entry in history] == ["first", "second"]
+    assert history[0]["word_error_rate"] == pytest.approx(0.2)
+    assert history[1]["words_per_minute"] == pytest.approx(20 * 60 / 14)
+
+
+def test_record_metrics_history_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metrics, "METRICS_HISTORY_ENTRIES", 3)
+    redis = FakeRedis()
+    for index in range(5):
+        record_metrics(redis, "reader", str(index), ReadingMetrics(seconds=index + 1))  # type: ignore[arg-type]
+
+    history = [json.loads(entry) for entry in redis.sets[KEY + ":history"]]
+    assert sorted(entry["task_id"] for entry in history) == ["2", "3", "4"]
+    assert redis.hashes[KEY]["comparisons"] == 5
+
+
+def test_record_metrics_redis_error() -> None:
+    # the comparison does not fail when the metrics cannot be recorded
+    record_metrics(BrokenRedis(), "reader", "first", ReadingMetrics())  # type: ignore[arg-type]
@@ -0,0 +1,177 @@
+import os
+from typing import Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+
+DEFAULT_UNEXISTENT_FILE = "01234567-8910-1112-1314-151617181920"
+GLOBAL_HEADERS: Dict[str, str] = {}
+
+TEXT = "The headache won't go away. She's taking medicine but even that didn't help.\n"
+
+
+def _register_and_get_token_info(client: TestClient) -> dict[str, str]:
+    """Simply combine registration and getting token steps"""
+    # try to register of fetch already existed "admin"
+    response = client.put("/v1/auth/register?username=admin&password=admin")
+    assert response.status_code == 200 or response.status_code == 422
+
+    response = client.post(
+        "/v1/auth/token",
+        data={
+            "grant_type": "",
+            "username": "admin",
+            "password": "admin",
+            "scope": "",
+            "client_id": "",
+            "client_secret": "",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 200  # successful auth
+
+    data: dict[str, str] = response.json()
+    return data
+
+
+def _return_headers_with_token(token_info: dict[str, str]) -> dict[str, str]:
+    """Return a headers pattern to pass auth"""
+    return {
+        "Accept": "application/json",
+        "Authorization": f"{token_info['token_type']} {token_info['access_token']}",
+    }
+
+
+def _remove_text(file_id: str) -> None:
+    """Remove the uploaded text together with its prepared form and index"""
+    for suffix in ["", ".prepared", ".vocabulary", ".index"]:
+        os.remove(f"temp_data/text/{file_id}{suffix}")
+
+
+def test_start() -> None:
+    with TestClient(app) as client:
+        token_info = _register_and_get_token_info(client)
+        headers = _return_headers_with_token(token_info)
+
+        global GLOBAL_HEADERS
+        GLOBAL_HEADERS = headers
+        assert GLOBAL_HEADERS != {}
+
+
+##############
+### UPLOAD ###
+##############
+@pytest.mark.flaky(retries=2, delay=30)
+def test_upload_no_auth() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/text/upload",
+            files={"upload_file": (" ", TEXT.encode(), "text/plain")},
+        )
+        assert response.status_code == 401
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_upload_payload_not_a_file() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/text/upload",
+            files={
+                "upload_file": "not a file",
+            },
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_upload_file_is_not_a_text() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/text/upload",
+            files={
+                "upload_file": (" ", open("tests/image/image.jpg", "rb"), "image/jpeg"),
+            },
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_upload_file_is_not_utf8() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/text/upload",
+            files={"upload_file": (" ", TEXT.encode("utf-16"), "text/plain")},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_upload_success() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/text/upload",
+            files={"upload_file": (" ", TEXT.encode(), "text/plain")},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        file_id = response.json()["file_id"]
+
+        # the text is prepared and indexed at upload
+        for suffix in ["", ".prepared", ".vocabulary", ".index"]:
+            assert os.path.exists(f"temp_data/text/{file_id}{suffix}")
+
+        _remove_text(file_id)
+
+
+################
+### DOWNLOAD ###
+################
+@pytest.mark.flaky(retries=2, delay=30)
+def test_download_no_auth() -> None:
+    with TestClient(app) as client:
+        response = client.get(f"/v1/text/download?file={DEFAULT_UNEXISTENT_FILE}")
+        assert response.status_code == 401
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_download_file_does_not_exist() -> None:
+    with TestClient(app) as client:
+        response = client.get(
+            f"/v1/text/download?file={DEFAULT_UNEXISTENT_FILE}",
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 404
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_download_wrong_format() -> None:
+    with TestClient(app) as client:
+        response = client.get("/v1/text/download?file=bruh", headers=GLOBAL_HEADERS)
+        assert response.status_code == 422
+
+
+@pytest.mark.flaky(retries=2, delay=30)
+def test_download_success() -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/text/upload",
+            files={"upload_file": (" ", TEXT.encode(), "text/plain")},
+            headers=GLOBAL_HEADERS,
+        )
+        assert response.status_code == 200
+        file_id = response.json()["file_id"]
+
+        # the text is returned as it was uploaded
+        response = client.get(
+            f"/v1/text/download?file={file_id}", headers=GLOBAL_HEADERS
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert response.content == TEXT.encode()
+
+        _remove_text(file_id)
@@ -0,0 +1,224 @@
+import random
+from array import array
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import pytest
+
+from core.processing import kernels, text
+from core.processing.text import QGRAM_SIZE, find_phrases, locate_phrases
+
+myers_search: Callable[[str, str], Tuple[int, int, int]] = text.__dict__[
+    "__myers_search"
+]
+semi_global_alignment: Callable[[str, str], Tuple[int, int, int]] = text.__dict__[
+    "__semi_global_alignment"
+]
+filtered_search: Callable[
+    [str, str, Dict[str, List[int]]], Tuple[int, int, int]
+] = text.__dict__["__filtered_search"]
+qgram_index: Callable[[str, int], Dict[str, List[int]]] = text.__dict__["__qgram_index"]
+
+PHRASES = [
+    "The headache won't go away. She's taking medicine but even that didn't help.",
+    "The monster's throbbing in her head continued.",
+    "This happened to her only once before in her life and she realized that only one thing could be happening.",
+]
+
+
+@pytest.fixture(params=["compiled", "python"])
+def kernels_available(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[bool]:
+    """Runs the test with the compiled kernels (if numba is installed) and with the pure python fallback"""
+    if request.param == "compiled" and not kernels.AVAILABLE:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(kernels, "AVAILABLE", request.param == "compiled")
+    yield kernels.AVAILABLE
+
+
+def _levenshtein(first: str, second: str) -> int:
+    row = list(range(len(second) + 1))
+    for i, symbol in enumerate(first, 1):
+        diagonal, row[0] = row[0], i
+        for j in range(1, len(second) + 1):
+            diagonal, row[j] = row[j], min(
+                row[j] + 1, row[j - 1] + 1, diagonal + (symbol != second[j - 1])
+            )
+    return row[-1]
+
+
+def _cases() -> List[Tuple[str, str]]:
+    """Random patterns of up to 200 symbols (3 blocks of 64) and texts containing their mutated copies"""
+    generator = random.Random(0)
+    cases = []
+    for length in [1, 2, 5, 63, 64, 65, 100, 128, 129, 200]:
+        for alphabet in ["ab", "abcdefgh ", "abcdefghijklmnopqrstuvwxyz "]:
+            pattern = "".join(generator.choice(alphabet) for _ in range(length))
+            copy = list(pattern)
+            for _ in range(length // 8):
+                copy[generator.randrange(len(copy))] = generator.choice(alphabet)
+            prefix = "".join(generator.choice(alphabet) for _ in range(length))
+            suffix = "".join(generator.choice(alphabet) for _ in range(30))
+            cases.append((pattern, prefix + "".join(copy) + suffix))
+    return cases
+
+
+@pytest.mark.parametrize("pattern, searched", _cases())
+def test_myers_agrees_with_dp(
+    kernels_available: bool, pattern: str, searched: str
+) -> None:
+    distance, begin, end = myers_search(pattern, searched)
+    dp_distance, _, dp_end = semi_global_alignment(pattern, searched)
+
+    # both find the earliest end of a best substring, myers finds its shortest beginning
+    assert (distance, end) == (dp_distance, dp_end)
+    assert 0 <= begin <= end <= len(searched)
+    assert _levenshtein(pattern, searched[begin:end]) == distance
+
+
+def test_myers_brute_force(kernels_available: bool) -> None:
+    generator = random.Random(1)
+    for _ in range(200):
+        pattern = "".join(
+            generator.choice("abc") for _ in range(generator.randint(1, 8))
+        )
+        searched = "".join(
+            generator.choice("abc") for _ in range(generator.randint(0, 12))
+        )
+        best = min(
+            _levenshtein(pattern, searched[i:j])
+            for i in range(len(searched) + 1)
+            for j in range(i, len(searched) + 1)
+        )
+        distance, begin, end = myers_search(pattern, searched)
+        assert distance == best
+        assert _levenshtein(pattern, searched[begin:end]) == best
+        assert semi_global_alignment(pattern, searched)[0] == best
+
+
+def test_empty(kernels_available: bool) -> None:
+    assert myers_search("", "some text") == (0, 0, 0)
+    assert semi_global_alignment("", "some text") == (0, 0, 0)
+    assert myers_search("text", "") == (4, 0, 0)
+    assert semi_global_alignment("text", "") == (4, 0, 0)
+
+    for engine in ["myers", "dp"]:
+        assert find_phrases(PHRASES, "", engine) == ([], 0)
+        assert find_phrases([], "some text", engine) == ([], 9)
+
+
+def test_not_found(kernels_available: bool) -> None:
+    # no symbol of the pattern is in the text, so the best substring is empty
+    assert myers_search("xyz", "abcabc") == (3, 0, 0)
+    assert semi_global_alignment("xyz", "abcabc") == (3, 0, 0)
+
+    for engine in ["myers", "dp"]:
+        assert find_phrases(["abc", "cba"], "xyz", engine) == ([], 3)
+
+
+@pytest.mark.skipif(not kernels.AVAILABLE, reason="numba is not installed")
+@pytest.mark.parametrize("anchored", [False, True])
+def test_kernels(anchored: bool) -> None:
+    generator = random.Random(2)
+    for length in [1, 63, 64, 65, 130]:
+        pattern = [generator.randrange(4) for _ in range(length)]
+        searched = [generator.randrange(5) for _ in range(2 * length)]
+        pattern_ids = kernels.as_array(array("i", pattern))
+        searched_ids = kernels.as_array(array("i", searched))
+        distance, end = kernels.myers_search(pattern_ids, searched_ids, 4, anchored)
+        dp_distance, dp_begin, dp_end = kernels.semi_global_alignment(
+            pattern_ids, searched_ids
+        )
+
+        if anchored:
+            # the best prefix of the text
+            assert distance == min(
+                _levenshtein(
+                    "".join(map(chr, pattern)), "".join(map(chr, searched[:j]))
+                )
+                for j in range(len(searched) + 1)
+            )
+        else:
+            assert (distance, end) == (dp_distance, dp_end)
+            assert (
+                _levenshtein(
+                    "".join(map(chr, pattern)),
+                    "".join(map(chr, searched[dp_begin:dp_end])),
+                )
+                == dp_distance
+            )
+
+
+@pytest.mark.parametrize(
+    "to_find, answer",
+    [
+        ("she realized that only one thing could be happening", [2]),
+        ("she has taken medicine", [0]),
+        ("continued this happened to her only once before", [1, 2]),
+        # longer than 64 symbols
+        (
+            "the monster's throbbing in her head continued. "
+            "This happened to her only once before in her life",
+            [1, 2],
+        ),
+    ],
+)
+def test_find_phrases_engines(
+    kernels_available: bool, to_find: str, answer: List[int]
+) -> None:
+    indices, distance = find_phrases(PHRASES, to_find, "myers")
+    assert indices == answer
+    assert (indices, distance) == find_phrases(PHRASES, to_find, "dp")
+
+
+def test_find_phrases_unknown_engine() -> None:
+    with pytest.raises(ValueError):
+        find_phrases(PHRASES, "some text", "regex")
+
+
+@pytest.mark.parametrize("pattern, searched", _cases())
+def test_filtered_search(kernels_available: bool, pattern: str, searched: str) -> None:
+    # the filter only skips the regions that cannot hold a better substring
+    distance, begin, end = filtered_search(
+        pattern, searched, qgram_index(searched, QGRAM_SIZE)
+    )
+    assert distance == myers_search(pattern, searched)[0]
+    assert _levenshtein(pattern, searched[begin:end]) == distance
+
+
+def test_filtered_search_long_text(kernels_available: bool) -> None:
+    # the text is many times longer than the patterns, so most of its regions are skipped
+    generator = random.Random(3)
+    words = [
+        "".join(generator.choice("abcdefghij") for _ in range(5)) for _ in range(400)
+    ]
+    searched = " ".join(words)
+    index = qgram_index(searched, QGRAM_SIZE)
+    for begin in [0, 120, 390]:
+        pattern = " ".join(words[begin : begin + 10]).replace("a", "b")
+        distance, found_begin, found_end = filtered_search(pattern, searched, index)
+        assert distance == myers_search(pattern, searched)[0]
+        assert _levenshtein(pattern, searched[found_begin:found_end]) == distance
+
+    # not found
+    assert filtered_search("xyz" * 10, searched, index) == myers_search(
+        "xyz" * 10, searched
+    )
+    # shorter than the q-grams that are counted
+    assert filtered_search("abc", searched, index) == myers_search("abc", searched)
+
+
+def test_locate_phrases(kernels_available: bool) -> None:
+    to_find = [
+        "she realized that only one thing could be happening",
+        "she has taken medicine",
+        "continued this happened to her only once before",
+        "the monster's throbbing in her head continued. "
+        "This happened to her only once before in her life",
+        "",
+        "xyz",
+    ]
+    assert locate_phrases(PHRASES, to_find) == [
+        find_phrases(PHRASES, text, "myers") for text in to_find
+    ]
+    assert locate_phrases([], ["some text"]) == [([], 9)]